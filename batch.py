@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+HealthBot Batch Script
+This script pregenerates content for a list of health topics, so sessions about
+them can be served from the caches without live model calls.
+
+For every topic it runs the same search as the live workflow, summarizes the
+results, and generates both the free-text quiz question used in "open" quiz mode
+and a bank of multiple-choice questions. Results go into the search and summary
+caches and the quiz store, which the live nodes read first.
+
+Usage:
+    python batch.py topics.txt --concurrency 8
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load .env before importing HealthBot, whose modules read their settings on import
+load_dotenv()
+
+from src.cache import normalize_text, summary_cache
+from src.clients import get_model
+from src.context import build_context
+from src.models import QUIZ, SUMMARY
+from src.nodes import quiz_messages, summary_messages
+from src.quiz import (
+    MULTIPLE_CHOICE,
+    QUESTION,
+    add_to_bank,
+    multiple_choice_messages,
+    parse_multiple_choice,
+    quiz_bank,
+    quiz_model,
+    store_quiz,
+    stored_quiz,
+)
+from src.ratelimit import BATCH, priority
+from src.retrieval import SEARCH_BACKEND
+from src.tools import cached_search, health_search_query
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Pregenerate HealthBot summaries and quizzes for a list of topics."
+    )
+    parser.add_argument(
+        "topics", help="File with one health topic per line ('#' starts a comment)."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of searches or model calls running at the same time.",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=None,
+        help="Seconds the search results, generated summaries and quizzes stay valid "
+        "(default: the caches' own TTL).",
+    )
+    return parser.parse_args()
+
+
+def read_topics(path: str) -> List[str]:
+    """
+    Read topics from a file, skipping blank lines, comments and duplicates.
+
+    Args:
+        path: Topic file
+
+    Returns:
+        List[str]: Topics in file order
+    """
+    topics, seen = [], set()
+    with open(path) as f:
+        for line in f:
+            topic = line.split("#", 1)[0].strip()
+            # Only the same text counts as a duplicate: the search and summary are
+            # keyed on it, and reordered words may name another condition
+            if topic and normalize_text(topic) not in seen:
+                seen.add(normalize_text(topic))
+                topics.append(topic)
+    return topics
+
+
+def run_batch(model, prompts: List, concurrency: int) -> List:
+    """
+    Send prompts to the model as one batch with bounded concurrency.
+
+    Args:
+        model: The model, or a model with call options bound
+        prompts: Prompt message lists
+        concurrency: Maximum number of calls running at the same time
+
+    Returns:
+        List: Model output text, or the exception raised, for each prompt
+    """
+    if not prompts:
+        return []
+    # Queued behind live sessions' calls when the model is rate limited
+    with priority(BATCH):
+        results = model.batch(
+            prompts, config={"max_concurrency": concurrency}, return_exceptions=True
+        )
+    return [r if isinstance(r, Exception) else r.content for r in results]
+
+
+def pregenerate(topics: List[str], concurrency: int, ttl: Optional[float]) -> Dict[str, int]:
+    """
+    Search, summarize and generate quizzes for the topics.
+
+    Args:
+        topics: Health topics
+        concurrency: Maximum number of searches or model calls running at the same time
+        ttl: Seconds the search results and generated content stay valid, or None
+            for the defaults
+
+    Returns:
+        Dict[str, int]: Counts of generated, already cached and failed items
+    """
+    counts = dict.fromkeys(
+        ["summaries", "summaries_cached", "quizzes", "quizzes_cached", "failed"], 0
+    )
+
+    # Search with the same query as the live workflow, so its search hits the cache.
+    # The results are kept as long as the summaries: a fresh search could return other
+    # content, and the summaries are keyed on the content they were generated from
+    def search(topic):
+        try:
+            with priority(BATCH):
+                response = cached_search(health_search_query(topic), ttl=ttl)
+                content, _ = build_context(topic, response)
+            return content
+        except Exception as e:
+            print(f"Search failed for {topic}: {str(e)}", file=sys.stderr)
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        contents = list(executor.map(search, topics))
+    counts["failed"] += contents.count(None)
+
+    # Summarize the topics that are not cached yet
+    summaries: Dict[str, str] = {}
+    missing = []
+    for topic, content in zip(topics, contents):
+        if content is None:
+            continue
+        summary = summary_cache.lookup(topic, content)
+        if summary is not None:
+            summaries[topic] = summary
+            counts["summaries_cached"] += 1
+        else:
+            missing.append((topic, content))
+
+    outputs = run_batch(
+        get_model(SUMMARY), [summary_messages(t, c) for t, c in missing], concurrency
+    )
+    for (topic, content), output in zip(missing, outputs):
+        if isinstance(output, Exception):
+            print(f"Summary failed for {topic}: {str(output)}", file=sys.stderr)
+            counts["failed"] += 1
+            continue
+        summary_cache.store(topic, content, output, ttl)
+        summaries[topic] = output
+        counts["summaries"] += 1
+
+    # Generate both kinds of quiz question for every summary; multiple-choice
+    # questions come as a batch constrained to the question bank schema
+    model = get_model(QUIZ)
+    builders = {
+        QUESTION: (model, quiz_messages),
+        MULTIPLE_CHOICE: (quiz_model(model), multiple_choice_messages),
+    }
+    for kind, (runnable, build_messages) in builders.items():
+        jobs = []
+        for topic, summary in summaries.items():
+            stored = quiz_bank(summary) if kind == MULTIPLE_CHOICE else stored_quiz(kind, summary)
+            if stored:
+                counts["quizzes_cached"] += 1
+            else:
+                jobs.append((topic, summary))
+
+        outputs = run_batch(runnable, [build_messages(t, s) for t, s in jobs], concurrency)
+        counts = store_quizzes(kind, jobs, outputs, ttl, counts)
+
+    return counts
+
+
+def store_quizzes(kind: str, jobs: List, outputs: List, ttl: Optional[float], counts: Dict) -> Dict:
+    """
+    Validate generated quiz questions and add them to the quiz store, or to the
+    question bank for multiple-choice questions.
+
+    Args:
+        kind: QUESTION or MULTIPLE_CHOICE
+        jobs: (topic, summary) pairs the questions were generated for
+        outputs: Model output text, or the exception raised, for each job
+        ttl: Seconds the questions stay valid, or None for the default
+        counts: Counts to update
+
+    Returns:
+        Dict[str, int]: The updated counts
+    """
+    for (topic, summary), output in zip(jobs, outputs):
+        try:
+            if isinstance(output, Exception):
+                raise output
+            quizzes = parse_multiple_choice(output) if kind == MULTIPLE_CHOICE else [output]
+        except Exception as e:
+            print(f"Quiz ({kind}) failed for {topic}: {str(e)}", file=sys.stderr)
+            counts["failed"] += 1
+            continue
+        if kind == MULTIPLE_CHOICE:
+            add_to_bank(summary, quizzes, ttl)
+        else:
+            store_quiz(kind, summary, quizzes[0], ttl)
+        counts["quizzes"] += len(quizzes)
+    return counts
+
+
+def main():
+    """
+    Main function to run the HealthBot batch.
+    """
+    args = parse_args()
+
+    # Check for required API keys
+    # Searches answered only by the local index need no Tavily key
+    keys = ["OPENAI_API_KEY"] + ([] if SEARCH_BACKEND == "local" else ["TAVILY_API_KEY"])
+    for key in keys:
+        if not os.getenv(key):
+            print(f"Error: {key} not found in environment variables.", file=sys.stderr)
+            sys.exit(1)
+
+    topics = read_topics(args.topics)
+    print(f"Pregenerating content for {len(topics)} topics...")
+    counts = pregenerate(topics, args.concurrency, args.ttl)
+
+    print(
+        f"Summaries: {counts['summaries']} generated, {counts['summaries_cached']} already cached\n"
+        f"Quizzes: {counts['quizzes']} generated, {counts['quizzes_cached']} already cached\n"
+        f"Failed: {counts['failed']}"
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
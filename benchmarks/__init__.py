@@ -0,0 +1,5 @@
+"""
+HealthBot Benchmarks Package
+This package measures the cost of the HealthBot workflow itself by running it
+against deterministic local stand-ins for the language model and Tavily.
+"""
@@ -0,0 +1,309 @@
+"""
+HealthBot Benchmark Fakes Module
+This module provides deterministic local stand-ins for the language model and
+the Tavily client, with configurable latency, response size and failure rate.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+# Prompts of at least this many tokens reuse the longest prefix seen before, in
+# steps of PROMPT_CACHE_STEP tokens, as with OpenAI's prompt caching
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP = 128
+
+# Words the fake responses are built from
+FAKE_WORDS = (
+    "health patients symptoms treatment doctor daily care risk body common "
+    "early signs blood levels medicine lifestyle exercise diet sleep check"
+).split()
+
+
+class FakeServiceError(RuntimeError):
+    """Simulated failure of a fake service."""
+
+
+class FakeLatency:
+    """
+    Seeded source of simulated latencies and failures shared by the fakes.
+
+    Args:
+        latency: Mean delay per call in seconds
+        jitter: Maximum random deviation from the mean, as a fraction of it
+        failure_rate: Probability (0-1) that a call fails
+        seed: Seed for the random generator, so runs are repeatable
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> float:
+        """
+        Draw the delay for one call, raising if the call is chosen to fail.
+
+        Returns:
+            float: Delay in seconds
+        """
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            factor = 1 + self.jitter * (2 * self._random.random() - 1)
+        if failed:
+            raise FakeServiceError("Simulated service failure")
+        return max(0.0, self.latency * factor)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering HealthBot prompts locally with canned responses.
+
+    The response type (summary, quiz question, JSON quiz or grade) is chosen from
+    the prompt. Calls wait `latency` seconds before the first token and
+    `token_latency` seconds per token, and report approximate token usage,
+    including the prompt tokens a provider's prompt cache would have served.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+    output_tokens: int = 200
+    seed: int = 0
+
+    _timing: FakeLatency = PrivateAttr()
+    _prefixes: set = PrivateAttr(default_factory=set)
+    _prefix_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._timing = FakeLatency(self.latency, self.jitter, self.failure_rate, self.seed)
+
+    def cached_tokens(self, messages: List[BaseMessage], input_tokens: int) -> int:
+        """
+        Count the prompt tokens a provider's prompt cache would serve, and
+        remember the prompt's prefixes for later calls.
+
+        Args:
+            messages: Prompt messages
+            input_tokens: Approximate prompt tokens
+
+        Returns:
+            int: Tokens of the longest cached prefix
+        """
+        if input_tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        text = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        cached, hit = 0, True
+        with self._prefix_lock:
+            for size in range(PROMPT_CACHE_MIN_TOKENS, input_tokens + 1, PROMPT_CACHE_STEP):
+                # About 4 characters per token, as count_tokens_approximately assumes
+                prefix = hash(text[: size * 4])
+                hit = hit and prefix in self._prefixes
+                if hit:
+                    cached = size
+                self._prefixes.add(prefix)
+        return cached
+
+    @property
+    def _llm_type(self) -> str:
+        return "healthbot-fake"
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        """
+        Build the canned response for a prompt.
+
+        Args:
+            messages: Prompt messages
+
+        Returns:
+            str: Response text
+        """
+        prompt = " ".join(str(m.content) for m in messages)
+        if "JSON format" in prompt:
+            signs = ["common", "early", "daily", "frequent", "typical"]
+            return json.dumps(
+                {
+                    "questions": [
+                        {
+                            "question": f"Which of these are {sign} signs? (Select all that apply)",
+                            "options": ["Fatigue", "Blue hair", "Thirst", "Glowing skin"],
+                            "correct_answers": [0, 2],
+                            "explanation": "Fatigue and thirst are mentioned in the summary.",
+                        }
+                        for sign in signs
+                    ]
+                }
+            )
+        if "letter grade" in prompt:
+            return "Grade: B\n" + self._text(self.output_tokens // 2)
+        if "quiz question" in prompt:
+            return "What is one common sign mentioned in the summary?"
+        return self._text(self.output_tokens)
+
+    def _text(self, tokens: int) -> str:
+        return " ".join(FAKE_WORDS[i % len(FAKE_WORDS)] for i in range(max(tokens, 1)))
+
+    def _result(self, messages: List[BaseMessage], text: str) -> AIMessage:
+        input_tokens = count_tokens_approximately(messages)
+        output_tokens = len(text.split())
+        return AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {
+                    "cache_read": self.cached_tokens(messages, input_tokens)
+                },
+            },
+        )
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self._timing.draw()
+        text = self.respond(messages)
+        time.sleep(delay + self.token_latency * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=self._result(messages, text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self._timing.draw()
+        text = self.respond(messages)
+        await asyncio.sleep(delay + self.token_latency * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=self._result(messages, text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._timing.draw())
+        text = self.respond(messages)
+        for chunk in self._chunks(text):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        usage = self._result(messages, text).usage_metadata
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._timing.draw())
+        text = self.respond(messages)
+        for chunk in self._chunks(text):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        usage = self._result(messages, text).usage_metadata
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+class FakeTavilyClient:
+    """
+    Stand-in for `TavilyClient` returning generated search results.
+
+    Args:
+        latency: Mean delay per search in seconds
+        jitter: Maximum random deviation from the mean, as a fraction of it
+        failure_rate: Probability (0-1) that a search fails
+        results: Number of results returned per search
+        content_words: Words of content per result
+        seed: Seed for the random generator, so runs are repeatable
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        results: int = 5,
+        content_words: int = 150,
+        seed: int = 0,
+    ):
+        self.results = results
+        self.content_words = content_words
+        self._timing = FakeLatency(latency, jitter, failure_rate, seed)
+
+    def search(self, query: str, **kwargs) -> Dict:
+        """
+        Return generated search results for a query.
+
+        Args:
+            query: The search query
+            **kwargs: Tavily search options, ignored
+
+        Returns:
+            Dict: Search response shaped like Tavily's
+        """
+        time.sleep(self._timing.draw())
+        content = " ".join(
+            FAKE_WORDS[i % len(FAKE_WORDS)] for i in range(self.content_words)
+        )
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"{query} ({i + 1})",
+                    "url": f"https://example.org/{i + 1}",
+                    "content": f"{query}: {content}",
+                    "score": 1.0 - i / max(self.results, 1),
+                }
+                for i in range(self.results)
+            ],
+        }
+
+
+def install_fakes(model: BaseChatModel, tavily_client: FakeTavilyClient) -> None:
+    """
+    Route HealthBot's model and search calls to the given fakes.
+
+    Must be called before the first model or search call.
+
+    Args:
+        model: Chat model used in place of ChatOpenAI
+        tavily_client: Client used in place of TavilyClient
+    """
+    from src.clients import set_client
+
+    set_client("model", model)
+    set_client("tavily", tavily_client)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+HealthBot Fake OpenAI Server
+This script serves the benchmark fake model over an OpenAI-compatible chat
+completions API, as a local stand-in for testing the routing of tasks to a
+local endpoint (HEALTHBOT_<TASK>_MODEL_BASE_URL) without calling OpenAI.
+
+Usage:
+    python -m benchmarks.openai_server --port 8800 --latency 0.05
+    HEALTHBOT_QUIZ_MODEL_BASE_URL=http://127.0.0.1:8800/v1 python main.py
+"""
+
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from benchmarks.fakes import FakeChatModel
+
+# Message classes by OpenAI role
+ROLES = {"system": SystemMessage, "developer": SystemMessage, "assistant": AIMessage}
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Serve the fake model over the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8800, help="Port to listen on.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds before the first token."
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="Seconds per generated token."
+    )
+    parser.add_argument(
+        "--tokens", type=int, default=200, help="Tokens in a summary-sized answer."
+    )
+    return parser.parse_args()
+
+
+def chat_messages(messages: List[Dict[str, Any]]) -> List[BaseMessage]:
+    """
+    Convert OpenAI chat messages to LangChain messages.
+
+    Args:
+        messages: Messages of a chat completions request
+
+    Returns:
+        List[BaseMessage]: The messages
+    """
+    converted = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        converted.append(ROLES.get(message.get("role"), HumanMessage)(content=content))
+    return converted
+
+
+def completion_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert LangChain usage metadata to OpenAI's usage object.
+
+    Args:
+        usage: Usage metadata of the fake model's answer
+
+    Returns:
+        Dict: Usage with prompt, completion and cached token counts
+    """
+    return {
+        "prompt_tokens": usage["input_tokens"],
+        "completion_tokens": usage["output_tokens"],
+        "total_tokens": usage["total_tokens"],
+        "prompt_tokens_details": {
+            "cached_tokens": usage.get("input_token_details", {}).get("cache_read", 0)
+        },
+    }
+
+
+def make_handler(model: FakeChatModel):
+    """
+    Build the request handler class answering with `model`.
+
+    Args:
+        model: The fake model
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self.send_json(
+                    200, {"object": "list", "data": [{"id": "healthbot-fake", "object": "model"}]}
+                )
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "Not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            messages = chat_messages(request.get("messages", []))
+            completion = {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "created": int(time.time()),
+                "model": request.get("model") or "healthbot-fake",
+            }
+
+            if not request.get("stream"):
+                answer = model.invoke(messages)
+                self.send_json(
+                    200,
+                    {
+                        **completion,
+                        "object": "chat.completion",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": answer.content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": completion_usage(answer.usage_metadata),
+                    },
+                )
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunk = {**completion, "object": "chat.completion.chunk"}
+
+            def send(body):
+                self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+                self.wfile.flush()
+
+            usage = None
+            for piece in model.stream(messages):
+                usage = piece.usage_metadata or usage
+                if piece.content:
+                    delta = {"role": "assistant", "content": piece.content}
+                    send({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            send({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if usage and (request.get("stream_options") or {}).get("include_usage"):
+                send({**chunk, "choices": [], "usage": completion_usage(usage)})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def main():
+    """
+    Main function to run the fake OpenAI server.
+    """
+    args = parse_args()
+    model = FakeChatModel(
+        latency=args.latency, token_latency=args.token_latency, output_tokens=args.tokens
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(model))
+    print(f"Serving the fake model at http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+HealthBot Benchmark Runner
+This script drives simulated patients through the HealthBot workflow graph or the
+Streamlit app, with the language model and Tavily replaced by local fakes, and
+reports per-node latency percentiles, throughput and peak memory.
+
+Usage:
+    python -m benchmarks.run --target graph --users 50 --llm-latency 0.5
+    python -m benchmarks.run --target app --users 5 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Benchmarks never talk to the live services; keep their state out of the
+# working tree and satisfy the API key checks before HealthBot is imported
+os.environ.setdefault("HEALTHBOT_CACHE_DIR", tempfile.mkdtemp(prefix="healthbot-bench-"))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from benchmarks.fakes import FakeChatModel, FakeTavilyClient, install_fakes
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Topics the simulated patients ask about, cycled through by user
+TOPICS = [
+    "diabetes",
+    "asthma",
+    "hypertension",
+    "migraine",
+    "arthritis",
+    "influenza",
+    "anemia",
+    "eczema",
+]
+
+
+class LatencyRecorder:
+    """Collect latency samples by name from many threads."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        """
+        Record one latency sample.
+
+        Args:
+            name: What was timed, e.g. a node name
+            seconds: Elapsed time in seconds
+        """
+        with self._lock:
+            self.samples[name].append(seconds)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """
+    Callback handler timing every workflow node run that completes.
+
+    Node runs interrupted to wait for the patient are not recorded, since their
+    duration includes the patient's think time.
+    """
+
+    run_inline = True
+
+    def __init__(self, recorder: LatencyRecorder):
+        self.recorder = recorder
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            self.recorder.add(node, time.perf_counter() - start)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark HealthBot against a fake language model and search API."
+    )
+    parser.add_argument(
+        "--target",
+        choices=["graph", "app"],
+        default="graph",
+        help="Drive the LangGraph workflow (as the headless server does) or the Streamlit app.",
+    )
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated patients.")
+    parser.add_argument("--topics", type=int, default=1, help="Topics studied per patient.")
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="Seconds each patient waits before answering."
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mean model latency in seconds.")
+    parser.add_argument(
+        "--llm-token-latency", type=float, default=0.0, help="Seconds per generated token."
+    )
+    parser.add_argument("--llm-tokens", type=int, default=200, help="Tokens per generated summary.")
+    parser.add_argument(
+        "--llm-failure-rate", type=float, default=0.0, help="Probability that a model call fails."
+    )
+    parser.add_argument(
+        "--search-latency", type=float, default=0.3, help="Mean search latency in seconds."
+    )
+    parser.add_argument(
+        "--search-failure-rate", type=float, default=0.0, help="Probability that a search fails."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.2, help="Random latency deviation as a fraction of the mean."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the fakes.")
+    parser.add_argument("--output", help="Also write the report as JSON to this file.")
+    return parser.parse_args()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples.
+
+    Args:
+        samples: The samples
+        pct: Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, or 0.0 for no samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process or, if larger, of its worker processes.
+
+    Returns:
+        int: Peak RSS in bytes
+    """
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def patient_answers(user: int, topics: int) -> List[str]:
+    """
+    Build the answers a simulated patient gives to the workflow's prompts.
+
+    Args:
+        user: Index of the patient
+        topics: Number of topics the patient studies
+
+    Returns:
+        List[str]: Answers in prompt order
+    """
+    answers = []
+    for i in range(topics):
+        topic = TOPICS[(user + i) % len(TOPICS)]
+        last = i == topics - 1
+        answers += [topic, "yes", "A, C", "no" if last else "yes"]
+    return answers
+
+
+async def run_graph_user(app, user: int, args, recorder: LatencyRecorder) -> int:
+    """
+    Drive one simulated patient through the workflow graph.
+
+    Args:
+        app: Compiled async HealthBot workflow
+        user: Index of the patient
+        args: Benchmark arguments
+        recorder: Collects node latencies
+
+    Returns:
+        int: Number of turns taken
+    """
+    from server import run_turn
+
+    thread_id = f"bench-{user}-{uuid4().hex}"
+    callbacks = [NodeTimer(recorder)]
+    answers = iter(patient_answers(user, args.topics))
+    turns = 0
+
+    response = await run_turn(app, thread_id, callbacks=callbacks)
+    while not response["done"]:
+        await asyncio.sleep(args.think_time)
+        start = time.perf_counter()
+        response = await run_turn(app, thread_id, next(answers, "no"), callbacks=callbacks)
+        recorder.add("turn", time.perf_counter() - start)
+        turns += 1
+    return turns
+
+
+async def run_graph(args, recorder: LatencyRecorder) -> Dict:
+    """
+    Drive all simulated patients through the workflow graph concurrently.
+
+    Args:
+        args: Benchmark arguments
+        recorder: Collects node latencies
+
+    Returns:
+        Dict: Session and turn counts
+    """
+    from src.workflow import create_workflow
+
+    app, _ = create_workflow(async_mode=True)
+    results = await asyncio.gather(
+        *(run_graph_user(app, user, args, recorder) for user in range(args.users)),
+        return_exceptions=True,
+    )
+    turns = sum(r for r in results if not isinstance(r, BaseException))
+    failed = [r for r in results if isinstance(r, BaseException)]
+    return {
+        "sessions": len(results) - len(failed),
+        "failed": len(failed),
+        "turns": turns,
+        "errors": dict(Counter(type(e).__name__ for e in failed)),
+    }
+
+
+def run_app_user(user: int, args, recorder: LatencyRecorder) -> int:
+    """
+    Drive one simulated patient through the Streamlit app's state machine.
+
+    Each interaction is timed under the name of the app state it leads into.
+
+    Args:
+        user: Index of the patient
+        args: Benchmark arguments
+        recorder: Collects step latencies
+
+    Returns:
+        int: Number of interactions taken
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    turns = 0
+
+    def step(name, action):
+        nonlocal turns
+        time.sleep(args.think_time)
+        start = time.perf_counter()
+        action()
+        recorder.add(f"app:{name}", time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        turns += 1
+
+    def click(label):
+        # After an st.rerun() the test tree can still hold checkboxes the
+        # session has dropped; give them a value so the next run can start
+        for checkbox in at.checkbox:
+            try:
+                checkbox.value
+            except KeyError:
+                checkbox.set_value(False)
+        return next(b for b in at.button if b.label == label).click().run
+
+    step("initial", at.run)
+    for i in range(args.topics):
+        at.text_input[0].input(TOPICS[(user + i) % len(TOPICS)])
+        step("summarized", click("Learn about this topic"))
+        step("quiz", click("Yes, I'm ready"))
+        at.checkbox[0].check()
+        at.checkbox[2].check()
+        step("feedback", click("Submit Answer"))
+        if i == args.topics - 1:
+            step("completed", click("No, exit"))
+        else:
+            step("initial", click("Yes, new topic"))
+    return turns
+
+
+def run_app_session(user: int, args) -> tuple:
+    """
+    Run one simulated patient through the Streamlit app in a worker process.
+
+    Args:
+        user: Index of the patient
+        args: Benchmark arguments
+
+    Returns:
+        tuple: Number of interactions taken and the step latency samples
+    """
+    recorder = LatencyRecorder()
+    turns = run_app_user(user, args, recorder)
+    return turns, dict(recorder.samples)
+
+
+def init_app_worker(args) -> None:
+    """
+    Set up a worker process of the app benchmark.
+
+    Each worker stands in for a separate app server, so it gets a checkpoint
+    database of its own instead of contending for one across processes.
+
+    Args:
+        args: Benchmark arguments
+    """
+    os.environ["HEALTHBOT_CHECKPOINT_PATH"] = os.path.join(
+        os.environ["HEALTHBOT_CACHE_DIR"], f"checkpoints-{os.getpid()}.sqlite"
+    )
+    install_benchmark_fakes(args)
+
+
+def run_app(args, recorder: LatencyRecorder) -> Dict:
+    """
+    Drive all simulated patients through the Streamlit app concurrently.
+
+    Streamlit's test harness runs one app at a time per process, so each
+    patient gets a worker process of its own.
+
+    Args:
+        args: Benchmark arguments
+        recorder: Collects step latencies
+
+    Returns:
+        Dict: Session and turn counts
+    """
+    with ProcessPoolExecutor(
+        max_workers=args.users, initializer=init_app_worker, initargs=(args,)
+    ) as executor:
+        futures = [executor.submit(run_app_session, user, args) for user in range(args.users)]
+    turns, errors = 0, Counter()
+    for future in futures:
+        if future.exception() is not None:
+            errors[type(future.exception()).__name__] += 1
+            continue
+        session_turns, samples = future.result()
+        turns += session_turns
+        for name, seconds in samples.items():
+            for sample in seconds:
+                recorder.add(name, sample)
+    failed = sum(errors.values())
+    return {
+        "sessions": len(futures) - failed,
+        "failed": failed,
+        "turns": turns,
+        "errors": dict(errors),
+    }
+
+
+def install_benchmark_fakes(args) -> None:
+    """
+    Replace the language model and Tavily with fakes configured from the arguments.
+
+    Args:
+        args: Benchmark arguments
+    """
+    from src.instrumentation import model_callbacks
+
+    install_fakes(
+        FakeChatModel(
+            latency=args.llm_latency,
+            token_latency=args.llm_token_latency,
+            jitter=args.jitter,
+            failure_rate=args.llm_failure_rate,
+            output_tokens=args.llm_tokens,
+            seed=args.seed,
+            callbacks=model_callbacks(),
+        ),
+        FakeTavilyClient(
+            latency=args.search_latency,
+            jitter=args.jitter,
+            failure_rate=args.search_failure_rate,
+            seed=args.seed,
+        ),
+    )
+
+
+def format_report(report: Dict) -> str:
+    """
+    Format a benchmark report as a text table.
+
+    Args:
+        report: The benchmark report
+
+    Returns:
+        str: Human-readable report
+    """
+    lines = [
+        f"Target: {report['target']}  users: {report['users']}  "
+        f"sessions: {report['sessions']}  failed: {report['failed']}",
+        *[f"  {name}: {count}" for name, count in report["errors"].items()],
+        f"Wall time: {report['wall_seconds']:.2f}s  "
+        f"throughput: {report['sessions_per_second']:.2f} sessions/s, "
+        f"{report['turns_per_second']:.2f} turns/s  "
+        f"peak RSS: {report['peak_rss_bytes'] / 2**20:.1f} MiB",
+        "",
+        f"{'step':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for name, stats in report["latency"].items():
+        lines.append(
+            f"{name:<28}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}"
+            f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+        )
+    if report["cached_token_ratio"]:
+        lines += ["", f"{'prompt tokens cached':<28}{'ratio':>8}"]
+        for name, ratio in report["cached_token_ratio"].items():
+            lines.append(f"{name:<28}{ratio:>8.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    """
+    Main function to run the HealthBot benchmark.
+    """
+    args = parse_args()
+    from src.instrumentation import cached_token_ratios
+
+    install_benchmark_fakes(args)
+
+    recorder = LatencyRecorder()
+    start = time.perf_counter()
+    if args.target == "graph":
+        counts = asyncio.run(run_graph(args, recorder))
+    else:
+        counts = run_app(args, recorder)
+    wall = time.perf_counter() - start
+
+    report = {
+        "target": args.target,
+        "users": args.users,
+        **counts,
+        "wall_seconds": wall,
+        "sessions_per_second": counts["sessions"] / wall,
+        "turns_per_second": counts["turns"] / wall,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "latency": {
+            name: {
+                "count": len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+            }
+            for name, samples in sorted(recorder.samples.items())
+        },
+        # Only recorded with HEALTHBOT_INSTRUMENTATION=true
+        "cached_token_ratio": dict(sorted(cached_token_ratios().items())),
+    }
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
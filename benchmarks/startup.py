@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+HealthBot Startup Benchmark
+This script measures how long HealthBot takes to start: a fresh CLI process up to
+the first prompt, creating the shared clients, and Streamlit script runs of app.py.
+
+Usage:
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Keep caches and checkpoints out of the working tree and satisfy the API key
+# checks; no requests are sent
+os.environ.setdefault("HEALTHBOT_CACHE_DIR", tempfile.mkdtemp(prefix="healthbot-bench-"))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code run in a fresh interpreter, up to the point where the CLI prompts for a topic
+CLI_STARTUP = "import main; from src.workflow import create_workflow; create_workflow()"
+
+# Code run in a fresh interpreter that creates the shared clients
+CLIENTS_STARTUP = "from src.clients import get_model, get_tavily_client; get_model(); get_tavily_client()"
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark HealthBot startup time.")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per scenario.")
+    return parser.parse_args()
+
+
+def time_process(code: str, repeat: int) -> List[float]:
+    """
+    Time fresh interpreters running `code`.
+
+    Args:
+        code: Python code to run
+        repeat: Number of processes to time
+
+    Returns:
+        List[float]: Wall time of each process in seconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_app_runs(repeat: int) -> Dict[str, List[float]]:
+    """
+    Time the first run of app.py and the reruns after it, as Streamlit does
+    on every interaction.
+
+    Args:
+        repeat: Number of reruns to time
+
+    Returns:
+        Dict[str, List[float]]: Samples for the first run and the reruns
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+
+    reruns = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - start)
+    return {"app first run": [first], "app rerun": reruns}
+
+
+def main():
+    """
+    Main function to run the startup benchmark.
+    """
+    args = parse_args()
+
+    # Nothing imported yet, so the baseline is the bare interpreter
+    results = {
+        "python": time_process("pass", args.repeat),
+        "cli to first prompt": time_process(CLI_STARTUP, args.repeat),
+        "create clients": time_process(CLIENTS_STARTUP, args.repeat),
+    }
+    results.update(time_app_runs(args.repeat))
+
+    print(f"{'scenario':<24}{'runs':>6}{'median ms':>12}{'min ms':>10}")
+    for name, samples in results.items():
+        print(
+            f"{name:<24}{len(samples):>6}{statistics.median(samples) * 1000:>12.1f}"
+            f"{min(samples) * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
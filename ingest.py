@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+HealthBot Ingest Script
+This script builds the local search index that the "local" and "local+tavily"
+search backends answer from, out of a curated corpus of pages from the trusted
+medical domains.
+
+Pages are read from JSONL files (one {"url", "title", "content" or "html"}
+object per line), from saved HTML pages (their canonical link gives the url),
+or fetched from a list of URLs. Pages outside the trusted domains are skipped.
+Each page is split into passages and indexed for BM25 search with SQLite FTS5.
+
+Usage:
+    python ingest.py pages.jsonl saved_pages/ --urls urls.txt
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+
+# Load .env before importing HealthBot, whose modules read their settings on import
+load_dotenv()
+
+from src.clients import get_client
+from src.retrieval import LOCAL_INDEX_PATH, in_domains
+from src.tools import TRUSTED_DOMAINS
+
+# Passages are about this many words, so a search result is a focused excerpt
+PASSAGE_WORDS = 200
+
+# Elements whose text is page furniture rather than content
+SKIPPED_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg"}
+# Elements that end a paragraph
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "br", "table", "tr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "dd", "dt",
+}
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Build the HealthBot local search index.")
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        help="JSONL files, HTML files, or directories containing them.",
+    )
+    parser.add_argument(
+        "--urls", help="File with one page URL per line to fetch ('#' starts a comment)."
+    )
+    parser.add_argument(
+        "--output",
+        default=LOCAL_INDEX_PATH,
+        help=f"Index file to write (default: {LOCAL_INDEX_PATH}).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of pages fetched at the same time.",
+    )
+    return parser.parse_args()
+
+
+class PageTextParser(HTMLParser):
+    """Extract the title, canonical url and paragraphs of text from an HTML page."""
+
+    def __init__(self):
+        super().__init__()
+        self.title = ""
+        self.url = ""
+        self.paragraphs: List[str] = []
+        self._current: List[str] = []
+        self._skipping = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "link" and attrs.get("rel") == "canonical":
+            self.url = self.url or attrs.get("href") or ""
+        elif tag == "meta" and attrs.get("property") == "og:url":
+            self.url = self.url or attrs.get("content") or ""
+        elif tag == "title":
+            self._in_title = True
+        elif tag in SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skipping:
+            self._current.append(data)
+
+    def _end_paragraph(self):
+        text = " ".join(" ".join(self._current).split())
+        if text:
+            self.paragraphs.append(text)
+        self._current = []
+
+    def close(self):
+        super().close()
+        self._end_paragraph()
+        self.title = " ".join(self.title.split())
+
+
+def html_page(html: str, url: str = "") -> Dict[str, str]:
+    """
+    Turn an HTML page into a page record.
+
+    Args:
+        html: The page's HTML
+        url: The page's url, if known; otherwise its canonical link is used
+
+    Returns:
+        Dict[str, str]: Page with "url", "title" and "content"
+    """
+    parser = PageTextParser()
+    parser.feed(html)
+    parser.close()
+    return {
+        "url": url or parser.url,
+        "title": parser.title,
+        "content": "\n\n".join(parser.paragraphs),
+    }
+
+
+def read_pages(path: str) -> Iterator[Dict[str, str]]:
+    """
+    Read page records from a JSONL or HTML file, or a directory of them.
+
+    Args:
+        path: File or directory
+
+    Yields:
+        Dict[str, str]: Pages with "url", "title" and "content"
+    """
+    if os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith((".jsonl", ".html", ".htm")):
+                    yield from read_pages(os.path.join(root, name))
+        return
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "html" in record and not record.get("content"):
+                    page = html_page(record["html"], record.get("url", ""))
+                    yield {**page, "title": record.get("title") or page["title"]}
+                else:
+                    yield {
+                        "url": record.get("url", ""),
+                        "title": record.get("title", ""),
+                        "content": record.get("content", ""),
+                    }
+        else:
+            yield html_page(f.read())
+
+
+def fetch_pages(path: str, concurrency: int) -> Iterator[Dict[str, str]]:
+    """
+    Fetch the pages listed in a URL file with the shared HTTP client.
+
+    Args:
+        path: File with one URL per line
+        concurrency: Maximum number of pages fetched at the same time
+
+    Yields:
+        Dict[str, str]: Pages with "url", "title" and "content"
+    """
+    with open(path) as f:
+        urls = [line.split("#", 1)[0].strip() for line in f]
+    urls = [url for url in dict.fromkeys(urls) if url]
+    http = get_client("http")
+
+    def fetch(url) -> Optional[Dict[str, str]]:
+        try:
+            response = http.get(url, follow_redirects=True)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Fetching {url} failed: {str(e)}", file=sys.stderr)
+            return None
+        return html_page(response.text, url)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for page in executor.map(fetch, urls):
+            if page is not None:
+                yield page
+
+
+def split_page(content: str, max_words: int = PASSAGE_WORDS) -> List[str]:
+    """
+    Split page content into passages of about `max_words` words.
+
+    Paragraphs are kept together where they fit; longer ones are split at
+    sentence boundaries.
+
+    Args:
+        content: Page text, with paragraphs separated by blank lines
+        max_words: Words per passage
+
+    Returns:
+        List[str]: Passages in page order
+    """
+    passages, current = [], []
+    for paragraph in re.split(r"\n\s*\n", content):
+        for sentence in re.split(r"(?<=[.!?])\s+", " ".join(paragraph.split())):
+            words = sentence.split()
+            if current and len(current) + len(words) > max_words:
+                passages.append(" ".join(current))
+                current = []
+            current.extend(words)
+        # Short paragraphs are merged with the next; long ones end their passage
+        if len(current) >= max_words // 2:
+            passages.append(" ".join(current))
+            current = []
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def build_index(pages: Iterator[Dict[str, str]], output: str) -> Dict[str, int]:
+    """
+    Index the passages of the pages from the trusted domains.
+
+    The index is written next to `output` and moved into place once complete,
+    so running searches keep reading the previous index until then.
+
+    Args:
+        pages: Page records
+        output: Index file to write
+
+    Returns:
+        Dict[str, int]: Counts of indexed pages and passages, and skipped pages
+    """
+    counts = dict.fromkeys(["pages", "passages", "skipped"], 0)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    building = f"{output}.building"
+    if os.path.exists(building):
+        os.remove(building)
+
+    conn = sqlite3.connect(building)
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE passages USING fts5("
+            "title, content, url UNINDEXED, tokenize='porter unicode61')"
+        )
+        seen = set()
+        for page in pages:
+            url, content = page["url"], page["content"].strip()
+            if not content or url in seen or not in_domains(url, TRUSTED_DOMAINS):
+                counts["skipped"] += 1
+                continue
+            seen.add(url)
+            passages = split_page(content)
+            conn.executemany(
+                "INSERT INTO passages (title, content, url) VALUES (?, ?, ?)",
+                [(page["title"], passage, url) for passage in passages],
+            )
+            counts["pages"] += 1
+            counts["passages"] += len(passages)
+        conn.execute("INSERT INTO passages (passages) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(building, output)
+    return counts
+
+
+def main():
+    """
+    Main function to build the HealthBot local search index.
+    """
+    args = parse_args()
+    if not args.sources and not args.urls:
+        print("Error: give page files or directories, or --urls.", file=sys.stderr)
+        sys.exit(1)
+
+    def pages():
+        for source in args.sources:
+            yield from read_pages(source)
+        if args.urls:
+            yield from fetch_pages(args.urls, args.concurrency)
+
+    counts = build_index(pages(), args.output)
+    print(
+        f"Indexed {counts['passages']} passages from {counts['pages']} pages into {args.output}\n"
+        f"Skipped: {counts['skipped']} (empty, duplicate or outside the trusted domains)"
+    )
+    if not counts["pages"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,73 @@ HealthBot Main Script
 This script runs the HealthBot application from the command line.
 """
 
+import argparse
 import os
 import sys
+import uuid
 from langchain_core.runnables import RunnableConfig
 from dotenv import load_dotenv
 
+# Load .env before importing HealthBot, whose modules read their settings on import
+load_dotenv()
+
+from src import prefetch
+from src.clients import warm_up
+from src.deadline import DeadlineExceeded, SessionCancelled, cancel_session
+from src.nodes import quiz_prefetch_key
+from src.ratelimit import is_rate_limit_error
+from src.retrieval import SEARCH_BACKEND
 from src.workflow import create_workflow
-from src.utils import display_text_to_user
+from src.utils import OUTPUT_SINKS, display_text_to_user, get_output_sink, set_output_sink
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Run HealthBot from the command line.")
+    parser.add_argument(
+        "--output",
+        choices=sorted(OUTPUT_SINKS),
+        default="stdout",
+        help="Where HealthBot output is written: straight to stdout, buffered "
+        "until the next prompt, or captured in memory for headless runs.",
+    )
+    return parser.parse_args()
 
 
 def main():
     """
     Main function to run the HealthBot application.
     """
-    # Load environment variables
-    load_dotenv()
+    args = parse_args()
+    set_output_sink(OUTPUT_SINKS[args.output]())
+
     # Check for required API keys
     if not os.getenv("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY not found in environment variables.")
         print("Please create a .env file with your OpenAI API key.")
         sys.exit(1)
 
-    if not os.getenv("TAVILY_API_KEY"):
+    # Searches answered only by the local index need no Tavily key
+    if SEARCH_BACKEND != "local" and not os.getenv("TAVILY_API_KEY"):
         print("Error: TAVILY_API_KEY not found in environment variables.")
         print("Please create a .env file with your Tavily API key.")
         sys.exit(1)
 
+    # Create the model and search clients while the patient types a topic
+    warm_up()
+
     # Create the workflow
     app, _ = create_workflow()
 
-    # Configure the workflow
+    # Configure the workflow, streaming model output as it is generated
     config = RunnableConfig(
-        recursion_limit=2000, configurable={"thread_id": "healthbot-session"}
+        recursion_limit=2000,
+        configurable={"thread_id": f"healthbot-{uuid.uuid4().hex}", "stream": True},
     )
 
     # Initialize state
@@ -52,10 +87,32 @@ def main():
         # Display exit message
         display_text_to_user("\nThank you for using HealthBot! Stay healthy!\n")
     except KeyboardInterrupt:
+        # Drop any quiz still being generated for the abandoned topic
+        prefetch.cancel(quiz_prefetch_key(config))
+        cancel_session(config["configurable"]["thread_id"])
         display_text_to_user("\n\nHealthBot session ended by user. Stay healthy!\n")
+    except DeadlineExceeded as e:
+        get_output_sink().flush()
+        print(f"\nHealthBot timed out: {str(e)}")
+        print(
+            "The model or search service is responding slowly. Please try again later, "
+            "or raise HEALTHBOT_NODE_DEADLINE(S)."
+        )
+    except SessionCancelled:
+        get_output_sink().flush()
+        print("\nThe HealthBot session was cancelled. Please start it again.")
     except Exception as e:
+        get_output_sink().flush()
         print(f"\nAn error occurred: {str(e)}")
-        print("Please check your API keys and internet connection.")
+        if is_rate_limit_error(e):
+            print(
+                "The OpenAI or Tavily usage quota was exceeded. Please try again in a "
+                "minute, or set HEALTHBOT_MODEL_RPM/TPM and HEALTHBOT_SEARCH_RPM to your quotas."
+            )
+        else:
+            print("Please check your API keys and internet connection.")
+    finally:
+        get_output_sink().flush()
 
 
 if __name__ == "__main__":
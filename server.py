@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+HealthBot Headless Server
+This script serves many HealthBot sessions from one process over a JSON-lines protocol.
+
+Each line read from stdin is a request for one session:
+
+    {"thread_id": "alice", "input": "diabetes"}
+
+The graph runs until it needs the patient's input, pausing with a LangGraph
+interrupt, and a response line is written to stdout:
+
+    {"thread_id": "alice", "output": "...", "prompt": "Your answer: ", "done": false}
+
+The first request for a thread_id starts a new session (its "input" is ignored);
+later requests resume the session with "input" as the patient's answer. Requests
+for different sessions are processed concurrently.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command, Interrupt
+from dotenv import load_dotenv
+
+# Load .env before importing HealthBot, whose modules read their settings on import
+load_dotenv()
+
+from src.workflow import create_workflow
+from src.clients import warm_up
+from src.retrieval import SEARCH_BACKEND
+from src.utils import CaptureSink, set_output_sink, set_interrupt_input
+
+
+def parse_args():
+    """
+    Parse command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve HealthBot sessions over JSON lines on stdin/stdout."
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=100,
+        help="Maximum number of requests processed at the same time.",
+    )
+    return parser.parse_args()
+
+
+async def pending_interrupts(app, config: RunnableConfig) -> List[Interrupt]:
+    """
+    Get the interrupts a session is paused on.
+
+    Args:
+        app: Compiled async HealthBot workflow
+        config: Run configuration identifying the session
+
+    Returns:
+        List[Interrupt]: Pending interrupts; empty if the session is not paused
+    """
+    snapshot = await app.aget_state(config)
+    return [item for task in snapshot.tasks for item in task.interrupts]
+
+
+async def run_turn(
+    app, thread_id: str, user_input: Optional[str] = None, callbacks: Optional[List] = None
+) -> Dict:
+    """
+    Advance one session until it needs input from the patient or finishes.
+
+    Args:
+        app: Compiled async HealthBot workflow
+        thread_id: Identifies the session
+        user_input: The patient's answer to the pending prompt, if any
+        callbacks: Callback handlers for the run, e.g. to time the nodes
+
+    Returns:
+        Dict: Response with the output shown, the next prompt and a done flag
+    """
+    config = RunnableConfig(
+        recursion_limit=2000, configurable={"thread_id": thread_id}, callbacks=callbacks
+    )
+
+    # Collect this session's output and turn input prompts into interrupts
+    sink = CaptureSink()
+    set_output_sink(sink)
+    set_interrupt_input(True)
+
+    if await pending_interrupts(app, config):
+        await app.ainvoke(Command(resume=user_input or ""), config)
+    else:
+        await app.ainvoke({"messages": []}, config)
+
+    interrupts = await pending_interrupts(app, config)
+    if interrupts:
+        payload = interrupts[0].value
+        return {
+            "thread_id": thread_id,
+            "output": payload["output"] + sink.drain(),
+            "prompt": payload["prompt"],
+            "done": False,
+        }
+
+    return {"thread_id": thread_id, "output": sink.drain(), "prompt": None, "done": True}
+
+
+class SessionLocks:
+    """
+    Per-session locks, so requests for the same session are processed in order.
+
+    A session's lock is kept while any request holds or waits for it, and
+    dropped once the last one is done, so finished sessions don't pile up.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        """
+        Hold the lock of a session for the duration of the block.
+
+        Args:
+            thread_id: Identifies the session
+        """
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        self._users[thread_id] = self._users.get(thread_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[thread_id] -= 1
+            if not self._users[thread_id]:
+                del self._users[thread_id]
+                del self._locks[thread_id]
+
+
+def write_response(response: Dict) -> None:
+    """
+    Write one JSON response line to stdout.
+
+    Args:
+        response: The response to write
+    """
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+
+
+async def handle_line(
+    app, line: str, locks: SessionLocks, semaphore: asyncio.Semaphore
+) -> None:
+    """
+    Process one request line and write its response.
+
+    Requests for the same session are processed in order. A request waits for
+    its session before taking a concurrency slot, so requests queued behind
+    one session don't hold slots other sessions could use.
+
+    Args:
+        app: Compiled async HealthBot workflow
+        line: The JSON request line
+        locks: Per-session locks
+        semaphore: Bounds the number of requests processed concurrently
+    """
+    try:
+        request = json.loads(line)
+        thread_id = str(request["thread_id"])
+    except (ValueError, KeyError, TypeError) as e:
+        write_response({"thread_id": None, "error": f"Invalid request: {str(e)}"})
+        return
+
+    try:
+        async with locks.hold(thread_id), semaphore:
+            response = await run_turn(app, thread_id, request.get("input"))
+    except Exception as e:
+        response = {"thread_id": thread_id, "error": str(e)}
+
+    write_response(response)
+
+
+async def serve(max_concurrency: int) -> None:
+    """
+    Read requests from stdin until it is closed, processing them concurrently.
+
+    Args:
+        max_concurrency: Maximum number of requests processed at the same time
+    """
+    app, _ = create_workflow(async_mode=True)
+    locks = SessionLocks()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        task = asyncio.create_task(handle_line(app, line, locks, semaphore))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+
+
+def main():
+    """
+    Main function to run the HealthBot server.
+    """
+    args = parse_args()
+
+    # Check for required API keys
+    # Searches answered only by the local index need no Tavily key
+    keys = ["OPENAI_API_KEY"] + ([] if SEARCH_BACKEND == "local" else ["TAVILY_API_KEY"])
+    for key in keys:
+        if not os.getenv(key):
+            print(f"Error: {key} not found in environment variables.", file=sys.stderr)
+            sys.exit(1)
+
+    # Create the model and search clients before the first request needs them
+    warm_up()
+
+    asyncio.run(serve(args.max_concurrency))
+
+
+if __name__ == "__main__":
+    main()
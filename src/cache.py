@@ -0,0 +1,523 @@
+"""
+HealthBot Cache Module
+This module provides the persistent on-disk caches used by the HealthBot application.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from src.prompts import prompt_id
+
+# Directory holding all cache databases
+CACHE_DIR = os.getenv("HEALTHBOT_CACHE_DIR", ".healthbot_cache")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize free text so that trivially different queries share a cache key.
+
+    Args:
+        text: The text to normalize
+
+    Returns:
+        str: Lower-cased text with collapsed whitespace
+    """
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+# Roman numerals commonly used in condition names ("type II diabetes")
+_ROMAN_NUMERALS = {"i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5"}
+
+# Filler words that do not change which condition a topic refers to. Single
+# letters and numbers are never filler: "hepatitis a" is not "hepatitis"
+_TOPIC_STOPWORDS = {"an", "the", "of", "and", "about", "on", "in", "for", "disease"}
+
+
+def canonical_topic(topic: str) -> str:
+    """
+    Reduce a health topic to a canonical, word-order independent form.
+
+    "Type 2 diabetes" and "diabetes type II" both become "2 diabetes type".
+
+    Args:
+        topic: The health topic as typed by the user
+
+    Returns:
+        str: Canonical topic string
+    """
+    words = re.findall(r"[a-z0-9]+", normalize_text(topic))
+    words = [_ROMAN_NUMERALS.get(word, word) for word in words]
+    return " ".join(sorted(set(words) - _TOPIC_STOPWORDS))
+
+
+def _distinguishing_tokens(canonical: str) -> Set[str]:
+    # Numbers and single letters tell apart conditions whose names are otherwise
+    # alike, such as "type 1 diabetes" and "type 2 diabetes" or "hepatitis a" and "hepatitis b"
+    return {word for word in canonical.split() if len(word) == 1 or word.isdigit()}
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Build a stable cache key from JSON-serializable parts.
+
+    Args:
+        *parts: Values that together identify a cached entry
+
+    Returns:
+        str: SHA-256 hex digest of the serialized parts
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    SQLite-backed key/value cache with TTL expiry, LRU eviction and hit/miss counters.
+
+    Values are stored as JSON. The database is opened lazily in WAL mode so that
+    several processes (CLI, Streamlit workers) can share the same file.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_entries: int = 1000):
+        """
+        Create a cache backed by the SQLite file at `path`.
+
+        Args:
+            path: Location of the SQLite database file
+            ttl: Seconds an entry stays valid; 0 or less disables the cache
+            max_entries: Maximum number of entries kept before LRU eviction
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _fetch(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    conn.commit()
+                return None
+
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return json.loads(row[0])
+
+    def _count(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached value, refreshing its LRU position on a hit.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if it is missing or expired
+        """
+        if not self.enabled:
+            return None
+        return self._count(self._fetch(key))
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value to store
+            ttl: Seconds this entry stays valid, if not the cache's default
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            self._store(conn, key, value, ttl)
+            conn.commit()
+
+    def _store(self, conn: sqlite3.Connection, key: str, value: Any, ttl: Optional[float]) -> None:
+        # Write a value and make room for it; called with _lock held, before committing
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now),
+        )
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def update(
+        self, key: str, fn: Callable[[Optional[Any]], Any], ttl: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Replace a value with `fn(value)` atomically, even across processes
+        sharing the database, so concurrent updates don't lose each other's changes.
+
+        Args:
+            key: Cache key
+            fn: Function computing the new value from the current one, which
+                is None if it is missing or expired
+            ttl: Seconds the new value stays valid, if not the cache's default
+
+        Returns:
+            The new value, or None if the cache is disabled
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            conn = self._connect()
+            # Take the write lock before reading, so no other writer gets in between
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                current = json.loads(row[0]) if row is not None and row[1] >= time.time() else None
+                value = fn(current)
+                self._store(conn, key, value, ttl)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return value
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache effectiveness counters.
+
+        Returns:
+            Dict: Hits, misses, hit ratio, evictions and current entry count
+        """
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                (entries,) = self._connect().execute(
+                    "SELECT COUNT(*) FROM cache"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+
+class SummaryCache(DiskCache):
+    """
+    Cache of generated summaries keyed on the normalized topic and source content.
+
+    When a similarity threshold is configured, a lookup that misses on the exact
+    key falls back to the most similar previously summarized topic, using a
+    character-trigram index over canonical topic names. A near match is only
+    used when it was summarized from the same content and has the same numbers
+    and single letters ("type 1" never matches "type 2"). Topics whose summary
+    has expired or been evicted are pruned from the index.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 86400.0,
+        max_entries: int = 1000,
+        similarity_threshold: float = 0.0,
+    ):
+        """
+        Create a summary cache backed by the SQLite file at `path`.
+
+        Args:
+            path: Location of the SQLite database file
+            ttl: Seconds an entry stays valid; 0 or less disables the cache
+            max_entries: Maximum number of entries kept before LRU eviction
+            similarity_threshold: Minimum trigram similarity (0-1] for a
+                near-duplicate topic match; 0 disables near-duplicate lookup
+        """
+        super().__init__(path, ttl=ttl, max_entries=max_entries)
+        self.similarity_threshold = similarity_threshold
+        self._index: Optional[Dict[str, Set[str]]] = None
+        # Summary key and content hash of each indexed topic
+        self._topic_keys: Dict[str, Tuple[str, Optional[str]]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        first_use = self._conn is None
+        conn = super()._connect()
+        if first_use:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS topics (topic TEXT PRIMARY KEY, key TEXT NOT NULL, "
+                "content_hash TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(topics)")}
+            if "content_hash" not in columns:
+                # Topics indexed before content hashes were kept never match
+                conn.execute("ALTER TABLE topics ADD COLUMN content_hash TEXT")
+            conn.commit()
+        return conn
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """
+        Hash the source content a summary is generated from.
+
+        Args:
+            content: The source content
+
+        Returns:
+            str: Content hash
+        """
+        return make_cache_key("content", content)
+
+    @staticmethod
+    def summary_key(topic: str, content: str) -> str:
+        """
+        Build the exact-match key for a topic and its source content.
+
+        Args:
+            topic: The health topic
+            content: The source content the summary is generated from
+
+        Returns:
+            str: Cache key
+        """
+        # Imported here as src.models imports this module through src.instrumentation
+        from src.models import SUMMARY, model_id
+
+        # Summaries from an older version of the prompt or another model are regenerated
+        return make_cache_key(
+            "summary", prompt_id("summary"), model_id(SUMMARY), normalize_text(topic), content
+        )
+
+    def _load_index(self) -> Dict[str, Set[str]]:
+        if self._index is None:
+            index: Dict[str, Set[str]] = {}
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT topic, key, content_hash FROM topics"
+                ).fetchall()
+            for topic, key, content_hash in rows:
+                self._topic_keys[topic] = (key, content_hash)
+                for gram in _trigrams(topic):
+                    index.setdefault(gram, set()).add(topic)
+            self._index = index
+        return self._index
+
+    def _unindex(self, topics: List[str]) -> None:
+        index = self._load_index()
+        for topic in topics:
+            self._topic_keys.pop(topic, None)
+            for gram in _trigrams(topic):
+                candidates = index.get(gram)
+                if candidates is not None:
+                    candidates.discard(topic)
+                    if not candidates:
+                        del index[gram]
+
+    def _prune_topics(self) -> None:
+        # Drop the topics whose summary has expired or been evicted
+        with self._lock:
+            conn = self._connect()
+            stale = [
+                topic
+                for (topic,) in conn.execute(
+                    "SELECT topic FROM topics WHERE key NOT IN (SELECT key FROM cache)"
+                ).fetchall()
+            ]
+            if stale:
+                conn.execute("DELETE FROM topics WHERE key NOT IN (SELECT key FROM cache)")
+                conn.commit()
+        self._unindex(stale)
+
+    def _similar_topics(self, topic: str) -> List[str]:
+        tokens = _distinguishing_tokens(topic)
+        grams = _trigrams(topic)
+        overlap: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._load_index().get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        scored = []
+        for candidate, shared in overlap.items():
+            if _distinguishing_tokens(candidate) != tokens:
+                continue
+            score = shared / (len(grams) + len(_trigrams(candidate)) - shared)
+            if score >= self.similarity_threshold:
+                scored.append((score, candidate))
+        return [candidate for _, candidate in sorted(scored, reverse=True)]
+
+    def lookup(self, topic: str, content: str) -> Optional[str]:
+        """
+        Find a cached summary for the topic, exactly or by near-duplicate topic.
+
+        Args:
+            topic: The health topic
+            content: The source content the summary would be generated from
+
+        Returns:
+            str: The cached summary, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        summary = self._fetch(self.summary_key(topic, content))
+        if summary is None and self.similarity_threshold > 0:
+            content_hash = self.content_hash(content)
+            stale = False
+            for candidate in self._similar_topics(canonical_topic(topic)):
+                key, candidate_hash = self._topic_keys.get(candidate, (None, None))
+                # Only a summary of the same content is reused
+                if key is None or candidate_hash != content_hash:
+                    continue
+                summary = self._fetch(key)
+                if summary is not None:
+                    break
+                stale = True
+            if stale:
+                self._prune_topics()
+        return self._count(summary)
+
+    def store(
+        self, topic: str, content: str, summary: str, ttl: Optional[float] = None
+    ) -> None:
+        """
+        Cache a generated summary and index its topic for near-duplicate lookups.
+
+        Args:
+            topic: The health topic
+            content: The source content the summary was generated from
+            summary: The generated summary
+            ttl: Seconds the summary stays valid, if not the cache's default
+        """
+        if not self.enabled:
+            return
+
+        key = self.summary_key(topic, content)
+        self.set(key, summary, ttl)
+        # Storing may have expired or evicted other summaries
+        self._prune_topics()
+
+        canonical = canonical_topic(topic)
+        content_hash = self.content_hash(content)
+        index = self._load_index()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO topics (topic, key, content_hash) VALUES (?, ?, ?)",
+                (canonical, key, content_hash),
+            )
+            conn.commit()
+        self._topic_keys[canonical] = (key, content_hash)
+        for gram in _trigrams(canonical):
+            index.setdefault(gram, set()).add(canonical)
+
+    def clear(self) -> None:
+        """Remove every summary and indexed topic from the cache."""
+        super().clear()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM topics")
+            conn.commit()
+        self._index = None
+        self._topic_keys = {}
+
+
+# Cache for Tavily search responses
+search_cache = DiskCache(
+    os.path.join(CACHE_DIR, "search.sqlite"),
+    ttl=float(os.getenv("HEALTHBOT_SEARCH_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("HEALTHBOT_SEARCH_CACHE_SIZE", "2000")),
+)
+
+# Cache for generated topic summaries
+summary_cache = SummaryCache(
+    os.path.join(CACHE_DIR, "summaries.sqlite"),
+    ttl=float(os.getenv("HEALTHBOT_SUMMARY_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("HEALTHBOT_SUMMARY_CACHE_SIZE", "1000")),
+    similarity_threshold=float(os.getenv("HEALTHBOT_SUMMARY_SIMILARITY", "0")),
+)
+
+# Store of generated quiz questions and question banks, keyed by question kind and summary
+quiz_cache = DiskCache(
+    os.path.join(CACHE_DIR, "quizzes.sqlite"),
+    ttl=float(os.getenv("HEALTHBOT_QUIZ_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("HEALTHBOT_QUIZ_CACHE_SIZE", "2000")),
+)
+
+# Questions of each question bank a patient has already been asked, keyed by
+# patient and summary; kept apart so many patients don't evict the banks
+quiz_seen_cache = DiskCache(
+    os.path.join(CACHE_DIR, "quiz_seen.sqlite"),
+    ttl=float(os.getenv("HEALTHBOT_QUIZ_SEEN_TTL", "604800")),
+    max_entries=int(os.getenv("HEALTHBOT_QUIZ_SEEN_SIZE", "50000")),
+)
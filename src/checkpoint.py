@@ -0,0 +1,558 @@
+"""
+HealthBot Checkpoint Module
+This module provides the checkpointers that persist conversation state for the HealthBot workflow.
+"""
+
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from src.cache import CACHE_DIR
+
+# Checkpointer used by create_workflow: "sqlite" or "memory"
+CHECKPOINTER = os.getenv("HEALTHBOT_CHECKPOINTER", "sqlite")
+
+# Functions called with the thread_id of every thread the checkpointer deletes
+_eviction_listeners: List[Callable[[str], None]] = []
+
+
+def on_thread_evicted(listener: Callable[[str], None]) -> Callable[[str], None]:
+    """
+    Register a function to call when a thread is evicted or deleted, so state
+    kept per thread elsewhere, such as metrics or prefetched work, is dropped too.
+
+    Args:
+        listener: Function called with the thread_id
+
+    Returns:
+        Callable: The listener
+    """
+    _eviction_listeners.append(listener)
+    return listener
+
+
+def _notify_evicted(thread_ids: Iterable[str]) -> None:
+    for thread_id in thread_ids:
+        for listener in _eviction_listeners:
+            listener(thread_id)
+
+
+def current_rss_bytes() -> int:
+    """
+    Measure the resident memory of the current process.
+
+    Returns:
+        int: Resident set size in bytes, or 0 if it cannot be determined
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Checkpointer that stores graph checkpoints in a local SQLite database.
+
+    Unlike `MemorySaver`, state survives restarts and storage stays bounded:
+    only the latest `max_checkpoints` checkpoints are kept per thread, and
+    threads idle for longer than `idle_ttl` seconds are evicted. The database
+    runs in WAL mode and commits are batched, so a crash loses at most the
+    last `commit_interval` seconds of writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_checkpoints: int = 5,
+        idle_ttl: float = 86400.0,
+        commit_interval: float = 1.0,
+        sweep_interval: float = 60.0,
+        serde=None,
+    ):
+        """
+        Create a checkpointer backed by the SQLite file at `path`.
+
+        Args:
+            path: Location of the SQLite database file
+            max_checkpoints: Checkpoints kept per thread (at least 1)
+            idle_ttl: Seconds after the last update before a thread is evicted
+            commit_interval: Maximum seconds between commits of batched writes
+            sweep_interval: Seconds between sweeps for idle threads
+            serde: Serializer for checkpoints, defaults to LangGraph's serializer
+        """
+        super().__init__(serde=serde)
+        self.path = path
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.idle_ttl = idle_ttl
+        self.commit_interval = commit_interval
+        self.sweep_interval = sweep_interval
+        self.evicted_threads = 0
+        self._conn = None
+        self._lock = threading.RLock()
+        self._last_commit = time.monotonic()
+        self._last_sweep = time.monotonic()
+        self._commit_timer = None
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB,
+                    metadata_type TEXT,
+                    metadata BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS threads_updated ON threads (updated_at);
+                """
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _maybe_commit(self) -> None:
+        now = time.monotonic()
+        if now - self._last_commit >= self.commit_interval:
+            self._conn.commit()
+            self._last_commit = now
+        elif self._commit_timer is None:
+            # Make sure a batch left pending by a quiet period still gets committed
+            self._commit_timer = threading.Timer(self.commit_interval, self.flush)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.evict_idle_threads()
+
+    def flush(self) -> None:
+        """Commit all batched writes to disk."""
+        with self._lock:
+            self._commit_timer = None
+            if self._conn is not None:
+                self._conn.commit()
+                self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        """Commit batched writes and close the database."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def _tuple_from_row(self, row) -> CheckpointTuple:
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_checkpoint_id,
+            type_,
+            checkpoint,
+            metadata_type,
+            metadata,
+        ) = row
+        writes = self._connect().execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Get the checkpoint named in `config`, or the latest one for its thread.
+
+        Args:
+            config: Config with the thread_id and optionally a checkpoint_id
+
+        Returns:
+            CheckpointTuple: The checkpoint, or None if there is none
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._connect().execute(query, params).fetchone()
+            return self._tuple_from_row(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """
+        List checkpoints, newest first.
+
+        Args:
+            config: Restricts the listing to a thread (and namespace/checkpoint)
+            filter: Metadata values the checkpoints must match
+            before: Only list checkpoints older than this one
+            limit: Maximum number of checkpoints to return
+
+        Yields:
+            CheckpointTuple: Matching checkpoints
+        """
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                item = self._tuple_from_row(row)
+                if filter and not all(
+                    item.metadata.get(key) == value for key, value in filter.items()
+                ):
+                    continue
+                results.append(item)
+
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Save a checkpoint and apply the retention policy to its thread.
+
+        Args:
+            config: Config of the parent checkpoint
+            checkpoint: The checkpoint to save
+            metadata: Metadata saved with the checkpoint
+            new_versions: Channel versions updated by this checkpoint
+
+        Returns:
+            RunnableConfig: Config pointing at the saved checkpoint
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        metadata = get_checkpoint_metadata(config, metadata)
+        metadata.pop("writes", None)
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                "parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized,
+                    metadata_type,
+                    serialized_metadata,
+                ),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+
+            # Keep only the newest checkpoints of this thread and their writes
+            oldest_kept = conn.execute(
+                "SELECT checkpoint_id FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.max_checkpoints - 1),
+            ).fetchone()
+            if oldest_kept:
+                for table in ["checkpoints", "writes"]:
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                        "AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, oldest_kept[0]),
+                    )
+            self._maybe_commit()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Save the intermediate writes of a task for a checkpoint.
+
+        Args:
+            config: Config of the checkpoint the writes belong to
+            writes: (channel, value) pairs to save
+            task_id: Identifier of the task creating the writes
+            task_path: Path of the task creating the writes
+        """
+        # Special writes (errors, interrupts) replace earlier ones; regular ones are kept
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    config["configurable"]["thread_id"],
+                    config["configurable"].get("checkpoint_ns", ""),
+                    config["configurable"]["checkpoint_id"],
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    type_,
+                    serialized,
+                    task_path,
+                )
+            )
+
+        with self._lock:
+            self._connect().executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, "
+                "idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._maybe_commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Delete all checkpoints and writes of a thread.
+
+        Args:
+            thread_id: The thread to delete
+        """
+        with self._lock:
+            conn = self._connect()
+            for table in ["checkpoints", "writes", "threads"]:
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._maybe_commit()
+        _notify_evicted([thread_id])
+
+    def evict_idle_threads(self) -> int:
+        """
+        Delete threads that have not been updated within `idle_ttl` seconds.
+
+        Returns:
+            int: Number of threads evicted
+        """
+        with self._lock:
+            conn = self._connect()
+            idle = [
+                thread_id
+                for (thread_id,) in conn.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?",
+                    (time.time() - self.idle_ttl,),
+                ).fetchall()
+            ]
+            for thread_id in idle:
+                for table in ["checkpoints", "writes", "threads"]:
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            conn.commit()
+            self._last_commit = time.monotonic()
+            self.evicted_threads += len(idle)
+        _notify_evicted(idle)
+        return len(idle)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report storage and memory usage.
+
+        Returns:
+            Dict: Thread, checkpoint and write counts, database size and process RSS
+        """
+        with self._lock:
+            conn = self._connect()
+            counts = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ["threads", "checkpoints", "writes"]
+            }
+            (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+        return {
+            **counts,
+            "evicted_threads": self.evicted_threads,
+            "db_bytes": page_count * page_size,
+            "rss_bytes": current_rss_bytes(),
+        }
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Async version of `get_tuple`, run in a worker thread."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Async version of `list`, run in a worker thread."""
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async version of `put`, run in a worker thread."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async version of `put_writes`, run in a worker thread."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async version of `delete_thread`, run in a worker thread."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_checkpointer(kind: Optional[str] = None) -> BaseCheckpointSaver:
+    """
+    Create the checkpointer used to persist conversation state.
+
+    Args:
+        kind: "sqlite" for the durable, bounded SQLite checkpointer or "memory"
+            for an in-process `MemorySaver`; defaults to HEALTHBOT_CHECKPOINTER
+
+    Returns:
+        BaseCheckpointSaver: The checkpointer
+    """
+    kind = kind or CHECKPOINTER
+    if kind == "memory":
+        return MemorySaver()
+    if kind == "sqlite":
+        return SQLiteCheckpointer(
+            os.getenv(
+                "HEALTHBOT_CHECKPOINT_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite")
+            ),
+            max_checkpoints=int(os.getenv("HEALTHBOT_CHECKPOINT_RETENTION", "5")),
+            idle_ttl=float(os.getenv("HEALTHBOT_CHECKPOINT_IDLE_TTL", "86400")),
+            commit_interval=float(os.getenv("HEALTHBOT_CHECKPOINT_COMMIT_INTERVAL", "1")),
+        )
+    raise ValueError(f"Unknown checkpointer: {kind!r} (expected 'sqlite' or 'memory')")
@@ -0,0 +1,213 @@
+"""
+HealthBot Clients Module
+This module holds the process-wide clients used by the HealthBot application,
+such as the language model, the Tavily client and the search backend.
+
+Clients are created on first use and then shared by every session, thread and
+Streamlit rerun in the process, so importing HealthBot stays cheap.
+"""
+
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+_factories: Dict[str, Callable[[], Any]] = {}
+_clients: Dict[str, Any] = {}
+# Reentrant, as creating one client may create the clients it uses
+_lock = threading.RLock()
+
+
+def register_client(name: str, factory: Callable[[], Any]) -> None:
+    """
+    Register how to create a client.
+
+    Args:
+        name: Name the client is looked up by
+        factory: Function creating the client, called on first use
+    """
+    _factories[name] = factory
+
+
+def get_client(name: str) -> Any:
+    """
+    Get a shared client, creating it on first use.
+
+    Args:
+        name: Name of the client
+
+    Returns:
+        The client
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        if name not in _clients:
+            _clients[name] = _factories[name]()
+        return _clients[name]
+
+
+def peek_client(name: str) -> Optional[Any]:
+    """
+    Get a shared client only if it has already been created.
+
+    Args:
+        name: Name of the client
+
+    Returns:
+        The client, or None if it has not been created yet
+    """
+    return _clients.get(name)
+
+
+def set_client(name: str, client: Any) -> None:
+    """
+    Replace a shared client, e.g. with a local stand-in for benchmarks.
+
+    Args:
+        name: Name of the client
+        client: The client to use from now on
+    """
+    with _lock:
+        _clients[name] = client
+
+
+def reset_client(name: str) -> None:
+    """
+    Drop a shared client so the next use creates a new one.
+
+    Args:
+        name: Name of the client
+    """
+    with _lock:
+        _clients.pop(name, None)
+
+
+def warm_up(names: Iterable[str] = ("model", "tavily", "search")) -> threading.Thread:
+    """
+    Create clients in a background thread, e.g. while the patient types a topic.
+
+    Errors are left for the first real use to report.
+
+    Args:
+        names: Names of the clients to create
+
+    Returns:
+        threading.Thread: The started warm-up thread
+    """
+
+    def create():
+        for name in names:
+            try:
+                get_client(name)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=create, name="healthbot-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _create_http_client():
+    from src.transport import create_http_client
+
+    return create_http_client()
+
+
+def _create_async_http_client():
+    from src.transport import create_async_http_client
+
+    return create_async_http_client()
+
+
+def _create_model(task: Optional[str] = None, escalation: bool = False):
+    from src.models import initialize_model
+
+    return initialize_model(
+        http_client=get_client("http"),
+        http_async_client=get_client("http_async"),
+        task=task,
+        escalation=escalation,
+    )
+
+
+def _create_tavily_client():
+    from src.transport import PooledTavilyClient
+
+    return PooledTavilyClient(
+        api_key=os.getenv("TAVILY_API_KEY"), http_client=get_client("http")
+    )
+
+
+def _create_search_backend():
+    from src.retrieval import create_backend
+
+    return create_backend()
+
+
+register_client("http", _create_http_client)
+register_client("http_async", _create_async_http_client)
+register_client("model", _create_model)
+register_client("tavily", _create_tavily_client)
+register_client("search", _create_search_backend)
+
+
+def get_model(task: Optional[str] = None):
+    """
+    Get the shared language model serving a task.
+
+    Args:
+        task: "summary", "quiz", "grade" or "feedback" to get the model routed
+            to that task (see `src.models`), or None for the default model
+
+    Returns:
+        BaseChatModel: The language model
+    """
+    from src.models import model_route
+
+    name = model_route(task)
+    # Tasks configured apart from the default model get their own client
+    if name not in _factories:
+        register_client(name, functools.partial(_create_model, task))
+    return get_client(name)
+
+
+def get_escalation_model(task: Optional[str] = None):
+    """
+    Get the shared model that a task's invalid answers are retried with.
+
+    Args:
+        task: "summary", "quiz", "grade" or "feedback", or None for the default model
+
+    Returns:
+        BaseChatModel: The escalation model, or None if none is configured
+    """
+    from src.models import model_route
+
+    name = model_route(task, escalation=True)
+    if name is None:
+        return None
+    if name not in _factories:
+        register_client(name, functools.partial(_create_model, task, escalation=True))
+    return get_client(name)
+
+
+def get_tavily_client():
+    """
+    Get the shared Tavily client.
+
+    Returns:
+        TavilyClient: The Tavily client
+    """
+    return get_client("tavily")
+
+
+def get_search_backend():
+    """
+    Get the shared search backend.
+
+    Returns:
+        SearchBackend: The search backend selected by HEALTHBOT_SEARCH_BACKEND
+    """
+    return get_client("search")
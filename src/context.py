@@ -0,0 +1,210 @@
+"""
+HealthBot Context Module
+This module assembles the source content sent to the model for summarization:
+it splits the search results into passages, drops duplicate passages, ranks
+them by relevance to the health topic and packs the best ones into a token
+budget, keeping track of the sources used.
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from langchain_core.messages.utils import count_tokens_approximately
+from src.cache import canonical_topic, normalize_text
+
+# Token budget for the source content of a summary (0 for no limit)
+CONTEXT_MAX_TOKENS = int(os.getenv("HEALTHBOT_CONTEXT_MAX_TOKENS", "1500"))
+# tiktoken encoding used to count tokens; falls back to an estimate if unavailable
+CONTEXT_ENCODING = os.getenv("HEALTHBOT_CONTEXT_ENCODING", "cl100k_base")
+
+# Passages longer than this are split at sentence boundaries
+PASSAGE_MAX_TOKENS = 120
+# Passages with fewer words are dropped as navigation or boilerplate fragments
+PASSAGE_MIN_WORDS = 5
+# Word-set overlap (0-1) above which a passage counts as a duplicate of another
+DUPLICATE_SIMILARITY = 0.8
+
+# BM25 parameters for ranking passages against the topic
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with tiktoken, or estimate them if tiktoken or
+    its encoding data is not available.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        int: Number of tokens
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(CONTEXT_ENCODING)
+                except Exception:
+                    # Not installed, or the encoding can't be downloaded
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return count_tokens_approximately([text])
+
+
+def _words(text: str) -> List[str]:
+    # Crude plural folding so "vaccines" matches "vaccine"
+    return [
+        word[:-1] if len(word) > 3 and word.endswith("s") else word
+        for word in re.findall(r"[a-z0-9]+", normalize_text(text))
+    ]
+
+
+def split_passages(text: str) -> List[str]:
+    """
+    Split source text into passages of at most about PASSAGE_MAX_TOKENS tokens.
+
+    Paragraphs are kept together where they fit; longer ones are split at
+    sentence boundaries. Sentences repeated in the text are kept only once.
+
+    Args:
+        text: Content of one search result
+
+    Returns:
+        List[str]: Passages in their original order
+    """
+    passages, seen = [], set()
+    for paragraph in re.split(r"\n\s*\n|\n(?=[-*•] )", text):
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", " ".join(paragraph.split())):
+            if not sentence or normalize_text(sentence) in seen:
+                continue
+            seen.add(normalize_text(sentence))
+            candidate = f"{current} {sentence}".strip()
+            if current and count_tokens(candidate) > PASSAGE_MAX_TOKENS:
+                passages.append(current)
+                current = sentence
+            else:
+                current = candidate
+        if current:
+            passages.append(current)
+    return passages
+
+
+class Passage:
+    """A passage of one search result, with what ranking and packing need."""
+
+    def __init__(self, source: int, position: int, text: str, prior: float):
+        self.source = source
+        self.position = position
+        self.text = text
+        self.prior = prior
+        self.words = _words(text)
+        self.word_set: Set[str] = set(self.words)
+        self.tokens = count_tokens(text)
+        self.score = 0.0
+
+
+def _is_duplicate(passage: Passage, kept: List[Passage]) -> bool:
+    for other in kept:
+        shared = len(passage.word_set & other.word_set)
+        union = len(passage.word_set | other.word_set)
+        if union and shared / union >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def rank_passages(health_topic: str, passages: List[Passage]) -> None:
+    """
+    Score passages by BM25 relevance to the topic, plus the search engine's
+    score for their result and a small preference for earlier passages.
+
+    Args:
+        health_topic: The health topic being studied
+        passages: Passages to score; their `score` is set in place
+    """
+    terms = set(_words(canonical_topic(health_topic)))
+    if not passages:
+        return
+    average_length = sum(len(p.words) for p in passages) / len(passages)
+    for passage in passages:
+        score = 0.0
+        for term in terms:
+            frequency = passage.words.count(term)
+            if not frequency:
+                continue
+            documents = sum(1 for p in passages if term in p.word_set)
+            idf = math.log(1 + (len(passages) - documents + 0.5) / (documents + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(passage.words) / (average_length or 1))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        passage.score = score + passage.prior - 0.05 * passage.position
+
+
+def build_context(
+    health_topic: str, search_results: Dict, max_tokens: Optional[int] = None
+) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Assemble the source content for a summary from search results.
+
+    Passages are deduplicated, ranked by relevance to the topic and packed
+    into the token budget, then laid out per source in their original order.
+
+    Args:
+        health_topic: The health topic being studied
+        search_results: Search results from Tavily
+        max_tokens: Token budget for the content; defaults to
+            HEALTHBOT_CONTEXT_MAX_TOKENS, 0 for no limit
+
+    Returns:
+        Tuple[str, List[Dict[str, str]]]: Source content for summarization, and
+            the title and url of each source it uses
+    """
+    budget = CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    results = search_results.get("results", [])
+
+    passages: List[Passage] = []
+    for source, result in enumerate(results):
+        prior = float(result.get("score") or 0.0)
+        for position, text in enumerate(split_passages(result.get("content") or "")):
+            passage = Passage(source, position, text, prior)
+            if len(passage.words) < PASSAGE_MIN_WORDS or _is_duplicate(passage, passages):
+                continue
+            passages.append(passage)
+
+    rank_passages(health_topic, passages)
+
+    # Each source costs its title and url once, on top of its passages
+    headers = [
+        count_tokens(f"Title: {result.get('title', '')}\nSource: {result.get('url', '')}\n")
+        for result in results
+    ]
+    used, selected, used_sources = 0, [], set()
+    for passage in sorted(passages, key=lambda p: p.score, reverse=True):
+        cost = passage.tokens + 1
+        if passage.source not in used_sources:
+            cost += headers[passage.source]
+        if budget > 0 and used + cost > budget:
+            continue
+        used += cost
+        selected.append(passage)
+        used_sources.add(passage.source)
+
+    content, sources = "", []
+    for source, result in enumerate(results):
+        chosen = sorted((p for p in selected if p.source == source), key=lambda p: p.position)
+        if not chosen:
+            continue
+        content += f"Title: {result.get('title', '')}\n"
+        content += f"Source: {result.get('url', '')}\n"
+        content += f"Content: {' '.join(p.text for p in chosen)}\n\n"
+        sources.append({"title": result.get("title", ""), "url": result.get("url", "")})
+    return content, sources
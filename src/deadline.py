@@ -0,0 +1,548 @@
+"""
+HealthBot Deadline Module
+This module bounds how long the HealthBot application waits for the language
+model and search. Every node run gets a deadline, and the calls made inside it
+give up when the deadline passes or when the patient's session is cancelled.
+Slow idempotent calls can be hedged with a duplicate request.
+
+Async calls are cancelled outright. Synchronous calls run on the caller's
+thread, where the HTTP clients cap each request's timeout at the time left
+(see `src.transport`) and streamed output stops at the next token. Only hedged
+calls run on worker threads; one that loses or gives up is left to finish in
+the background and its result is dropped.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Iterator, Optional, Set
+from langgraph.config import get_config
+from src.instrumentation import record_deadline_exceeded, record_hedge
+
+
+def parse_deadlines(text: str) -> Dict[str, float]:
+    """
+    Parse per-node deadlines given as "node=seconds" pairs.
+
+    Args:
+        text: Comma-separated pairs, e.g. "search_information=10,generate_quiz=30"
+
+    Returns:
+        Dict[str, float]: Seconds per node name
+    """
+    deadlines = {}
+    for pair in text.split(","):
+        if "=" in pair:
+            node, seconds = pair.split("=", 1)
+            deadlines[node.strip()] = float(seconds)
+    return deadlines
+
+
+# Seconds a node's model and search calls may take in total (0 for no deadline)
+NODE_DEADLINE = float(os.getenv("HEALTHBOT_NODE_DEADLINE", "60"))
+# Deadlines of the nodes calling the model or search, overridable with
+# HEALTHBOT_NODE_DEADLINES or `configurable={"deadlines": {...}}` in the run config
+NODE_DEADLINES = {
+    "search_information": 20.0,
+    "summarize_information": 60.0,
+    "generate_quiz": 45.0,
+    "grade_answer": 45.0,
+    **parse_deadlines(os.getenv("HEALTHBOT_NODE_DEADLINES", "")),
+}
+
+# Whether slow calls are hedged with a duplicate request
+HEDGE = os.getenv("HEALTHBOT_HEDGE", "false").lower() in ["1", "true", "yes"]
+# Latency percentile, per kind of call, after which the duplicate is sent
+HEDGE_PERCENTILE = float(os.getenv("HEALTHBOT_HEDGE_PERCENTILE", "95"))
+# Calls of a kind to observe before hedging it
+HEDGE_MIN_SAMPLES = int(os.getenv("HEALTHBOT_HEDGE_MIN_SAMPLES", "20"))
+# Recent latencies kept per kind of call
+HEDGE_WINDOW = 200
+
+# Threads running hedged synchronous calls, so the first attempt to answer wins
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEALTHBOT_CALL_WORKERS", "64")),
+    thread_name_prefix="healthbot-call",
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A node's model or search calls did not finish within its deadline."""
+
+
+class SessionCancelled(Exception):
+    """The session a call was made for was cancelled, e.g. reset by the patient."""
+
+
+class Deadline:
+    """
+    Time limit of one node run, shared by the calls made inside it.
+
+    Args:
+        node: Name of the node
+        seconds: Seconds the node's calls may take, or 0 for no limit
+        thread_id: Conversation thread the node runs for, whose cancellation
+            cancels the calls
+    """
+
+    def __init__(self, node: str, seconds: float, thread_id: Optional[str] = None):
+        self.node = node
+        self.seconds = seconds
+        self.thread_id = thread_id
+        self.expires = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self) -> Optional[float]:
+        """
+        Get the time left.
+
+        Returns:
+            float: Seconds until the deadline, at least 0, or None without a limit
+        """
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def exceeded(self) -> DeadlineExceeded:
+        """
+        Build the error raised when the deadline has passed.
+
+        Returns:
+            DeadlineExceeded: The error
+        """
+        return DeadlineExceeded(f"{self.node} did not finish within {self.seconds:g} seconds")
+
+
+# Deadline of the node run the current code belongs to
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+# Set once the caller has stopped waiting for the current call attempt
+_abandoned: ContextVar[Optional[threading.Event]] = ContextVar("deadline_abandoned", default=None)
+
+
+class _Latencies:
+    """Recent durations of each kind of call, for the hedging delay."""
+
+    def __init__(self):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=HEDGE_WINDOW))
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[kind].append(seconds)
+
+    def percentile(self, kind: str, percent: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples[kind])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, math.ceil(percent / 100 * len(samples)) - 1)
+        return samples[max(0, index)]
+
+
+_latencies = _Latencies()
+
+
+def hedge_delay(kind: Optional[str]) -> Optional[float]:
+    """
+    Get how long to wait before hedging a call with a duplicate request.
+
+    Args:
+        kind: Kind of call, e.g. "search" or "model"; None is never hedged
+
+    Returns:
+        float: HEDGE_PERCENTILE of the kind's recent latencies, or None if
+            hedging is off or too few calls have been observed
+    """
+    if not HEDGE or kind is None:
+        return None
+    return _latencies.percentile(kind, HEDGE_PERCENTILE)
+
+
+class _Session:
+    """Calls in flight for one conversation thread."""
+
+    def __init__(self):
+        self.outcomes: Set[Future] = set()
+        self.tasks: Set[asyncio.Task] = set()
+
+
+_sessions: Dict[str, _Session] = defaultdict(_Session)
+_sessions_lock = threading.Lock()
+# Tasks cancelled with their session, as opposed to by their caller
+_cancelled_tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+
+
+def _register(deadline: Optional[Deadline], outcome: Optional[Future] = None, tasks=()) -> None:
+    if deadline is None or deadline.thread_id is None:
+        return
+    with _sessions_lock:
+        session = _sessions[deadline.thread_id]
+        if outcome is not None:
+            session.outcomes.add(outcome)
+        session.tasks.update(tasks)
+
+
+def _unregister(deadline: Optional[Deadline], outcome: Optional[Future] = None, tasks=()) -> None:
+    if deadline is None or deadline.thread_id is None:
+        return
+    with _sessions_lock:
+        session = _sessions.get(deadline.thread_id)
+        if session is None:
+            return
+        session.outcomes.discard(outcome)
+        session.tasks.difference_update(tasks)
+        if not session.outcomes and not session.tasks:
+            del _sessions[deadline.thread_id]
+
+
+def cancel_session(thread_id: Optional[str]) -> int:
+    """
+    Cancel the model and search calls in flight for a conversation thread.
+
+    The nodes waiting for them raise SessionCancelled. Later calls of the
+    thread are not affected, so an abandoned session can be resumed.
+
+    Args:
+        thread_id: The conversation thread
+
+    Returns:
+        int: Number of calls cancelled
+    """
+    if thread_id is None:
+        return 0
+    with _sessions_lock:
+        session = _sessions.pop(str(thread_id), None)
+    if session is None:
+        return 0
+
+    for outcome in session.outcomes:
+        _settle(outcome, error=SessionCancelled(f"Session {thread_id} was cancelled"))
+    for task in session.tasks:
+        _cancelled_tasks.add(task)
+        task.get_loop().call_soon_threadsafe(task.cancel)
+    return len(session.outcomes) + len(session.tasks)
+
+
+def _settle(outcome: Future, result: Any = None, error: Optional[BaseException] = None) -> bool:
+    # The first attempt to finish wins; later ones are dropped
+    try:
+        if error is not None:
+            outcome.set_exception(error)
+        else:
+            outcome.set_result(result)
+        return True
+    except InvalidStateError:
+        return False
+
+
+def _node_seconds(node: str) -> float:
+    try:
+        configured = get_config().get("configurable", {}).get("deadlines") or {}
+    except RuntimeError:
+        configured = {}
+    return float(configured.get(node, NODE_DEADLINES.get(node, NODE_DEADLINE)))
+
+
+def _thread_id() -> Optional[str]:
+    try:
+        thread_id = get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+    return str(thread_id) if thread_id is not None else None
+
+
+def with_deadline(name: str, node: Callable) -> Callable:
+    """
+    Wrap a workflow node so the model and search calls made inside it share a deadline.
+
+    The deadline comes from `configurable={"deadlines": {name: seconds}}` in the
+    run config, HEALTHBOT_NODE_DEADLINES, or HEALTHBOT_NODE_DEADLINE.
+
+    Args:
+        name: Name the node is registered under
+        node: The node function, sync or async
+
+    Returns:
+        Callable: The wrapped node
+    """
+    if inspect.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def async_wrapper(*args, **kwargs):
+            token = _current.set(Deadline(name, _node_seconds(name), _thread_id()))
+            try:
+                return await node(*args, **kwargs)
+            finally:
+                _current.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(*args, **kwargs):
+        token = _current.set(Deadline(name, _node_seconds(name), _thread_id()))
+        try:
+            return node(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+def bind_deadline(name: str, thread_id: Optional[str], fn: Callable) -> Callable:
+    """
+    Give a function run outside the graph, such as a quiz prefetch, the deadline
+    of a node, counted from when it starts running.
+
+    Args:
+        name: Name of the node the work is done for
+        thread_id: Conversation thread, whose cancellation cancels the work
+        fn: The function to bind
+
+    Returns:
+        Callable: The bound function
+    """
+    seconds = _node_seconds(name)
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        token = _current.set(Deadline(name, seconds, thread_id))
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return bound
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """
+    Get the time left until the current node's deadline.
+
+    Args:
+        default: Value to return when there is no deadline
+
+    Returns:
+        float: Seconds left, or `default`
+    """
+    deadline = _current.get()
+    left = deadline.remaining() if deadline is not None else None
+    return default if left is None else left
+
+
+def check_deadline() -> None:
+    """
+    Raise if the current node's deadline has passed or its caller stopped waiting.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed
+        SessionCancelled: If the call was cancelled
+    """
+    abandoned = _abandoned.get()
+    if abandoned is not None and abandoned.is_set():
+        raise SessionCancelled("The call was abandoned")
+    deadline = _current.get()
+    if deadline is not None and deadline.remaining() == 0:
+        raise deadline.exceeded()
+
+
+def within_deadline(items: Iterable) -> Iterator:
+    """
+    Yield items, e.g. streamed tokens, until the current node's deadline passes.
+
+    Args:
+        items: The items
+
+    Yields:
+        The items, checking the deadline before each
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the items run out
+        SessionCancelled: If the call was cancelled
+    """
+    for item in items:
+        check_deadline()
+        yield item
+
+
+def _call_inline(fn: Callable[[], Any], deadline: Optional[Deadline], kind: Optional[str]) -> Any:
+    if deadline is None:
+        return fn()
+    check_deadline()
+
+    # Settled with SessionCancelled by `cancel_session`, which stops a streamed answer
+    outcome: Future = Future()
+    abandoned = threading.Event()
+    outcome.add_done_callback(lambda _: abandoned.set())
+    token = _abandoned.set(abandoned)
+    _register(deadline, outcome)
+    try:
+        result = fn()
+    except (DeadlineExceeded, SessionCancelled):
+        raise
+    except Exception as e:
+        if outcome.done():
+            raise SessionCancelled(f"Session {deadline.thread_id} was cancelled") from e
+        if deadline.remaining() == 0:
+            # The request timed out at the deadline, or failed once past it
+            record_deadline_exceeded(kind or "call")
+            raise deadline.exceeded() from e
+        raise
+    finally:
+        _abandoned.reset(token)
+        _unregister(deadline, outcome)
+    if outcome.done():
+        raise SessionCancelled(f"Session {deadline.thread_id} was cancelled")
+    return result
+
+
+def call(fn: Callable[[], Any], kind: Optional[str] = None) -> Any:
+    """
+    Call `fn` within the current node's deadline, hedging it if it is slow.
+
+    Unless a hedge is due, `fn` runs on the caller's thread, bounded by the
+    HTTP timeouts the shared clients cap at the deadline. Otherwise it runs on
+    a worker thread: the caller stops waiting at the deadline, and once it has
+    taken longer than the hedging delay a duplicate is started and the first
+    result wins. Only idempotent calls should be hedged.
+
+    Args:
+        fn: The call
+        kind: Kind of call for hedging, e.g. "search" or "model"; None is never hedged
+
+    Returns:
+        The result of `fn`
+
+    Raises:
+        DeadlineExceeded: If the deadline passes first
+        SessionCancelled: If the session is cancelled first
+    """
+    deadline = _current.get()
+    delay = hedge_delay(kind)
+    if delay is None:
+        return _call_inline(fn, deadline, kind)
+    check_deadline()
+
+    outcome: Future = Future()
+    abandoned = threading.Event()
+    lock = threading.Lock()
+    running = [0]
+
+    def attempt(hedged: bool):
+        start = time.monotonic()
+        try:
+            result = fn()
+        except BaseException as e:
+            with lock:
+                running[0] -= 1
+                last = running[0] == 0
+            # A failure only counts once no other attempt can still succeed
+            if last:
+                _settle(outcome, error=e)
+            return
+        if _settle(outcome, result) and kind is not None:
+            _latencies.add(kind, time.monotonic() - start)
+            if hedged:
+                record_hedge(kind, won=True)
+
+    def start(hedged: bool = False):
+        with lock:
+            if outcome.done():
+                return
+            running[0] += 1
+        context = contextvars.copy_context()
+        context.run(_abandoned.set, abandoned)
+        _executor.submit(context.run, attempt, hedged)
+
+    _register(deadline, outcome)
+    try:
+        start()
+        timeout = deadline.remaining() if deadline is not None else None
+        if delay is not None and (timeout is None or delay < timeout):
+            try:
+                return outcome.result(timeout=delay)
+            except FutureTimeoutError:
+                record_hedge(kind)
+                start(hedged=True)
+                timeout = deadline.remaining() if deadline is not None else None
+        try:
+            return outcome.result(timeout=timeout)
+        except FutureTimeoutError:
+            record_deadline_exceeded(kind or "call")
+            raise deadline.exceeded() from None
+    finally:
+        abandoned.set()
+        _unregister(deadline, outcome)
+
+
+async def acall(fn: Callable[[], Awaitable[Any]], kind: Optional[str] = None) -> Any:
+    """
+    Async version of `call`: the call and its duplicate are tasks, cancelled
+    as soon as they are no longer needed.
+
+    Args:
+        fn: Coroutine function making the call
+        kind: Kind of call for hedging, e.g. "search" or "model"; None is never hedged
+
+    Returns:
+        The result of `fn`
+
+    Raises:
+        DeadlineExceeded: If the deadline passes first
+        SessionCancelled: If the session is cancelled first
+    """
+    deadline = _current.get()
+    delay = hedge_delay(kind)
+    if delay is None and (deadline is None or (deadline.thread_id, deadline.expires) == (None, None)):
+        return await fn()
+    check_deadline()
+
+    started: Dict[asyncio.Task, float] = {}
+
+    def start() -> asyncio.Task:
+        task = asyncio.ensure_future(fn())
+        started[task] = time.monotonic()
+        _register(deadline, tasks=[task])
+        return task
+
+    first = start()
+    pending = {first}
+    try:
+        while True:
+            timeout = deadline.remaining() if deadline is not None else None
+            hedge_now = delay is not None and len(started) == 1 and (timeout is None or delay < timeout)
+            done, pending = await asyncio.wait(
+                pending, timeout=delay if hedge_now else timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                if task in _cancelled_tasks:
+                    raise SessionCancelled(f"Session {deadline.thread_id} was cancelled")
+                if task.exception() is None:
+                    if kind is not None:
+                        _latencies.add(kind, time.monotonic() - started[task])
+                        if task is not first:
+                            record_hedge(kind, won=True)
+                    return task.result()
+            if done:
+                # A failure only counts once no other attempt can still succeed
+                if not pending:
+                    raise next(iter(done)).exception()
+            elif hedge_now:
+                record_hedge(kind)
+                pending.add(start())
+            else:
+                record_deadline_exceeded(kind or "call")
+                raise deadline.exceeded()
+    finally:
+        for task in started:
+            task.cancel()
+        _unregister(deadline, tasks=started)
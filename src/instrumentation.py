@@ -0,0 +1,489 @@
+"""
+HealthBot Instrumentation Module
+This module records per-node timing, language model token usage and search
+latency for the HealthBot application, per node and per conversation thread.
+
+Instrumentation is off unless HEALTHBOT_INSTRUMENTATION is set; when off, nodes
+are registered unwrapped and the recording functions return immediately.
+
+Per-thread totals are kept for recently active threads only: once a thread is
+evicted by the checkpointer, or more than HEALTHBOT_METRICS_MAX_THREADS threads
+have been seen, the oldest thread's totals are folded into its nodes' totals.
+JSON lines are buffered and written in batches.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langgraph.config import get_config
+from langgraph.errors import GraphBubbleUp
+from src.cache import CACHE_DIR
+from src.checkpoint import on_thread_evicted
+from src.prompts import identify_prompt
+
+# Whether instrumentation is recorded at all
+INSTRUMENTATION = os.getenv("HEALTHBOT_INSTRUMENTATION", "false").lower() in ["1", "true", "yes"]
+
+# Export format: "jsonl" appends one line per event, "prometheus" writes totals on exit
+METRICS_FORMAT = os.getenv("HEALTHBOT_METRICS_FORMAT", "jsonl")
+METRICS_PATH = os.getenv(
+    "HEALTHBOT_METRICS_PATH",
+    os.path.join(CACHE_DIR, "metrics.prom" if METRICS_FORMAT == "prometheus" else "metrics.jsonl"),
+)
+# Threads whose totals are kept apart before the least recently active are
+# folded into their nodes' totals (thread_id "")
+METRICS_MAX_THREADS = int(os.getenv("HEALTHBOT_METRICS_MAX_THREADS", "1000"))
+# JSON lines buffered before they are written, and most seconds a line stays buffered
+METRICS_BUFFER_LINES = int(os.getenv("HEALTHBOT_METRICS_BUFFER_LINES", "256"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("HEALTHBOT_METRICS_FLUSH_INTERVAL", "1"))
+
+# Counters kept per (node, thread_id), with their Prometheus help text
+METRICS = {
+    "node_calls": "Node runs",
+    "node_seconds": "Wall time spent in nodes",
+    "llm_calls": "Language model calls",
+    "llm_seconds": "Wall time spent in language model calls",
+    "llm_prompt_tokens": "Prompt tokens sent to the language model",
+    "llm_completion_tokens": "Completion tokens generated by the language model",
+    "llm_cached_tokens": "Prompt tokens served from the provider's prompt cache",
+    "llm_escalations": "Model calls retried on the escalation model after invalid output",
+    "search_calls": "Searches, including ones served from the cache",
+    "search_cache_hits": "Searches served from the search cache",
+    "search_local_hits": "Searches answered by the local search index",
+    "search_seconds": "Wall time spent searching",
+    "search_bytes": "Bytes of search results returned",
+    "coalesced_calls": "Calls that waited for an identical call already in flight",
+    "hedged_calls": "Duplicate requests sent for slow calls",
+    "hedge_wins": "Hedged calls answered first by the duplicate request",
+    "deadline_exceeded": "Calls given up at their node's deadline",
+    "rate_limit_waits": "Calls that waited for the client-side rate limiter",
+    "rate_limit_wait_seconds": "Time spent waiting for the client-side rate limiter",
+}
+
+# (node, thread_id) the code running in the current context is attributed to
+_scope: ContextVar[Tuple[str, str]] = ContextVar("instrumentation_scope", default=("", ""))
+
+_totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+# Nodes with totals for each thread, least recently active thread first
+_threads: "OrderedDict[str, Set[str]]" = OrderedDict()
+_lock = threading.Lock()
+
+# JSON lines not yet written, and the timer writing them after a quiet period
+_buffer: List[str] = []
+_flush_timer: Optional[threading.Timer] = None
+# Held while writing, so batches reach the file in order
+_write_lock = threading.Lock()
+
+
+def _fold(thread_id: str) -> None:
+    # Add a thread's totals to its nodes' totals; called with _lock held
+    for node in _threads.pop(thread_id, ()):
+        totals = _totals.pop((node, thread_id), None)
+        if totals is not None:
+            node_totals = _totals[(node, "")]
+            for name, value in totals.items():
+                node_totals[name] += value
+
+
+def _record(event: str, values: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> None:
+    global _flush_timer
+    node, thread_id = _scope.get()
+    flush = False
+    with _lock:
+        totals = _totals[(node, thread_id)]
+        for name, value in values.items():
+            totals[name] += value
+        if thread_id:
+            _threads.setdefault(thread_id, set()).add(node)
+            _threads.move_to_end(thread_id)
+            while len(_threads) > METRICS_MAX_THREADS:
+                _fold(next(iter(_threads)))
+        if METRICS_FORMAT == "jsonl":
+            line = {"time": time.time(), "event": event, "node": node, "thread_id": thread_id}
+            line.update(values)
+            line.update(extra or {})
+            _buffer.append(json.dumps(line) + "\n")
+            if len(_buffer) >= METRICS_BUFFER_LINES:
+                flush = True
+            elif _flush_timer is None:
+                # Make sure lines recorded before a quiet period still get written
+                _flush_timer = threading.Timer(METRICS_FLUSH_INTERVAL, flush_metrics)
+                _flush_timer.daemon = True
+                _flush_timer.start()
+    if flush:
+        flush_metrics()
+
+
+def flush_metrics() -> None:
+    """
+    Write the buffered JSON lines to METRICS_PATH. Called automatically once
+    HEALTHBOT_METRICS_BUFFER_LINES lines are buffered, after
+    HEALTHBOT_METRICS_FLUSH_INTERVAL seconds, and at exit.
+    """
+    global _buffer, _flush_timer
+    with _write_lock:
+        with _lock:
+            lines, _buffer = _buffer, []
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        if lines:
+            _write("".join(lines), "a")
+
+
+@on_thread_evicted
+def expire_thread(thread_id: str) -> None:
+    """
+    Fold a thread's totals into its nodes' totals, once the thread is gone.
+
+    Args:
+        thread_id: Conversation thread
+    """
+    with _lock:
+        _fold(str(thread_id))
+
+
+def _write(text: str, mode: str) -> None:
+    directory = os.path.dirname(METRICS_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(METRICS_PATH, mode) as f:
+        f.write(text)
+
+
+@contextmanager
+def scope(node: str, thread_id: Optional[str] = None, timed: bool = True):
+    """
+    Attribute everything recorded inside the block to a node and thread.
+
+    Used by `instrument_node` and for background work such as the quiz prefetch.
+
+    Args:
+        node: Node or step name
+        thread_id: Conversation thread; defaults to the enclosing scope's
+        timed: Record the block as a node run; False only attributes the
+            work it starts, e.g. a background quiz prefetch
+    """
+    if not INSTRUMENTATION:
+        yield
+        return
+
+    thread_id = thread_id if thread_id is not None else _scope.get()[1]
+    token = _scope.set((node, str(thread_id)))
+    if not timed:
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+        return
+
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except GraphBubbleUp:
+        # Interrupted to wait for the patient, or otherwise handed back to the graph
+        status = "interrupted"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _record(
+            "node",
+            {"node_calls": 1, "node_seconds": time.perf_counter() - start},
+            {"status": status},
+        )
+        _scope.reset(token)
+
+
+def _thread_id() -> str:
+    try:
+        return str(get_config().get("configurable", {}).get("thread_id", ""))
+    except RuntimeError:
+        return ""
+
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    """
+    Wrap a workflow node so its runs are timed and attributed to its thread_id.
+
+    Returns the node unchanged when instrumentation is off.
+
+    Args:
+        name: Name the node is registered under
+        node: The node function, sync or async
+
+    Returns:
+        Callable: The wrapped node
+    """
+    if not INSTRUMENTATION:
+        return node
+
+    if inspect.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def async_wrapper(*args, **kwargs):
+            with scope(name, _thread_id()):
+                return await node(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(*args, **kwargs):
+        with scope(name, _thread_id()):
+            return node(*args, **kwargs)
+
+    return wrapper
+
+
+def bind_scope(fn: Callable) -> Callable:
+    """
+    Bind a function to the current scope, so work it does on another thread,
+    such as a quiz prefetch, is attributed to the node that started it.
+
+    Args:
+        fn: The function to bind
+
+    Returns:
+        Callable: The bound function; `fn` itself when instrumentation is off
+    """
+    if not INSTRUMENTATION:
+        return fn
+
+    current = _scope.get()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        token = _scope.set(current)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _scope.reset(token)
+
+    return bound
+
+
+def record_search(seconds: float, response: Any, cached: bool = False) -> None:
+    """
+    Record one search.
+
+    Args:
+        seconds: Time the search took
+        response: The search response, measured as JSON
+        cached: Whether the response came from the search cache
+    """
+    if not INSTRUMENTATION:
+        return
+    _record(
+        "search",
+        {
+            "search_calls": 1,
+            "search_cache_hits": int(cached),
+            "search_local_hits": int(isinstance(response, dict) and response.get("backend") == "local"),
+            "search_seconds": seconds,
+            "search_bytes": len(json.dumps(response, default=str)),
+        },
+    )
+
+
+def record_coalesced(group: str) -> None:
+    """
+    Record a call that waited for an identical call instead of repeating it.
+
+    Args:
+        group: Name of the single-flight group, e.g. "search"
+    """
+    if not INSTRUMENTATION:
+        return
+    _record("coalesced", {"coalesced_calls": 1}, {"group": group})
+
+
+def record_hedge(kind: str, won: bool = False) -> None:
+    """
+    Record a duplicate request sent for a slow call, or its answering first.
+
+    Args:
+        kind: Kind of call, e.g. "search" or "model"
+        won: Whether the duplicate answered before the original request
+    """
+    if not INSTRUMENTATION:
+        return
+    _record("hedge", {"hedge_wins" if won else "hedged_calls": 1}, {"kind": kind})
+
+
+def record_deadline_exceeded(kind: str) -> None:
+    """
+    Record a call given up because its node's deadline passed.
+
+    Args:
+        kind: Kind of call, e.g. "search" or "model"
+    """
+    if not INSTRUMENTATION:
+        return
+    _record("deadline", {"deadline_exceeded": 1}, {"kind": kind})
+
+
+def record_escalation(task: str) -> None:
+    """
+    Record a model call retried on the escalation model after invalid output.
+
+    Args:
+        task: Task whose output was invalid, e.g. "quiz"
+    """
+    if not INSTRUMENTATION:
+        return
+    _record("escalation", {"llm_escalations": 1}, {"task": task})
+
+
+def record_rate_limit_wait(limiter: str, seconds: float, priority: int, queue_depth: int) -> None:
+    """
+    Record a call let through by a client-side rate limiter.
+
+    Args:
+        limiter: Limiter name, e.g. "model" or "search"
+        seconds: Time the call waited in the limiter's queue
+        priority: Priority the call was queued with
+        queue_depth: Calls queued, including this one, when it arrived
+    """
+    if not INSTRUMENTATION:
+        return
+    _record(
+        "rate_limit",
+        {"rate_limit_waits": int(seconds > 0.001), "rate_limit_wait_seconds": seconds},
+        {"limiter": limiter, "priority": priority, "queue_depth": queue_depth},
+    )
+
+
+class ModelUsageHandler(BaseCallbackHandler):
+    """Callback handler recording the time and token usage of language model calls."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+        self._prompts: Dict[UUID, str] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+        self._prompts[run_id] = identify_prompt(messages[0])
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._started.pop(run_id, None)
+        prompt = self._prompts.pop(run_id, "")
+        prompt_tokens, completion_tokens, cached_tokens = 0, 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                    cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+        _record(
+            "llm",
+            {
+                "llm_calls": 1,
+                "llm_seconds": time.perf_counter() - start if start is not None else 0.0,
+                "llm_prompt_tokens": prompt_tokens,
+                "llm_completion_tokens": completion_tokens,
+                "llm_cached_tokens": cached_tokens,
+            },
+            {
+                "prompt": prompt,
+                "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            },
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self._prompts.pop(run_id, None)
+
+
+def model_callbacks() -> List[BaseCallbackHandler]:
+    """
+    Get the callback handlers to attach to language models.
+
+    Returns:
+        List[BaseCallbackHandler]: Handlers recording model usage; empty when off
+    """
+    return [ModelUsageHandler()] if INSTRUMENTATION else []
+
+
+def snapshot() -> Dict[Tuple[str, str], Dict[str, float]]:
+    """
+    Get the totals recorded so far.
+
+    Returns:
+        Dict: Counters keyed by (node, thread_id), where thread_id is "" for
+            the totals of expired threads and of work outside any thread
+    """
+    with _lock:
+        return {key: dict(values) for key, values in _totals.items()}
+
+
+def cached_token_ratios() -> Dict[str, float]:
+    """
+    Get the share of each node's prompt tokens served from the provider's prompt cache.
+
+    Returns:
+        Dict[str, float]: Ratio (0-1) per node that called the model
+    """
+    prompt: Dict[str, float] = defaultdict(float)
+    cached: Dict[str, float] = defaultdict(float)
+    for (node, _), values in snapshot().items():
+        prompt[node] += values["llm_prompt_tokens"]
+        cached[node] += values["llm_cached_tokens"]
+    return {node: cached[node] / tokens for node, tokens in prompt.items() if tokens}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    """
+    Format the totals recorded so far in the Prometheus text exposition format.
+
+    Returns:
+        str: Metrics text
+    """
+    totals = snapshot()
+    lines = []
+    for metric, help_text in METRICS.items():
+        name = f"healthbot_{metric}_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (node, thread_id), values in sorted(totals.items()):
+            if not values[metric]:
+                continue
+            labels = f'node="{_label(node)}",thread_id="{_label(thread_id)}"'
+            lines.append(f"{name}{{{labels}}} {values[metric]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics() -> None:
+    """
+    Write the buffered JSON lines, or the Prometheus totals, to METRICS_PATH.
+    Called automatically at exit.
+    """
+    if INSTRUMENTATION and METRICS_FORMAT == "prometheus":
+        _write(prometheus_text(), "w")
+    else:
+        flush_metrics()
+
+
+atexit.register(export_metrics)
@@ -1,18 +1,182 @@
 """
 HealthBot Models Module
 This module initializes the language models used by the HealthBot application.
+
+Each task the model is asked to do (summarizing, writing quiz questions, grading
+and explaining answers) is routed to its own model settings, so quick jobs can
+use a faster model, a shorter answer limit or a local OpenAI-compatible endpoint
+while summaries keep the default model. Settings not configured for a task fall
+back to the defaults.
 """
 
-from langchain_openai import ChatOpenAI
+import os
+from typing import Dict, NamedTuple, Optional
+from src.instrumentation import model_callbacks
+from src.ratelimit import model_rate_limiter, rate_limit_callbacks
+
+# Tasks the model is asked to do
+SUMMARY = "summary"
+QUIZ = "quiz"
+GRADE = "grade"
+FEEDBACK = "feedback"
+TASKS = [SUMMARY, QUIZ, GRADE, FEEDBACK]
+
+
+class ModelSettings(NamedTuple):
+    """
+    Settings of the model serving a task.
+
+    Attributes:
+        model: Model name, or None for ChatOpenAI's default
+        temperature: Controls randomness in the model's output
+        max_tokens: Most tokens an answer may have, or None for no limit
+        timeout: Seconds a request may take, or None to be bounded only by the
+            node's deadline
+        base_url: OpenAI-compatible endpoint to use instead of OpenAI's
+        api_key: Key for that endpoint; defaults to OPENAI_API_KEY
+        escalation_model: Model to retry with, at the default endpoint, when the
+            answer fails validation
+    """
+
+    model: Optional[str] = None
+    temperature: float = 0.2
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    escalation_model: Optional[str] = None
+
 
-def initialize_model(temperature: float = 0.2):
+def model_settings(task: Optional[str] = None) -> ModelSettings:
+    """
+    Read a task's model settings from the environment.
+
+    Defaults come from HEALTHBOT_MODEL, HEALTHBOT_MODEL_TEMPERATURE, ... and are
+    overridden per task by HEALTHBOT_<TASK>_MODEL, HEALTHBOT_<TASK>_MODEL_TEMPERATURE, ...
+
+    Args:
+        task: One of TASKS, or None for the defaults
+
+    Returns:
+        ModelSettings: The task's settings
+    """
+    defaults = ModelSettings() if task is None else model_settings()
+    prefix = "HEALTHBOT_" if task is None else f"HEALTHBOT_{task.upper()}_"
+
+    def setting(name, default, parse=str):
+        value = os.getenv(prefix + name)
+        return default if value in [None, ""] else parse(value)
+
+    return ModelSettings(
+        model=setting("MODEL", defaults.model),
+        temperature=setting("MODEL_TEMPERATURE", defaults.temperature, float),
+        max_tokens=setting("MODEL_MAX_TOKENS", defaults.max_tokens, int),
+        timeout=setting("MODEL_TIMEOUT", defaults.timeout, float),
+        base_url=setting("MODEL_BASE_URL", defaults.base_url),
+        api_key=setting("MODEL_API_KEY", defaults.api_key),
+        escalation_model=setting("ESCALATION_MODEL", defaults.escalation_model),
+    )
+
+
+DEFAULT_SETTINGS = model_settings()
+TASK_SETTINGS: Dict[str, ModelSettings] = {task: model_settings(task) for task in TASKS}
+
+
+def same_model(a: ModelSettings, b: ModelSettings) -> bool:
+    """Check whether two settings give the same model, whatever they escalate to."""
+    return a._replace(escalation_model=None) == b._replace(escalation_model=None)
+
+
+def model_route(task: Optional[str] = None, escalation: bool = False) -> Optional[str]:
+    """
+    Get the name of the shared client serving a task.
+
+    Tasks configured like the defaults share the "model" client.
+
+    Args:
+        task: One of TASKS, or None for the default model
+        escalation: Get the client to retry invalid answers with instead
+
+    Returns:
+        str: Client name, or None when asking for the escalation client of a
+            task that has no escalation model
+    """
+    settings = TASK_SETTINGS[task] if task is not None else DEFAULT_SETTINGS
+    if escalation:
+        if settings.escalation_model is None:
+            return None
+        return f"model:{task or 'default'}:escalation"
+    if task is None or same_model(settings, DEFAULT_SETTINGS):
+        return "model"
+    return f"model:{task}"
+
+
+def model_id(task: Optional[str] = None) -> str:
+    """
+    Identify the model serving a task, e.g. "gpt-4o-mini", for use in the keys
+    of content cached from its answers, so rerouting a task regenerates it.
+
+    Args:
+        task: One of TASKS, or None for the default model
+
+    Returns:
+        str: Model name, followed by "@<base_url>" for another endpoint
+    """
+    settings = TASK_SETTINGS[task] if task is not None else DEFAULT_SETTINGS
+    name = settings.model or "default"
+    return f"{name}@{settings.base_url}" if settings.base_url is not None else name
+
+
+def initialize_model(
+    temperature: Optional[float] = None,
+    http_client=None,
+    http_async_client=None,
+    task: Optional[str] = None,
+    escalation: bool = False,
+):
     """
     Initialize the language model with specified parameters.
-    
+
     Args:
-        temperature: Controls randomness in the model's output (default: 0.2)
-        
+        temperature: Controls randomness in the model's output (default: the
+            task's setting, 0.2 unless configured)
+        http_client: Pooled httpx.Client to send requests with (default: the
+            OpenAI client's own)
+        http_async_client: Pooled httpx.AsyncClient for async requests
+        task: One of TASKS to use its model settings, or None for the defaults
+        escalation: Use the task's escalation model
+
     Returns:
         ChatOpenAI: Configured language model instance
     """
-    return ChatOpenAI(temperature=temperature)
\ No newline at end of file
+    # Imported here as it is slow to import and only needed once a model is used
+    from langchain_openai import ChatOpenAI
+
+    settings = TASK_SETTINGS[task] if task is not None else DEFAULT_SETTINGS
+    if escalation:
+        # Invalid answers are retried on the escalation model at the default endpoint
+        settings = DEFAULT_SETTINGS._replace(
+            model=settings.escalation_model, temperature=settings.temperature
+        )
+    options = {}
+    if settings.model is not None:
+        options["model"] = settings.model
+    if settings.api_key is not None:
+        options["api_key"] = settings.api_key
+    # Calls to another endpoint don't count against the OpenAI quotas
+    local = settings.base_url is not None
+
+    return ChatOpenAI(
+        temperature=settings.temperature if temperature is None else temperature,
+        max_tokens=settings.max_tokens,
+        timeout=settings.timeout,
+        base_url=settings.base_url,
+        # Report token usage for streamed responses too
+        stream_usage=True,
+        callbacks=model_callbacks() + ([] if local else rate_limit_callbacks()),
+        # Queue calls within the HEALTHBOT_MODEL_RPM/TPM quotas, if set
+        rate_limiter=None if local else model_rate_limiter(),
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **options,
+    )
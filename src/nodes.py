@@ -3,15 +3,190 @@ HealthBot Nodes Module
 This module defines all the workflow nodes for the HealthBot application.
 """
 
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from typing import Dict, List
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END
 from src.state import HealthBotState
-from src.utils import display_text_to_user, ask_user_for_input
-from src.tools import web_search
-from src.models import initialize_model
+from src.utils import (
+    display_text_to_user,
+    ask_user_for_input,
+    stream_text_to_user,
+    astream_text_to_user,
+)
+from src.tools import web_search, health_search_query
+from src.cache import canonical_topic, make_cache_key, summary_cache
+from src.context import build_context
+from src.prompts import render_prompt
+from src.quiz import (
+    MULTIPLE_CHOICE,
+    QUESTION,
+    QUIZ_FEEDBACK,
+    QUIZ_MODE,
+    agenerate_multiple_choice,
+    feedback_messages,
+    format_multiple_choice,
+    generate_multiple_choice,
+    grade_multiple_choice,
+    mark_seen,
+    option_label,
+    parse_selection,
+    stored_quiz,
+    unseen_quizzes,
+)
+from src.clients import get_model
+from src.models import FEEDBACK, GRADE, QUIZ, SUMMARY
+from src import prefetch
+from src.instrumentation import scope
+from src.singleflight import SingleFlight
+from src.deadline import acall, bind_deadline, call, remaining, within_deadline
+
+# Header and footer framing each section shown to the patient
+SUMMARY_SECTION = ("\n=== HEALTH INFORMATION SUMMARY ===\n", "\n===================================\n")
+QUIZ_SECTION = ("\n=== COMPREHENSION CHECK ===\n", "\n==========================\n")
+FEEDBACK_SECTION = ("\n=== FEEDBACK ===\n", "\n===============\n")
+
+# Sessions summarizing the same topic and content at the same time share one model call
+_summaries = SingleFlight("summarize")
+
+
+def is_streaming(config: RunnableConfig) -> bool:
+    """
+    Check whether model output should be streamed to the user token by token.
+
+    Streaming is enabled with `configurable={"stream": True}` in the run config.
+    In streaming mode the generating nodes display their own output and the
+    matching present_* nodes do nothing.
 
-# Initialize the language model
-model = initialize_model()
+    Args:
+        config: Run configuration passed to the node
+
+    Returns:
+        bool: True if streaming mode is enabled
+    """
+    return bool((config or {}).get("configurable", {}).get("stream", False))
+
+
+def quiz_mode(config: RunnableConfig) -> str:
+    """
+    Get the kind of quiz to ask in a run.
+
+    Set with `configurable={"quiz_mode": ...}` in the run config; defaults to
+    HEALTHBOT_QUIZ_MODE.
+
+    Args:
+        config: Run configuration passed to the node
+
+    Returns:
+        str: MULTIPLE_CHOICE or "open"
+    """
+    return (config or {}).get("configurable", {}).get("quiz_mode", QUIZ_MODE)
+
+
+def quiz_user(config: RunnableConfig):
+    """
+    Identify the patient a run's quiz questions are served to, so they aren't
+    asked the same question twice.
+
+    Set with `configurable={"user_id": ...}` in the run config; defaults to the
+    conversation thread.
+
+    Args:
+        config: Run configuration passed to the node
+
+    Returns:
+        str: User id or thread_id, or None if the run has neither
+    """
+    configurable = (config or {}).get("configurable", {})
+    user = configurable.get("user_id", configurable.get("thread_id"))
+    return str(user) if user is not None else None
+
+
+def quiz_prefetch_key(config: RunnableConfig):
+    """
+    Build the key under which the quiz for a conversation thread is prefetched.
+
+    Args:
+        config: Run configuration passed to the node
+
+    Returns:
+        str: Prefetch key, or None if the run has no thread_id
+    """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return f"{thread_id}:quiz" if thread_id is not None else None
+
+
+def display_section(section, text: str) -> None:
+    """
+    Display text framed by a section header and footer.
+
+    Args:
+        section: (header, footer) pair framing the text
+        text: The text to display
+    """
+    header, footer = section
+    display_text_to_user(header)
+    display_text_to_user(text)
+    display_text_to_user(footer)
+
+
+def generate_text(
+    messages: List[BaseMessage], config: RunnableConfig, section, task: str
+) -> str:
+    """
+    Run the language model, streaming the answer inside `section` in streaming mode.
+
+    The call gives up at the node's deadline (see `src.deadline`); complete
+    answers may be hedged, streamed ones are not.
+
+    Args:
+        messages: Prompt messages for the model
+        config: Run configuration passed to the node
+        section: (header, footer) pair framing the streamed output
+        task: Task the model is asked to do, selecting the model (see `src.models`)
+
+    Returns:
+        str: The full model output
+    """
+    if not is_streaming(config):
+        return call(lambda: get_model(task).invoke(messages).content, "model")
+
+    header, footer = section
+    display_text_to_user(header)
+    text = call(
+        lambda: stream_text_to_user(
+            chunk.content for chunk in within_deadline(get_model(task).stream(messages))
+        )
+    )
+    display_text_to_user(footer)
+    return text
+
+
+async def agenerate_text(
+    messages: List[BaseMessage], config: RunnableConfig, section, task: str
+) -> str:
+    """
+    Async version of `generate_text`.
+
+    Args:
+        messages: Prompt messages for the model
+        config: Run configuration passed to the node
+        section: (header, footer) pair framing the streamed output
+        task: Task the model is asked to do, selecting the model (see `src.models`)
+
+    Returns:
+        str: The full model output
+    """
+    if not is_streaming(config):
+        return (await acall(lambda: get_model(task).ainvoke(messages), "model")).content
+
+    header, footer = section
+    display_text_to_user(header)
+    text = await acall(
+        lambda: astream_text_to_user(chunk.content async for chunk in get_model(task).astream(messages))
+    )
+    display_text_to_user(footer)
+    return text
 
 
 def ask_health_topic(state: HealthBotState) -> HealthBotState:
@@ -53,7 +228,7 @@ def search_information(state: HealthBotState) -> HealthBotState:
         Updated state with search results
     """
     health_topic = state["health_topic"]
-    search_query = f"{health_topic} health information medical explanation"
+    search_query = health_search_query(health_topic)
 
     display_text_to_user(f"Searching for information about {health_topic}...")
 
@@ -63,69 +238,182 @@ def search_information(state: HealthBotState) -> HealthBotState:
     return {"search_results": search_results}
 
 
-def summarize_information(state: HealthBotState) -> HealthBotState:
+async def asearch_information(state: HealthBotState) -> HealthBotState:
+    """
+    Async version of `search_information`.
+
+    Args:
+        state: Current state of the conversation
+
+    Returns:
+        Updated state with search results
+    """
+    health_topic = state["health_topic"]
+    search_query = health_search_query(health_topic)
+
+    display_text_to_user(f"Searching for information about {health_topic}...")
+
+    # Call Tavily search without blocking the event loop
+    search_results = await web_search.ainvoke(search_query)
+
+    return {"search_results": search_results}
+
+
+def summary_messages(health_topic: str, content: str) -> List[BaseMessage]:
+    """
+    Build the prompt asking the model to summarize the source content.
+
+    Args:
+        health_topic: The health topic being studied
+        content: Source content extracted from the search results
+
+    Returns:
+        List[BaseMessage]: Prompt messages for the model
+    """
+    return render_prompt("summary", health_topic=health_topic, content=content)
+
+
+def summary_flight_key(health_topic: str, content: str) -> str:
+    """
+    Build the key under which concurrent summarizations are coalesced.
+
+    Args:
+        health_topic: The health topic being studied
+        content: The source content being summarized
+
+    Returns:
+        str: Key shared by spellings of the topic with the same canonical form
+    """
+    return make_cache_key("summarize", canonical_topic(health_topic), content)
+
+
+def summarize_information(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
     Summarize the search results into patient-friendly language.
 
+    Only the most relevant passages of the search results are sent, within the
+    HEALTHBOT_CONTEXT_MAX_TOKENS budget (see `build_context`). Sessions
+    summarizing the same topic and content at the same time wait for one model
+    call and share its summary.
+
     Args:
         state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
     Returns:
-        Updated state with summary and updated message history
+        Updated state with summary, its sources and updated message history
     """
     health_topic = state["health_topic"]
-    search_results = state["search_results"]
-
-    # Extract content from search results
-    content = ""
-    for result in search_results.get("results", []):
-        content += f"Title: {result.get('title', '')}\n"
-        content += f"Content: {result.get('content', '')}\n\n"
-
-    # Create a prompt for summarization
-    system_message = SystemMessage(
-        content="""
-    You are a healthcare educator who specializes in explaining medical concepts in simple, patient-friendly language.
-    Summarize the provided information into 3-4 paragraphs that are easy to understand.
-    Focus on key facts, symptoms, treatments, and preventive measures if applicable.
-    Use simple language and avoid medical jargon when possible.
-    If you need to use medical terms, provide a brief explanation.
+    content, sources = build_context(health_topic, state["search_results"])
+
+    # Reuse a summary already generated for this topic and content
+    summary = summary_cache.lookup(health_topic, content)
+    if summary is not None:
+        if is_streaming(config):
+            display_section(SUMMARY_SECTION, summary)
+    else:
+        messages = summary_messages(health_topic, content)
+
+        def summarize():
+            summary = generate_text(messages, config, SUMMARY_SECTION, SUMMARY)
+            summary_cache.store(health_topic, content, summary)
+            return summary
+
+        summary, shared = _summaries.do(summary_flight_key(health_topic, content), summarize)
+        # Another session generated it, so nothing was streamed to this one
+        if shared and is_streaming(config):
+            display_section(SUMMARY_SECTION, summary)
+
+    # Start on the quiz while the patient reads the summary
+    start_quiz_prefetch(health_topic, summary, config)
+
+    return {
+        "summary": summary,
+        "sources": sources,
+        "messages": [AIMessage(content=summary)],
+    }
+
+
+async def asummarize_information(
+    state: HealthBotState, config: RunnableConfig
+) -> HealthBotState:
     """
-    )
+    Async version of `summarize_information`.
 
-    human_message = HumanMessage(
-        content=f"""
-    Please summarize the following information about {health_topic} in patient-friendly language:
-    
-    {content}
+    Args:
+        state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
+
+    Returns:
+        Updated state with summary, its sources and updated message history
     """
-    )
+    health_topic = state["health_topic"]
+    content, sources = build_context(health_topic, state["search_results"])
+
+    # Reuse a summary already generated for this topic and content
+    summary = summary_cache.lookup(health_topic, content)
+    if summary is not None:
+        if is_streaming(config):
+            display_section(SUMMARY_SECTION, summary)
+    else:
+        messages = summary_messages(health_topic, content)
 
-    # Generate summary
-    ai_message = model.invoke([system_message, human_message])
-    summary = ai_message.content
+        async def summarize():
+            summary = await agenerate_text(messages, config, SUMMARY_SECTION, SUMMARY)
+            summary_cache.store(health_topic, content, summary)
+            return summary
+
+        summary, shared = await _summaries.ado(
+            summary_flight_key(health_topic, content), summarize
+        )
+        # Another session generated it, so nothing was streamed to this one
+        if shared and is_streaming(config):
+            display_section(SUMMARY_SECTION, summary)
+
+    # Start on the quiz while the patient reads the summary
+    start_quiz_prefetch(health_topic, summary, config)
 
     return {
         "summary": summary,
-        "messages": state["messages"] + [AIMessage(content=summary)],
+        "sources": sources,
+        "messages": [AIMessage(content=summary)],
     }
 
 
-def present_summary(state: HealthBotState) -> HealthBotState:
+def format_sources(sources: List[Dict[str, str]]) -> str:
+    """
+    Format the sources a summary is based on as a list.
+
+    Args:
+        sources: Title and url of each source
+
+    Returns:
+        str: The sources, one per line
+    """
+    lines = [
+        f"- {source['title']} ({source['url']})" if source.get("url") else f"- {source['title']}"
+        for source in sources
+    ]
+    return "\n".join(["Sources:"] + lines)
+
+
+def present_summary(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
     Present the summarized information to the patient.
 
     Args:
         state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
     Returns:
         Unchanged state after displaying the summary
     """
-    summary = state["summary"]
+    # In streaming mode the summary was already shown as it was generated
+    if not is_streaming(config):
+        display_section(SUMMARY_SECTION, state["summary"])
 
-    display_text_to_user("\n=== HEALTH INFORMATION SUMMARY ===\n")
-    display_text_to_user(summary)
-    display_text_to_user("\n===================================\n")
+    if state.get("sources"):
+        display_text_to_user(format_sources(state["sources"]))
 
     return state
 
@@ -153,59 +441,183 @@ def ready_for_quiz(state: HealthBotState) -> HealthBotState:
         return state
 
 
-def generate_quiz(state: HealthBotState) -> HealthBotState:
+def quiz_messages(health_topic: str, summary: str) -> List[BaseMessage]:
+    """
+    Build the prompt asking the model for a quiz question about the summary.
+
+    Args:
+        health_topic: The health topic being studied
+        summary: The summary the question must be based on
+
+    Returns:
+        List[BaseMessage]: Prompt messages for the model
+    """
+    return render_prompt("question", health_topic=health_topic, summary=summary)
+
+
+def start_quiz_prefetch(health_topic: str, summary: str, config: RunnableConfig) -> None:
+    """
+    Generate the quiz question in the background so generate_quiz can just collect it.
+
+    Args:
+        health_topic: The health topic being studied
+        summary: The summary the question must be based on
+        config: Run configuration passed to the node
+    """
+    key = quiz_prefetch_key(config)
+    user = quiz_user(config)
+    # Nothing to prefetch if the question bank has a question the patient hasn't
+    # seen, or the free-text question was pregenerated in batch mode
+    if quiz_mode(config) == MULTIPLE_CHOICE:
+        if unseen_quizzes(summary, user):
+            return
+    elif stored_quiz(QUESTION, summary) is not None:
+        return
+    if prefetch.PREFETCH_QUIZ and key is not None:
+        if quiz_mode(config) == MULTIPLE_CHOICE:
+            task = lambda: generate_multiple_choice(get_model(QUIZ), health_topic, summary, user)
+        else:
+            messages = quiz_messages(health_topic, summary)
+            task = lambda: call(lambda: get_model(QUIZ).invoke(messages).content, "model")
+        # Attribute the prefetched call to the node that will use it, and give
+        # it that node's deadline
+        thread_id = str(config["configurable"]["thread_id"])
+        with scope("generate_quiz", timed=False):
+            prefetch.prefetch(
+                key, bind_deadline("generate_quiz", thread_id, task), thread_id=thread_id
+            )
+
+
+def quiz_text(state: HealthBotState) -> str:
+    """
+    Build the quiz text shown to the patient.
+
+    Args:
+        state: Current state of the conversation
+
+    Returns:
+        str: The question, with lettered options for a multiple-choice quiz
+    """
+    if state.get("quiz_options"):
+        return format_multiple_choice(state["quiz_question"], state["quiz_options"])
+    return state["quiz_question"]
+
+
+def multiple_choice_update(quiz_data, config: RunnableConfig) -> HealthBotState:
+    """
+    Build the state update for a generated multiple-choice quiz.
+
+    Args:
+        quiz_data: Quiz data with question, options, correct_answers and explanation
+        config: Run configuration, used to select streaming mode
+
+    Returns:
+        Updated state with the quiz question, options and answers
+    """
+    update = {
+        "quiz_question": quiz_data["question"],
+        "quiz_options": quiz_data["options"],
+        "quiz_correct_answers": quiz_data["correct_answers"],
+        "quiz_explanation": quiz_data.get("explanation", ""),
+    }
+    # The question is generated as JSON, so there is nothing to stream
+    if is_streaming(config):
+        display_section(QUIZ_SECTION, quiz_text(update))
+    return update
+
+
+def generate_quiz(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
     Generate a quiz question based on the summary.
 
+    In multiple-choice quiz mode (the default, see `quiz_mode`) this is a
+    select-all-that-apply question graded locally; otherwise a free-text question
+    graded by the model. Multiple-choice questions come from the summary's question
+    bank, skipping ones the patient has seen (see `quiz_user`). Uses a question
+    pregenerated in batch mode or prefetched after summarization when one is available.
+
     Args:
         state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
     Returns:
         Updated state with quiz question
     """
-    health_topic = state["health_topic"]
-    summary = state["summary"]
+    if quiz_mode(config) == MULTIPLE_CHOICE:
+        quiz_data = prefetch.collect_result(quiz_prefetch_key(config), remaining())
+        if quiz_data is None:
+            quiz_data = generate_multiple_choice(
+                get_model(QUIZ), state["health_topic"], state["summary"], quiz_user(config)
+            )
+        # Only now is the patient asked the question, prefetched or not
+        mark_seen(state["summary"], quiz_user(config), quiz_data)
+        return multiple_choice_update(quiz_data, config)
+
+    quiz_question = stored_quiz(QUESTION, state["summary"])
+    if quiz_question is None:
+        quiz_question = prefetch.collect_result(quiz_prefetch_key(config), remaining())
+    if quiz_question is not None:
+        if is_streaming(config):
+            display_section(QUIZ_SECTION, quiz_question)
+        return {"quiz_question": quiz_question, "quiz_options": []}
 
-    system_message = SystemMessage(
-        content="""
-    You are a healthcare educator creating a comprehension check question.
-    Create ONE quiz question based ONLY on the information provided in the summary.
-    The question should test understanding of a key concept from the summary.
-    Make sure the answer can be found directly in the summary text.
-    Don't provide the answer in the question.
+    # Generate quiz question
+    messages = quiz_messages(state["health_topic"], state["summary"])
+    quiz_question = generate_text(messages, config, QUIZ_SECTION, QUIZ)
+
+    return {"quiz_question": quiz_question, "quiz_options": []}
+
+
+async def agenerate_quiz(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
-    )
+    Async version of `generate_quiz`.
+
+    Args:
+        state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
-    human_message = HumanMessage(
-        content=f"""
-    Please create one quiz question about {health_topic} based on this summary:
-    
-    {summary}
+    Returns:
+        Updated state with quiz question
     """
-    )
+    if quiz_mode(config) == MULTIPLE_CHOICE:
+        quiz_data = await prefetch.acollect_result(quiz_prefetch_key(config), remaining())
+        if quiz_data is None:
+            quiz_data = await agenerate_multiple_choice(
+                get_model(QUIZ), state["health_topic"], state["summary"], quiz_user(config)
+            )
+        # Only now is the patient asked the question, prefetched or not
+        mark_seen(state["summary"], quiz_user(config), quiz_data)
+        return multiple_choice_update(quiz_data, config)
+
+    quiz_question = stored_quiz(QUESTION, state["summary"])
+    if quiz_question is None:
+        quiz_question = await prefetch.acollect_result(quiz_prefetch_key(config), remaining())
+    if quiz_question is not None:
+        if is_streaming(config):
+            display_section(QUIZ_SECTION, quiz_question)
+        return {"quiz_question": quiz_question, "quiz_options": []}
 
     # Generate quiz question
-    ai_message = model.invoke([system_message, human_message])
-    quiz_question = ai_message.content
+    messages = quiz_messages(state["health_topic"], state["summary"])
+    quiz_question = await agenerate_text(messages, config, QUIZ_SECTION, QUIZ)
 
-    return {"quiz_question": quiz_question}
+    return {"quiz_question": quiz_question, "quiz_options": []}
 
 
-def present_quiz(state: HealthBotState) -> HealthBotState:
+def present_quiz(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
     Present the quiz question to the patient.
 
     Args:
         state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
     Returns:
         Unchanged state after displaying the quiz
     """
-    quiz_question = state["quiz_question"]
-
-    display_text_to_user("\n=== COMPREHENSION CHECK ===\n")
-    display_text_to_user(quiz_question)
-    display_text_to_user("\n==========================\n")
+    # In streaming mode the question was already shown as it was generated
+    if not is_streaming(config):
+        display_section(QUIZ_SECTION, quiz_text(state))
 
     return state
 
@@ -220,77 +632,170 @@ def get_answer(state: HealthBotState) -> HealthBotState:
     Returns:
         Updated state with user's answer
     """
-    user_answer = ask_user_for_input("Your answer: ")
+    prompt = "Your answer (letters): " if state.get("quiz_options") else "Your answer: "
+    user_answer = ask_user_for_input(prompt)
 
     return {"user_answer": user_answer}
 
 
-def grade_answer(state: HealthBotState) -> HealthBotState:
+def grade_messages(quiz_question: str, user_answer: str, summary: str) -> List[BaseMessage]:
     """
-    Grade the patient's answer and provide feedback.
+    Build the prompt asking the model to grade the patient's answer.
 
     Args:
-        state: Current state of the conversation
+        quiz_question: The quiz question that was asked
+        user_answer: The patient's answer
+        summary: The summary the question was based on
 
     Returns:
-        Updated state with grade and feedback
-    """
-    quiz_question = state["quiz_question"]
-    user_answer = state["user_answer"]
-    summary = state["summary"]
-
-    system_message = SystemMessage(
-        content="""
-    You are a healthcare educator evaluating a patient's understanding.
-    Grade the patient's answer to the quiz question.
-    Provide a letter grade (A, B, C, D, or F) based on accuracy.
-    Include specific feedback that references the original summary.
-    Your feedback should include direct citations from the summary to reinforce learning.
-    Be encouraging and supportive, even if the answer was not fully correct.
+        List[BaseMessage]: Prompt messages for the model
     """
+    return render_prompt(
+        "grade", summary=summary, quiz_question=quiz_question, user_answer=user_answer
     )
 
-    human_message = HumanMessage(
-        content=f"""
-    Quiz Question: {quiz_question}
-    
-    Patient's Answer: {user_answer}
-    
-    Original Summary: {summary}
-    
-    Please grade this answer and provide feedback with citations from the summary.
+
+def parse_grade(grade_feedback: str) -> str:
     """
-    )
+    Try to extract the letter grade from the model's feedback.
 
-    # Generate grade and feedback
-    ai_message = model.invoke([system_message, human_message])
-    grade_feedback = ai_message.content
+    Args:
+        grade_feedback: The grading feedback generated by the model
 
-    # Try to extract the letter grade from the feedback
+    Returns:
+        str: The letter grade, or "N/A" if none was found
+    """
     grade = "N/A"
     if "Grade: " in grade_feedback:
         grade = grade_feedback.split("Grade: ")[1].split("\n")[0].strip()
-    elif grade_feedback[0].upper() in ["A", "B", "C", "D", "F"]:
+    elif grade_feedback[:1].upper() in ["A", "B", "C", "D", "F"]:
         grade = grade_feedback[0].upper()
+    return grade
+
+
+def grade_locally(state: HealthBotState):
+    """
+    Grade the patient's answer to a multiple-choice quiz without the model.
+
+    Args:
+        state: Current state of the conversation
+
+    Returns:
+        tuple: Letter grade, feedback text, and the selected option indices
+    """
+    options = state["quiz_options"]
+    correct = state["quiz_correct_answers"]
+    selected = parse_selection(state["user_answer"], len(options))
+    grade, verdict = grade_multiple_choice(selected, correct)
+
+    correct_list = "\n".join(f"- {option_label(i)}) {options[i]}" for i in correct)
+    feedback = f"Grade: {grade}\n\n{verdict}\n\nThe correct answer(s) were:\n{correct_list}"
+    if state.get("quiz_explanation"):
+        feedback += f"\n\nExplanation:\n{state['quiz_explanation']}"
+    return grade, feedback, selected
+
+
+def needs_model_feedback(grade: str) -> bool:
+    """
+    Check whether to ask the model for feedback on a multiple-choice answer.
 
-    return {"grade": grade, "feedback": grade_feedback}
+    Args:
+        grade: The locally computed letter grade
 
+    Returns:
+        bool: True if HEALTHBOT_QUIZ_FEEDBACK=model and the answer wasn't fully correct
+    """
+    return QUIZ_FEEDBACK == "model" and grade != "A"
 
-def present_grade(state: HealthBotState) -> HealthBotState:
+
+def grade_answer(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
+    """
+    Grade the patient's answer and provide feedback.
+
+    Multiple-choice answers are graded locally; the model is only asked for a
+    short explanation when HEALTHBOT_QUIZ_FEEDBACK=model. Free-text answers are
+    graded by the model.
+
+    Args:
+        state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
+
+    Returns:
+        Updated state with grade and feedback
+    """
+    if state.get("quiz_options"):
+        grade, feedback, selected = grade_locally(state)
+        if needs_model_feedback(grade):
+            messages = feedback_messages(
+                state["quiz_question"],
+                state["quiz_options"],
+                state["quiz_correct_answers"],
+                selected,
+            )
+            # Show the local verdict first, then stream the model's note below it
+            section = (f"{FEEDBACK_SECTION[0]}\n{feedback}\n", FEEDBACK_SECTION[1])
+            feedback += "\n\n" + generate_text(messages, config, section, FEEDBACK)
+        elif is_streaming(config):
+            display_section(FEEDBACK_SECTION, feedback)
+        return {"grade": grade, "feedback": feedback}
+
+    messages = grade_messages(state["quiz_question"], state["user_answer"], state["summary"])
+
+    # Generate grade and feedback
+    grade_feedback = generate_text(messages, config, FEEDBACK_SECTION, GRADE)
+
+    return {"grade": parse_grade(grade_feedback), "feedback": grade_feedback}
+
+
+async def agrade_answer(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
+    """
+    Async version of `grade_answer`.
+
+    Args:
+        state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
+
+    Returns:
+        Updated state with grade and feedback
+    """
+    if state.get("quiz_options"):
+        grade, feedback, selected = grade_locally(state)
+        if needs_model_feedback(grade):
+            messages = feedback_messages(
+                state["quiz_question"],
+                state["quiz_options"],
+                state["quiz_correct_answers"],
+                selected,
+            )
+            # Show the local verdict first, then stream the model's note below it
+            section = (f"{FEEDBACK_SECTION[0]}\n{feedback}\n", FEEDBACK_SECTION[1])
+            feedback += "\n\n" + await agenerate_text(messages, config, section, FEEDBACK)
+        elif is_streaming(config):
+            display_section(FEEDBACK_SECTION, feedback)
+        return {"grade": grade, "feedback": feedback}
+
+    messages = grade_messages(state["quiz_question"], state["user_answer"], state["summary"])
+
+    # Generate grade and feedback
+    grade_feedback = await agenerate_text(messages, config, FEEDBACK_SECTION, GRADE)
+
+    return {"grade": parse_grade(grade_feedback), "feedback": grade_feedback}
+
+
+def present_grade(state: HealthBotState, config: RunnableConfig) -> HealthBotState:
     """
     Present the grade and feedback to the patient.
 
     Args:
         state: Current state of the conversation
+        config: Run configuration, used to select streaming mode
 
     Returns:
         Unchanged state after displaying the feedback
     """
-    feedback = state["feedback"]
-
-    display_text_to_user("\n=== FEEDBACK ===\n")
-    display_text_to_user(feedback)
-    display_text_to_user("\n===============\n")
+    # In streaming mode the feedback was already shown as it was generated
+    if not is_streaming(config):
+        display_section(FEEDBACK_SECTION, state["feedback"])
 
     return state
 
@@ -347,7 +852,11 @@ def reset_state(state: HealthBotState) -> HealthBotState:
         "health_topic": "",
         "search_results": None,
         "summary": "",
+        "sources": [],
         "quiz_question": "",
+        "quiz_options": [],
+        "quiz_correct_answers": [],
+        "quiz_explanation": "",
         "user_answer": "",
         "grade": "",
         "feedback": "",
@@ -0,0 +1,181 @@
+"""
+HealthBot Prefetch Module
+This module runs speculative background work for the HealthBot application,
+such as generating the quiz while the patient is still reading the summary.
+
+Prefetched work nobody collects is dropped after HEALTHBOT_PREFETCH_TTL seconds,
+when more than HEALTHBOT_PREFETCH_MAX_PENDING prefetches are pending, or when
+the checkpointer evicts the thread it was started for.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional, Tuple
+from src.checkpoint import on_thread_evicted
+from src.instrumentation import bind_scope
+from src.ratelimit import BACKGROUND, priority
+
+# Whether quiz questions are generated speculatively in the background
+PREFETCH_QUIZ = os.getenv("HEALTHBOT_PREFETCH_QUIZ", "true").lower() in ["1", "true", "yes"]
+
+# Seconds an uncollected prefetch is kept, and most prefetches kept at once
+PREFETCH_TTL = float(os.getenv("HEALTHBOT_PREFETCH_TTL", "1800"))
+PREFETCH_MAX_PENDING = int(os.getenv("HEALTHBOT_PREFETCH_MAX_PENDING", "1000"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEALTHBOT_PREFETCH_WORKERS", "4")),
+    thread_name_prefix="healthbot-prefetch",
+)
+# Pending prefetches by key, oldest first: future, start time and thread_id
+_pending: "OrderedDict[str, Tuple[Future, float, Optional[str]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _expire() -> None:
+    # Drop the oldest prefetches past the TTL or the size bound; called with _lock held
+    cutoff = time.monotonic() - PREFETCH_TTL
+    while _pending:
+        key, (future, started, _) = next(iter(_pending.items()))
+        if started >= cutoff and len(_pending) <= PREFETCH_MAX_PENDING:
+            break
+        del _pending[key]
+        future.cancel()
+
+
+def prefetch(key: str, fn: Callable, *args, thread_id: Optional[str] = None) -> Future:
+    """
+    Start computing `fn(*args)` in the background under `key`.
+
+    Any earlier prefetch stored under the same key is cancelled. Its model and
+    search calls queue behind the ones a patient is waiting for.
+
+    Args:
+        key: Identifies the prefetched result, e.g. "<thread_id>:quiz"
+        fn: Function to run in the background
+        *args: Arguments for `fn`
+        thread_id: Conversation thread the work is for, whose eviction drops it
+
+    Returns:
+        Future: Future for the prefetched result
+    """
+    def run(*args):
+        with priority(BACKGROUND):
+            return fn(*args)
+
+    future = _executor.submit(bind_scope(run), *args)
+    with _lock:
+        previous = _pending.pop(key, None)
+        _pending[key] = (future, time.monotonic(), thread_id)
+        _expire()
+    if previous is not None:
+        previous[0].cancel()
+    return future
+
+
+def collect(key: str) -> Optional[Future]:
+    """
+    Take the prefetched work stored under `key`.
+
+    Args:
+        key: Identifies the prefetched result
+
+    Returns:
+        Future: The prefetch future, or None if nothing was prefetched or it expired
+    """
+    with _lock:
+        _expire()
+        entry = _pending.pop(key, None)
+    return entry[0] if entry is not None else None
+
+
+def collect_result(key: str, timeout: Optional[float] = None) -> Optional[Any]:
+    """
+    Wait for the work prefetched under `key` and return its result.
+
+    Args:
+        key: Identifies the prefetched result
+        timeout: Seconds to wait at most, or None to wait until it finishes
+
+    Returns:
+        The prefetched result, or None if nothing was prefetched, it failed or
+        it didn't finish in time
+    """
+    future = collect(key)
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        return None
+    except (CancelledError, Exception):
+        return None
+
+
+async def acollect_result(key: str, timeout: Optional[float] = None) -> Optional[Any]:
+    """
+    Async version of `collect_result` that waits without blocking the event loop.
+
+    Args:
+        key: Identifies the prefetched result
+        timeout: Seconds to wait at most, or None to wait until it finishes
+
+    Returns:
+        The prefetched result, or None if nothing was prefetched, it failed or
+        it didn't finish in time
+    """
+    future = collect(key)
+    if future is None:
+        return None
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        future.cancel()
+        return None
+    except asyncio.CancelledError:
+        # Only swallow the prefetch being cancelled, not the caller
+        if future.cancelled():
+            return None
+        raise
+    except Exception:
+        return None
+
+
+def cancel(key: str) -> None:
+    """
+    Discard the prefetched work stored under `key`.
+
+    Work that has not started yet is cancelled; work already running is left to
+    finish and its result is dropped.
+
+    Args:
+        key: Identifies the prefetched result
+    """
+    future = collect(key)
+    if future is not None:
+        future.cancel()
+
+
+@on_thread_evicted
+def cancel_thread(thread_id: str) -> int:
+    """
+    Discard the prefetched work started for a conversation thread.
+
+    Args:
+        thread_id: The conversation thread
+
+    Returns:
+        int: Number of prefetches discarded
+    """
+    with _lock:
+        keys = [key for key, (_, _, thread) in _pending.items() if thread == str(thread_id)]
+        futures = [_pending.pop(key)[0] for key in keys]
+    for future in futures:
+        future.cancel()
+    return len(futures)
+
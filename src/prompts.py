@@ -0,0 +1,278 @@
+"""
+HealthBot Prompts Module
+This module keeps the prompts the HealthBot application sends to the language
+model, as versioned templates laid out for the provider's prompt caching.
+
+OpenAI reuses the computation for the longest prefix a prompt shares with recent
+prompts, which cuts the latency and cost of its input tokens. Every template
+therefore starts with its fixed instructions, followed by the content shared by
+everyone studying the topic (the source content or summary), and ends with
+what is specific to one patient, such as their answer. Rendering is byte-stable:
+the same inputs always produce exactly the same text.
+"""
+
+import re
+from textwrap import dedent
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+
+def clean(text: str) -> str:
+    """
+    Normalize text for a prompt, so equal inputs render to identical bytes.
+
+    Line endings become "\\n", trailing spaces and surrounding blank lines are
+    removed, and runs of blank lines become one.
+
+    Args:
+        text: Text to normalize
+
+    Returns:
+        str: Normalized text
+    """
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class PromptTemplate:
+    """
+    Versioned prompt made of fixed system instructions and a human message template.
+
+    Args:
+        name: Prompt name
+        version: Bumped whenever the wording or layout changes, so content cached
+            from the prompt's answers is regenerated
+        system: System instructions, identical on every call
+        human: Human message template with {placeholders}, shared content first
+    """
+
+    def __init__(self, name: str, version: int, system: str, human: str):
+        self.name = name
+        self.version = version
+        self.system = clean(dedent(system))
+        self.human = clean(dedent(human))
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render(self, **values: object) -> List[BaseMessage]:
+        """
+        Render the prompt messages.
+
+        Args:
+            **values: Values for the template's placeholders
+
+        Returns:
+            List[BaseMessage]: System and human messages
+        """
+        values = {name: clean(str(value)) for name, value in values.items()}
+        return [
+            SystemMessage(content=self.system),
+            HumanMessage(content=clean(self.human.format(**values))),
+        ]
+
+
+# Registered templates by name, then version
+PROMPTS: Dict[str, Dict[int, PromptTemplate]] = {}
+# Prompt ids by system instructions, to tell which prompt a model call was sent
+_by_system: Dict[str, str] = {}
+
+
+def register_prompt(template: PromptTemplate) -> PromptTemplate:
+    """
+    Add a prompt template to the registry.
+
+    Args:
+        template: The template
+
+    Returns:
+        PromptTemplate: The template
+    """
+    PROMPTS.setdefault(template.name, {})[template.version] = template
+    _by_system[template.system] = template.id
+    return template
+
+
+def get_prompt(name: str, version: Optional[int] = None) -> PromptTemplate:
+    """
+    Look up a prompt template.
+
+    Args:
+        name: Prompt name
+        version: Template version; defaults to the latest
+
+    Returns:
+        PromptTemplate: The template
+
+    Raises:
+        KeyError: If no such prompt is registered
+    """
+    versions = PROMPTS[name]
+    return versions[max(versions) if version is None else version]
+
+
+def render_prompt(name: str, **values: object) -> List[BaseMessage]:
+    """
+    Render the latest version of a prompt.
+
+    Args:
+        name: Prompt name
+        **values: Values for the template's placeholders
+
+    Returns:
+        List[BaseMessage]: Prompt messages for the model
+    """
+    return get_prompt(name).render(**values)
+
+
+def prompt_id(name: str) -> str:
+    """
+    Get the id of the latest version of a prompt, e.g. "summary@v1", for use
+    in the keys of content cached from its answers.
+
+    Args:
+        name: Prompt name
+
+    Returns:
+        str: Prompt id
+    """
+    return get_prompt(name).id
+
+
+def identify_prompt(messages: List[BaseMessage]) -> str:
+    """
+    Tell which registered prompt a list of messages was rendered from.
+
+    Args:
+        messages: Messages sent to the model
+
+    Returns:
+        str: Prompt id, or "" for messages not rendered from a registered prompt
+    """
+    if messages and isinstance(messages[0], SystemMessage):
+        return _by_system.get(messages[0].content, "")
+    return ""
+
+
+register_prompt(
+    PromptTemplate(
+        "summary",
+        1,
+        system="""
+        You are a healthcare educator who specializes in explaining medical concepts in simple, patient-friendly language.
+        Summarize the provided information into 3-4 paragraphs that are easy to understand.
+        Focus on key facts, symptoms, treatments, and preventive measures if applicable.
+        Use simple language and avoid medical jargon when possible.
+        If you need to use medical terms, provide a brief explanation.
+        """,
+        human="""
+        Information about {health_topic}:
+
+        {content}
+
+        Please summarize this information about {health_topic} in patient-friendly language.
+        """,
+    )
+)
+
+register_prompt(
+    PromptTemplate(
+        "question",
+        1,
+        system="""
+        You are a healthcare educator creating a comprehension check question.
+        Create ONE quiz question based ONLY on the information provided in the summary.
+        The question should test understanding of a key concept from the summary.
+        Make sure the answer can be found directly in the summary text.
+        Don't provide the answer in the question.
+        """,
+        human="""
+        Summary about {health_topic}:
+
+        {summary}
+
+        Please create one quiz question about {health_topic} based on this summary.
+        """,
+    )
+)
+
+register_prompt(
+    PromptTemplate(
+        "multiple_choice",
+        1,
+        system="""
+        You are a healthcare educator creating multiple-choice quiz questions.
+        Create the requested number of multiple-choice questions based ONLY on the information provided in the summary.
+        Each question should test understanding of a different key concept from the summary.
+
+        IMPORTANT: Each question MUST have at least 2 correct answers to make it a true multiple-choice question.
+
+        Your response must be in JSON format with the following structure:
+        {
+            "questions": [
+                {
+                    "question": "The question text",
+                    "options": ["Option A", "Option B", "Option C", "Option D"],
+                    "correct_answers": [0, 2],
+                    "explanation": "Explanation of why these are the correct answers"
+                }
+            ]
+        }
+
+        "correct_answers" holds the 0-based indices of the correct options and MUST include at least 2 indices.
+        Make sure all options are plausible but only the correct answers are truly accurate based on the summary.
+        Each question should be phrased as "Select all that apply" or similar wording to indicate multiple answers.
+        """,
+        # The questions to avoid change with every fill of the bank, so they come last
+        human="""
+        Summary about {health_topic}:
+
+        {summary}
+
+        Please create {count} different multiple-choice quiz questions (each with multiple correct answers) about {health_topic} based on this summary.
+
+        {avoid}
+        """,
+    )
+)
+
+register_prompt(
+    PromptTemplate(
+        "grade",
+        1,
+        system="""
+        You are a healthcare educator evaluating a patient's understanding.
+        Grade the patient's answer to the quiz question.
+        Provide a letter grade (A, B, C, D, or F) based on accuracy.
+        Include specific feedback that references the original summary.
+        Your feedback should include direct citations from the summary to reinforce learning.
+        Be encouraging and supportive, even if the answer was not fully correct.
+        """,
+        # The summary is shared by every patient, the answer is theirs alone
+        human="""
+        Original Summary: {summary}
+
+        Quiz Question: {quiz_question}
+
+        Patient's Answer: {user_answer}
+
+        Please grade this answer and provide feedback with citations from the summary.
+        """,
+    )
+)
+
+register_prompt(
+    PromptTemplate(
+        "feedback",
+        1,
+        system="""
+        You are a healthcare educator. In two or three encouraging sentences, explain to the patient why the correct options are right and, if they chose any wrong options, why those are wrong.
+        """,
+        human="""
+        Question: {question}
+        Correct options: {correct}
+        Patient chose: {selected}
+        """,
+    )
+)
@@ -0,0 +1,697 @@
+"""
+HealthBot Quiz Module
+This module builds the multiple-choice quiz prompt and keeps the store of
+pregenerated quiz questions for the HealthBot application.
+
+Multiple-choice questions are kept in a question bank per summary: one model
+call generates several questions, and each patient is served the questions
+they haven't seen yet, so most quizzes need no model call at all.
+"""
+
+import json
+import os
+import random
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel, ConfigDict, ValidationError
+from src.cache import make_cache_key, normalize_text, quiz_cache, quiz_seen_cache
+from src.clients import get_escalation_model
+from src.deadline import acall, call
+from src.instrumentation import record_escalation
+from src.models import QUIZ, model_id
+from src.prompts import prompt_id, render_prompt
+from src.singleflight import SingleFlight
+
+# Kinds of quiz question: the free-text question asked by the command line
+# workflow and the select-all-that-apply question shown by the web app
+QUESTION = "question"
+MULTIPLE_CHOICE = "multiple_choice"
+
+# Quiz asked by the command line workflow: "multiple_choice", graded locally,
+# or "open", a free-text question graded by the model
+QUIZ_MODE = os.getenv("HEALTHBOT_QUIZ_MODE", MULTIPLE_CHOICE)
+# Feedback on multiple-choice answers: "local" uses the quiz's own explanation;
+# "model" also asks the model for a short note on answers that aren't fully correct
+QUIZ_FEEDBACK = os.getenv("HEALTHBOT_QUIZ_FEEDBACK", "local")
+
+# Model calls made for one batch of multiple-choice questions when the output can't be repaired
+QUIZ_ATTEMPTS = 2
+# Multiple-choice questions generated per model call
+QUIZ_BANK_BATCH = int(os.getenv("HEALTHBOT_QUIZ_BANK_BATCH", "5"))
+# Most questions kept in a summary's question bank; a patient who has seen them
+# all starts over instead of the bank growing further
+QUIZ_BANK_MAX = int(os.getenv("HEALTHBOT_QUIZ_BANK_MAX", "20"))
+
+# Option labels the model sometimes prefixes, e.g. "A) " or "b. "
+OPTION_LABEL = re.compile(r"^\s*[A-Za-z][).]\s+")
+
+
+class Quiz(BaseModel):
+    """Multiple-choice quiz question with several correct answers."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    question: str
+    options: List[str]
+    correct_answers: List[int]
+    explanation: str
+
+
+class QuizBank(BaseModel):
+    """Batch of multiple-choice quiz questions about one summary."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    questions: List[Quiz]
+
+
+# Sessions needing new questions for the same summary at the same time share one model call
+_bank_fills = SingleFlight("quiz_bank")
+
+
+def quiz_key(kind: str, summary: str) -> str:
+    """
+    Build the store key of a quiz question.
+
+    Args:
+        kind: QUESTION or MULTIPLE_CHOICE
+        summary: The summary the question is based on
+
+    Returns:
+        str: Store key
+    """
+    # Questions from an older version of the prompt or another model are regenerated
+    return make_cache_key("quiz", prompt_id(kind), model_id(QUIZ), summary)
+
+
+def stored_quiz(kind: str, summary: str) -> Optional[Any]:
+    """
+    Look up a pregenerated quiz question for a summary.
+
+    Args:
+        kind: QUESTION or MULTIPLE_CHOICE
+        summary: The summary the question is based on
+
+    Returns:
+        The question text (QUESTION) or quiz data (MULTIPLE_CHOICE), or None
+    """
+    return quiz_cache.get(quiz_key(kind, summary))
+
+
+def store_quiz(kind: str, summary: str, quiz: Any, ttl: Optional[float] = None) -> None:
+    """
+    Store a generated quiz question for a summary.
+
+    Args:
+        kind: QUESTION or MULTIPLE_CHOICE
+        summary: The summary the question is based on
+        quiz: The question text (QUESTION) or quiz data (MULTIPLE_CHOICE)
+        ttl: Seconds the question stays valid, if not the store's default
+    """
+    quiz_cache.set(quiz_key(kind, summary), quiz, ttl)
+
+
+def multiple_choice_messages(
+    health_topic: str,
+    summary: str,
+    count: int = QUIZ_BANK_BATCH,
+    avoid: Iterable[str] = (),
+) -> List[BaseMessage]:
+    """
+    Build the prompt asking the model for a batch of multiple-choice quiz questions in JSON.
+
+    Args:
+        health_topic: The health topic being studied
+        summary: The summary the questions must be based on
+        count: Number of questions to ask for
+        avoid: Questions already in the bank, which must not be repeated
+
+    Returns:
+        List[BaseMessage]: Prompt messages for the model
+    """
+    avoid = list(avoid)
+    repeats = ""
+    if avoid:
+        listing = "\n".join(f"- {question}" for question in avoid)
+        repeats = f"Don't repeat these questions, which were asked before:\n{listing}"
+
+    return render_prompt(
+        "multiple_choice", health_topic=health_topic, summary=summary, count=count, avoid=repeats
+    )
+
+
+def quiz_response_format() -> Dict:
+    """
+    Build the OpenAI `response_format` constraining output to the question bank schema.
+
+    Returns:
+        Dict: JSON-schema response format for `QuizBank`
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "quiz_bank",
+            "schema": QuizBank.model_json_schema(),
+            "strict": True,
+        },
+    }
+
+
+def quiz_model(model: BaseChatModel) -> Runnable:
+    """
+    Bind a chat model to answer with JSON matching the question bank schema.
+
+    Args:
+        model: The chat model
+
+    Returns:
+        Runnable: The model with the quiz response format bound
+    """
+    return model.bind(response_format=quiz_response_format())
+
+
+def _load_json(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # Code fences or a sentence around the object
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start : end + 1])
+
+
+def _answer_index(answer: Any) -> Optional[int]:
+    if isinstance(answer, str):
+        answer = answer.strip().rstrip(").:")
+        if len(answer) == 1 and answer.isalpha():
+            return ord(answer.upper()) - ord("A")
+        if not answer.lstrip("-").isdigit():
+            return None
+    try:
+        return int(answer)
+    except (TypeError, ValueError):
+        return None
+
+
+def repair_quiz(data: Any) -> Dict:
+    """
+    Validate quiz data, fixing small mistakes instead of asking the model again.
+
+    Repairs option labels ("A) ..."), blank and duplicate options, answers given
+    as letters or strings, 1-based answer indices, duplicate or out-of-range
+    answers, and a missing explanation.
+
+    Args:
+        data: Quiz data decoded from the model output
+
+    Returns:
+        Dict: Quiz data with question, options, correct_answers and explanation
+
+    Raises:
+        ValueError: If the data can't be repaired into a question with at least
+            2 correct answers out of at least 3 options
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Quiz is not a JSON object")
+    options = data.get("options")
+    if not isinstance(options, list):
+        raise ValueError("Quiz has no options")
+
+    answers = data.get("correct_answers", [])
+    if not isinstance(answers, list):
+        answers = [answers]
+    indices = {_answer_index(a) for a in answers} - {None}
+    # 1-based indices: one points past the last option and none at the first
+    if indices and 0 not in indices and max(indices) == len(options):
+        indices = {i - 1 for i in indices}
+
+    # Strip labels only if every option has one, so "A. fib" stays intact
+    options = [str(option).strip() for option in options]
+    if options and all(OPTION_LABEL.match(option) for option in options):
+        options = [OPTION_LABEL.sub("", option) for option in options]
+
+    # Keep each distinct, non-blank option once, mapping the answers along
+    kept_options, correct, seen = [], [], {}
+    for i, option in enumerate(options):
+        text = option.strip()
+        if not text:
+            continue
+        if text.lower() not in seen:
+            seen[text.lower()] = len(kept_options)
+            kept_options.append(text)
+        if i in indices and seen[text.lower()] not in correct:
+            correct.append(seen[text.lower()])
+
+    try:
+        quiz = Quiz(
+            question=str(data.get("question", "")).strip(),
+            options=kept_options,
+            correct_answers=sorted(correct),
+            explanation=str(data.get("explanation") or ""),
+        )
+    except ValidationError as e:
+        raise ValueError(f"Invalid quiz: {e}") from e
+
+    if not quiz.question:
+        raise ValueError("Quiz has no question")
+    if len(quiz.options) < 3:
+        raise ValueError("Not enough options for a multiple-choice question")
+    # Ensure it's a multiple-choice question
+    if len(quiz.correct_answers) < 2:
+        raise ValueError("Not enough correct answers for a multiple-choice question")
+    return quiz.model_dump()
+
+
+def parse_multiple_choice(text: str) -> List[Dict]:
+    """
+    Parse and repair the model's JSON answer to the multiple-choice prompt.
+
+    Questions that can't be repaired, and repeated questions, are dropped.
+
+    Args:
+        text: The model output
+
+    Returns:
+        List[Dict]: Quiz data with question, options, correct_answers and explanation
+
+    Raises:
+        ValueError: If the output is not JSON or has no usable question
+    """
+    try:
+        data = _load_json(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Quiz is not valid JSON: {e}") from e
+
+    # A single question instead of a batch is accepted too
+    items = data.get("questions") if isinstance(data, dict) and "questions" in data else data
+    if not isinstance(items, list):
+        items = [items]
+
+    quizzes, seen, error = [], set(), None
+    for item in items:
+        try:
+            quiz = repair_quiz(item)
+        except ValueError as e:
+            error = e
+            continue
+        if question_id(quiz) not in seen:
+            seen.add(question_id(quiz))
+            quizzes.append(quiz)
+    if not quizzes:
+        raise error or ValueError("Quiz has no questions")
+    return quizzes
+
+
+def question_id(quiz: Dict) -> str:
+    """
+    Identify a multiple-choice question by its normalized text.
+
+    Args:
+        quiz: Quiz data
+
+    Returns:
+        str: Short stable identifier of the question
+    """
+    return make_cache_key(normalize_text(quiz["question"]))[:16]
+
+
+def bank_key(summary: str) -> str:
+    """
+    Build the store key of the question bank for a summary.
+
+    Args:
+        summary: The summary the questions are based on
+
+    Returns:
+        str: Store key
+    """
+    return make_cache_key("quiz_bank", prompt_id(MULTIPLE_CHOICE), model_id(QUIZ), summary)
+
+
+def quiz_bank(summary: str) -> List[Dict]:
+    """
+    Get the question bank for a summary.
+
+    Args:
+        summary: The summary the questions are based on
+
+    Returns:
+        List[Dict]: Stored multiple-choice questions, empty if there are none
+    """
+    return quiz_cache.get(bank_key(summary)) or []
+
+
+def add_to_bank(summary: str, quizzes: List[Dict], ttl: Optional[float] = None) -> List[Dict]:
+    """
+    Add multiple-choice questions to a summary's question bank.
+
+    Questions already in the bank are skipped, and the bank keeps at most
+    QUIZ_BANK_MAX questions.
+
+    Args:
+        summary: The summary the questions are based on
+        quizzes: Quiz data to add
+        ttl: Seconds the bank stays valid, if not the store's default
+
+    Returns:
+        List[Dict]: The updated question bank
+    """
+    bank = quiz_bank(summary)
+    known = {question_id(quiz) for quiz in bank}
+    for quiz in quizzes:
+        if len(bank) >= QUIZ_BANK_MAX:
+            break
+        if question_id(quiz) not in known:
+            known.add(question_id(quiz))
+            bank.append(quiz)
+    quiz_cache.set(bank_key(summary), bank, ttl)
+    return bank
+
+
+def _seen_key(user: str, summary: str) -> str:
+    return make_cache_key("quiz_seen", user, summary)
+
+
+def unseen_quizzes(summary: str, user: Optional[str], bank: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Get the questions of a summary's bank a patient hasn't been asked yet.
+
+    Args:
+        summary: The summary the questions are based on
+        user: Identifies the patient, or None to treat every question as unseen
+        bank: The question bank, if already loaded
+
+    Returns:
+        List[Dict]: Unseen questions, in bank order
+    """
+    bank = quiz_bank(summary) if bank is None else bank
+    if user is None:
+        return bank
+    seen = set(quiz_seen_cache.get(_seen_key(user, summary)) or [])
+    return [quiz for quiz in bank if question_id(quiz) not in seen]
+
+
+def _serve(summary: str, user: Optional[str], bank: List[Dict], restart: bool = False) -> Optional[Dict]:
+    # Pick a random unseen question, so patients without history don't all get the first
+    seen = [] if user is None else quiz_seen_cache.get(_seen_key(user, summary)) or []
+    if restart:
+        # Every question was asked; start over, but not with the question just asked
+        seen = seen[-1:] if len(bank) > 1 else []
+    unseen = [quiz for quiz in bank if question_id(quiz) not in set(seen)]
+    if not unseen:
+        return None
+    return random.choice(unseen)
+
+
+def mark_seen(summary: str, user: Optional[str], quiz: Dict) -> None:
+    """
+    Record that a patient was asked a question, once it is presented to them.
+
+    Questions picked ahead of time, such as by the quiz prefetch, only count
+    as seen once the patient is actually asked them.
+
+    Args:
+        summary: The summary the question is based on
+        user: Identifies the patient, or None to record nothing
+        quiz: The question asked
+    """
+    if user is None:
+        return
+    asked = question_id(quiz)
+
+    def add(seen: Optional[List[str]]) -> List[str]:
+        seen = seen or []
+        if asked in seen:
+            # Every question was asked and the patient started over
+            seen = seen[-1:] if seen[-1] != asked else []
+        return seen + [asked]
+
+    # Atomic, so sessions of the same patient don't lose each other's questions
+    quiz_seen_cache.update(_seen_key(user, summary), add)
+
+
+def attempt_model(model: BaseChatModel, attempt: int) -> BaseChatModel:
+    """
+    Choose the model for an attempt at generating questions.
+
+    Args:
+        model: The chat model
+        attempt: 0 for the first attempt, then 1, 2, ...
+
+    Returns:
+        BaseChatModel: `model` for the first attempt; for retries after invalid
+            output, the quiz task's escalation model if one is configured
+    """
+    escalation = get_escalation_model(QUIZ) if attempt else None
+    if escalation is None:
+        return model
+    record_escalation(QUIZ)
+    return escalation
+
+
+def fill_bank(model: BaseChatModel, health_topic: str, summary: str) -> List[Dict]:
+    """
+    Generate a batch of multiple-choice questions and add them to the summary's bank.
+
+    Asks the model for JSON matching the question bank schema. Output without
+    any usable question is requested again, up to `QUIZ_ATTEMPTS` calls in total,
+    from the quiz task's escalation model if one is configured.
+    Concurrent calls for the same summary share one model call.
+
+    Args:
+        model: The chat model
+        health_topic: The health topic being studied
+        summary: The summary the questions must be based on
+
+    Returns:
+        List[Dict]: The updated question bank
+
+    Raises:
+        ValueError: If no usable question was generated
+    """
+
+    def fill():
+        bank = quiz_bank(summary)
+        messages = multiple_choice_messages(
+            health_topic, summary, avoid=[quiz["question"] for quiz in bank]
+        )
+        for attempt in range(QUIZ_ATTEMPTS):
+            runnable = quiz_model(attempt_model(model, attempt))
+            ai_message = call(lambda: runnable.invoke(messages), "model")
+            try:
+                return add_to_bank(summary, parse_multiple_choice(ai_message.content))
+            except ValueError:
+                if attempt == QUIZ_ATTEMPTS - 1:
+                    raise
+
+    bank, _ = _bank_fills.do(bank_key(summary), fill)
+    return bank
+
+
+async def afill_bank(model: BaseChatModel, health_topic: str, summary: str) -> List[Dict]:
+    """
+    Async version of `fill_bank`.
+
+    Args:
+        model: The chat model
+        health_topic: The health topic being studied
+        summary: The summary the questions must be based on
+
+    Returns:
+        List[Dict]: The updated question bank
+
+    Raises:
+        ValueError: If no usable question was generated
+    """
+
+    async def fill():
+        bank = quiz_bank(summary)
+        messages = multiple_choice_messages(
+            health_topic, summary, avoid=[quiz["question"] for quiz in bank]
+        )
+        for attempt in range(QUIZ_ATTEMPTS):
+            runnable = quiz_model(attempt_model(model, attempt))
+            ai_message = await acall(lambda: runnable.ainvoke(messages), "model")
+            try:
+                return add_to_bank(summary, parse_multiple_choice(ai_message.content))
+            except ValueError:
+                if attempt == QUIZ_ATTEMPTS - 1:
+                    raise
+
+    bank, _ = await _bank_fills.ado(bank_key(summary), fill)
+    return bank
+
+
+def generate_multiple_choice(
+    model: BaseChatModel, health_topic: str, summary: str, user: Optional[str] = None
+) -> Dict:
+    """
+    Get a multiple-choice quiz question about a summary that the patient hasn't seen.
+
+    Serves a question from the summary's question bank, pregenerated in batch
+    mode or by earlier sessions. Only when the patient has seen every question
+    is the model asked for more; once the bank is full they start over. The
+    question is not marked as seen; call `mark_seen` once it is presented.
+
+    Args:
+        model: The chat model
+        health_topic: The health topic being studied
+        summary: The summary the question must be based on
+        user: Identifies the patient, so they aren't asked the same question
+            twice; None serves any question
+
+    Returns:
+        Dict: Quiz data with question, options, correct_answers and explanation
+
+    Raises:
+        ValueError: If no usable question was generated
+    """
+    bank = quiz_bank(summary)
+    quiz = _serve(summary, user, bank)
+    if quiz is None and len(bank) < QUIZ_BANK_MAX:
+        try:
+            bank = fill_bank(model, health_topic, summary)
+        except Exception:
+            # A repeated question is better than no quiz
+            if not bank:
+                raise
+        quiz = _serve(summary, user, bank)
+    return quiz or _serve(summary, user, bank, restart=True)
+
+
+async def agenerate_multiple_choice(
+    model: BaseChatModel, health_topic: str, summary: str, user: Optional[str] = None
+) -> Dict:
+    """
+    Async version of `generate_multiple_choice`.
+
+    Args:
+        model: The chat model
+        health_topic: The health topic being studied
+        summary: The summary the question must be based on
+        user: Identifies the patient, so they aren't asked the same question
+            twice; None serves any question
+
+    Returns:
+        Dict: Quiz data with question, options, correct_answers and explanation
+
+    Raises:
+        ValueError: If no usable question was generated
+    """
+    bank = quiz_bank(summary)
+    quiz = _serve(summary, user, bank)
+    if quiz is None and len(bank) < QUIZ_BANK_MAX:
+        try:
+            bank = await afill_bank(model, health_topic, summary)
+        except Exception:
+            # A repeated question is better than no quiz
+            if not bank:
+                raise
+        quiz = _serve(summary, user, bank)
+    return quiz or _serve(summary, user, bank, restart=True)
+
+
+def option_label(index: int) -> str:
+    """
+    Get the letter an option is shown with.
+
+    Args:
+        index: 0-based option index
+
+    Returns:
+        str: "A" for the first option, "B" for the second, ...
+    """
+    return chr(ord("A") + index)
+
+
+def format_multiple_choice(question: str, options: List[str]) -> str:
+    """
+    Format a multiple-choice question as text for the command line.
+
+    Args:
+        question: The question text
+        options: The answer options
+
+    Returns:
+        str: The question followed by the lettered options
+    """
+    lines = [question, ""]
+    lines += [f"{option_label(i)}) {option}" for i, option in enumerate(options)]
+    lines += ["", "(Select all that apply: enter the letters, e.g. A, C)"]
+    return "\n".join(lines)
+
+
+def parse_selection(text: str, option_count: int) -> List[int]:
+    """
+    Parse the options a patient selected, given as letters or 1-based numbers.
+
+    Args:
+        text: The patient's answer, e.g. "A, C", "ac" or "1 3"
+        option_count: Number of options offered
+
+    Returns:
+        List[int]: Sorted 0-based indices of the selected options
+    """
+    selected = set()
+    for token in re.findall(r"\d+|[A-Za-z]+", text):
+        if token.isdigit():
+            indices = [int(token) - 1]
+        else:
+            # "ac" selects A and C; words like "and" or "none" select nothing
+            indices = [ord(letter) - ord("A") for letter in token.upper()]
+        if all(0 <= index < option_count for index in indices):
+            selected.update(indices)
+    return sorted(selected)
+
+
+def grade_multiple_choice(selected: List[int], correct: List[int]) -> Tuple[str, str]:
+    """
+    Grade a multiple-choice answer by comparing the selected and correct options.
+
+    Args:
+        selected: 0-based indices of the options the patient selected
+        correct: 0-based indices of the correct options
+
+    Returns:
+        Tuple[str, str]: Letter grade and a one-line verdict
+    """
+    user_set = set(selected)
+    correct_set = set(correct)
+
+    if user_set == correct_set:
+        return "A", "Excellent! Your answer is completely correct."
+    elif len(user_set & correct_set) > 0 and user_set.issubset(correct_set):
+        return "B", "Good job! You identified some correct answers, but missed a few."
+    elif len(user_set & correct_set) > 0:
+        return "C", "You got some answers right, but also selected some incorrect options."
+    else:
+        return "F", "Your answer doesn't match the correct option(s). Let's review the information."
+
+
+def feedback_messages(
+    question: str, options: List[str], correct: List[int], selected: List[int]
+) -> List[BaseMessage]:
+    """
+    Build a short prompt asking the model to explain a multiple-choice answer.
+
+    Only the question and options are sent, not the summary, so the call is cheap.
+
+    Args:
+        question: The question text
+        options: The answer options
+        correct: 0-based indices of the correct options
+        selected: 0-based indices of the options the patient selected
+
+    Returns:
+        List[BaseMessage]: Prompt messages for the model
+    """
+    def listing(indices):
+        return ", ".join(f"{option_label(i)}) {options[i]}" for i in indices) or "nothing"
+
+    return render_prompt(
+        "feedback", question=question, correct=listing(correct), selected=listing(selected)
+    )
@@ -0,0 +1,396 @@
+"""
+HealthBot Rate Limit Module
+This module keeps the HealthBot application's calls to the language model and
+Tavily within the providers' requests-per-minute and tokens-per-minute quotas.
+Calls wait in a priority queue for room in a token bucket instead of being
+rejected with a 429, so a burst of sessions runs at the quota ceiling, with
+patients waiting for a summary served before background prefetches and batches.
+
+Limits are off unless set, as they depend on the account's quota tier.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+from src.deadline import check_deadline
+from src.instrumentation import record_rate_limit_wait
+
+# Provider quotas; 0 leaves the limit off
+MODEL_RPM = float(os.getenv("HEALTHBOT_MODEL_RPM", "0"))
+MODEL_TPM = float(os.getenv("HEALTHBOT_MODEL_TPM", "0"))
+SEARCH_RPM = float(os.getenv("HEALTHBOT_SEARCH_RPM", "0"))
+# Completion tokens assumed for a model call before its usage is known
+COMPLETION_ESTIMATE = int(os.getenv("HEALTHBOT_COMPLETION_ESTIMATE", "500"))
+
+# Priorities, most urgent first: a patient waiting for an answer, work done
+# ahead of time for a session (the quiz prefetch), and batch pregeneration
+INTERACTIVE = 0
+BACKGROUND = 1
+BATCH = 2
+
+# Seconds between checks of an async caller waiting behind other calls
+ASYNC_POLL = 0.01
+# Longest a waiting caller sleeps before checking its deadline again
+DEADLINE_POLL = 1.0
+
+_priority: ContextVar[int] = ContextVar("rate_limit_priority", default=INTERACTIVE)
+# Tokens the model call about to be made is expected to use
+_pending_tokens: ContextVar[int] = ContextVar("rate_limit_pending_tokens", default=0)
+
+
+@contextmanager
+def priority(level: int):
+    """
+    Queue the calls made inside the block with a priority.
+
+    Args:
+        level: INTERACTIVE, BACKGROUND or BATCH
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    """
+    Get the priority calls are queued with in the current context.
+
+    Returns:
+        int: INTERACTIVE unless set with `priority`
+    """
+    return _priority.get()
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at a per-minute rate, holding at most a minute's worth.
+
+    The level may go below zero when a call turns out to use more than reserved.
+
+    Args:
+        per_minute: Units added per minute
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available; 0 if it is now."""
+        self.refill()
+        # Calls larger than the bucket wait for a full bucket instead of forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """
+    Priority queue in front of a service's requests-per-minute and tokens-per-minute quotas.
+
+    Callers are served in priority order, then in arrival order; a caller only
+    takes capacity once everyone ahead of it has.
+
+    Args:
+        name: Name of the service, used in metrics
+        requests_per_minute: Request quota, or 0 for none
+        tokens_per_minute: Token quota, or 0 for none
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._queue: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = dict.fromkeys(
+            ["acquired", "waited", "wait_seconds", "peak_queue_depth", "throttled"], 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def _enter(self, level: int) -> Tuple[int, int]:
+        entry = (level, next(self._order))
+        heapq.heappush(self._queue, entry)
+        self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], len(self._queue))
+        return entry
+
+    def _leave(self, entry: Tuple[int, int]) -> None:
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def _try_take(self, entry: Tuple[int, int], tokens: int) -> Optional[float]:
+        # Seconds to wait as the head of the queue, 0 once taken, None behind others
+        if self._queue[0] != entry:
+            return None
+        wait = self._wait_time(tokens)
+        if wait > 0:
+            return wait
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= tokens
+        self._leave(entry)
+        return 0.0
+
+    def _finish(self, level: int, start: float, depth: int) -> float:
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats["acquired"] += 1
+            if waited > 0.001:
+                self._stats["waited"] += 1
+                self._stats["wait_seconds"] += waited
+        record_rate_limit_wait(self.name, waited, level, depth)
+        return waited
+
+    def acquire(self, tokens: int = 0, level: Optional[int] = None) -> float:
+        """
+        Wait for room for one request using `tokens` tokens.
+
+        Args:
+            tokens: Tokens the request is expected to use
+            level: Priority; defaults to the current context's
+
+        Returns:
+            float: Seconds waited
+
+        Raises:
+            DeadlineExceeded: If the current node's deadline passes while waiting
+        """
+        if not self.enabled:
+            return 0.0
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        with self._cond:
+            entry = self._enter(level)
+            depth = len(self._queue)
+            try:
+                while True:
+                    wait = self._try_take(entry, tokens)
+                    if wait == 0:
+                        break
+                    check_deadline()
+                    self._cond.wait(min(wait or DEADLINE_POLL, DEADLINE_POLL))
+            except BaseException:
+                self._leave(entry)
+                raise
+        return self._finish(level, start, depth)
+
+    async def aacquire(self, tokens: int = 0, level: Optional[int] = None) -> float:
+        """
+        Async version of `acquire`, waiting without blocking the event loop.
+
+        Args:
+            tokens: Tokens the request is expected to use
+            level: Priority; defaults to the current context's
+
+        Returns:
+            float: Seconds waited
+
+        Raises:
+            DeadlineExceeded: If the current node's deadline passes while waiting
+        """
+        if not self.enabled:
+            return 0.0
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        with self._cond:
+            entry = self._enter(level)
+            depth = len(self._queue)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(entry, tokens)
+                if wait == 0:
+                    break
+                check_deadline()
+                await asyncio.sleep(min(wait or ASYNC_POLL, DEADLINE_POLL))
+        except BaseException:
+            with self._cond:
+                self._leave(entry)
+            raise
+        return self._finish(level, start, depth)
+
+    def settle(self, tokens: int) -> None:
+        """
+        Correct the tokens taken for a request once its actual usage is known.
+
+        Args:
+            tokens: Tokens used beyond the reservation; negative returns tokens
+        """
+        if self.tokens is None or not tokens:
+            return
+        with self._cond:
+            self.tokens.refill()
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level - tokens)
+            self._cond.notify_all()
+
+    def throttle(self) -> None:
+        """
+        Empty the buckets after the provider rejected a call for exceeding its
+        quota, so callers wait for the quota to refill instead of retrying at once.
+        """
+        with self._cond:
+            for bucket in [self.requests, self.tokens]:
+                if bucket is not None:
+                    bucket.refill()
+                    bucket.level = min(bucket.level, 0)
+            self._stats["throttled"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report how the limiter has been used.
+
+        Returns:
+            Dict: Queue depth now and at its peak, calls served, calls that had
+                to wait and the seconds they waited, and quota rejections seen
+        """
+        with self._cond:
+            return {"queue_depth": len(self._queue), **self._stats}
+
+
+model_limiter = RateLimiter("model", MODEL_RPM, MODEL_TPM)
+search_limiter = RateLimiter("search", SEARCH_RPM)
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Report how the model and search rate limiters have been used.
+
+    Returns:
+        Dict: `RateLimiter.stats()` for "model" and "search"
+    """
+    return {"model": model_limiter.stats(), "search": search_limiter.stats()}
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    Check whether an error is a provider rejecting a call for exceeding its quota.
+
+    Args:
+        error: The error
+
+    Returns:
+        bool: True for HTTP 429 errors and Tavily's usage limit error
+    """
+    return (
+        getattr(error, "status_code", None) == 429
+        or type(error).__name__ in ["RateLimitError", "UsageLimitExceededError"]
+    )
+
+
+class ModelRateLimiter(BaseRateLimiter):
+    """
+    Chat model rate limiter queuing each call in `model_limiter`.
+
+    The tokens a call is expected to use are estimated by `RateLimitHandler`,
+    which runs just before the model asks for room.
+
+    Args:
+        limiter: The limiter to queue calls in
+    """
+
+    def __init__(self, limiter: RateLimiter = model_limiter):
+        self.limiter = limiter
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        self.limiter.acquire(_pending_tokens.get())
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await self.limiter.aacquire(_pending_tokens.get())
+        return True
+
+
+class RateLimitHandler(BaseCallbackHandler):
+    """
+    Callback handler estimating the tokens of each model call before it is
+    made, and settling the estimate with the actual usage afterwards.
+
+    Args:
+        limiter: The limiter the model's calls are queued in
+    """
+
+    # Inline, so the estimate is set in the context the call is made from
+    run_inline = True
+
+    def __init__(self, limiter: RateLimiter = model_limiter):
+        self.limiter = limiter
+        self._reserved: Dict[UUID, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        completion = params.get("max_tokens") or params.get("max_completion_tokens")
+        estimate = count_tokens_approximately(messages[0]) + (completion or COMPLETION_ESTIMATE)
+        self._reserved[run_id] = estimate
+        _pending_tokens.set(estimate)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        reserved = self._reserved.pop(run_id, 0)
+        used = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    used += usage.get("total_tokens", 0)
+        if used:
+            self.limiter.settle(used - reserved)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._reserved.pop(run_id, None)
+        if is_rate_limit_error(error):
+            self.limiter.throttle()
+
+
+def rate_limit_callbacks() -> List[BaseCallbackHandler]:
+    """
+    Get the callback handlers to attach to language models for rate limiting.
+
+    Returns:
+        List[BaseCallbackHandler]: Token accounting handler; empty when the
+            model has no limits
+    """
+    return [RateLimitHandler()] if model_limiter.enabled else []
+
+
+def model_rate_limiter() -> Optional[BaseRateLimiter]:
+    """
+    Get the rate limiter to attach to language models.
+
+    Returns:
+        BaseRateLimiter: Limiter queuing calls in `model_limiter`, or None when
+            the model has no limits
+    """
+    return ModelRateLimiter() if model_limiter.enabled else None
@@ -0,0 +1,247 @@
+"""
+HealthBot Retrieval Module
+This module defines the search backends the HealthBot application retrieves
+health information from: Tavily, a local index of pages from the trusted
+domains, or the local index with Tavily as a fallback for topics it doesn't cover.
+
+The local index is an SQLite FTS5 (BM25) database built by `ingest.py`. It is
+opened read-only and memory-mapped, so queries take milliseconds and need no
+network access.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+from src.cache import CACHE_DIR
+from src.deadline import remaining
+from src.ratelimit import is_rate_limit_error, search_limiter
+
+# Backend used for searches: "tavily", "local", or "local+tavily" (local index,
+# falling back to Tavily when it has too few matches)
+SEARCH_BACKEND = os.getenv("HEALTHBOT_SEARCH_BACKEND", "tavily")
+LOCAL_INDEX_PATH = os.getenv(
+    "HEALTHBOT_LOCAL_INDEX_PATH", os.path.join(CACHE_DIR, "local_index.sqlite")
+)
+# Fewer matching passages than this counts as a miss of the local index
+LOCAL_MIN_RESULTS = int(os.getenv("HEALTHBOT_LOCAL_MIN_RESULTS", "2"))
+# Bytes of the local index memory-mapped for queries
+LOCAL_MMAP_BYTES = int(os.getenv("HEALTHBOT_LOCAL_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+# Words of the search query that say what kind of text is wanted rather than
+# what it is about; they would match every page of the index
+QUERY_STOPWORDS = {
+    "a", "an", "and", "about", "are", "explanation", "for", "health", "how", "in",
+    "information", "is", "medical", "of", "on", "or", "the", "to", "what",
+}
+
+
+def url_domain(url: str) -> str:
+    """
+    Get the domain of a URL without a leading "www.".
+
+    Args:
+        url: The URL
+
+    Returns:
+        str: The domain, lower-cased
+    """
+    domain = urlparse(url).netloc.lower()
+    return domain[4:] if domain.startswith("www.") else domain
+
+
+def in_domains(url: str, domains: Iterable[str]) -> bool:
+    """
+    Check whether a URL belongs to one of the domains or their subdomains.
+
+    Args:
+        url: The URL
+        domains: Allowed domains, e.g. "nih.gov"
+
+    Returns:
+        bool: True if the URL is within one of the domains
+    """
+    domain = url_domain(url)
+    return any(domain == d or domain.endswith("." + d) for d in domains)
+
+
+class SearchBackend:
+    """
+    Interface of a search backend.
+
+    Responses are shaped like Tavily's: a dict with the query and a list of
+    results, each with a title, url, content and relevance score.
+    """
+
+    name = "base"
+
+    def search(
+        self,
+        query: str,
+        search_depth: str = "advanced",
+        include_domains: Optional[List[str]] = None,
+        max_results: int = 5,
+    ) -> Dict:
+        """
+        Search for pages about a query.
+
+        Args:
+            query: The search query
+            search_depth: Tavily search depth ("basic" or "advanced")
+            include_domains: Domains the results are restricted to
+            max_results: Maximum number of results
+
+        Returns:
+            Dict: Response with "query", "results" and the "backend" that answered
+        """
+        raise NotImplementedError
+
+
+class TavilyBackend(SearchBackend):
+    """Search backend sending queries to Tavily through the shared client."""
+
+    name = "tavily"
+
+    def search(self, query, search_depth="advanced", include_domains=None, max_results=5):
+        from src.clients import get_tavily_client
+
+        # Wait for room within the HEALTHBOT_SEARCH_RPM quota, if set
+        search_limiter.acquire()
+        try:
+            response = get_tavily_client().search(
+                query,
+                search_depth=search_depth,
+                include_domains=include_domains or [],
+                max_results=max_results,
+                # Don't keep waiting for a search the node has given up on
+                timeout=max(1, math.ceil(remaining(60))),
+            )
+        except Exception as e:
+            if is_rate_limit_error(e):
+                search_limiter.throttle()
+            raise
+        return {**response, "backend": self.name}
+
+
+class LocalIndexBackend(SearchBackend):
+    """
+    Search backend answering from the local BM25 index built by `ingest.py`.
+
+    Only passages containing every topic word of the query match. A missing
+    index answers every query with no results.
+
+    Args:
+        path: Location of the index database
+        mmap_bytes: Bytes of the index memory-mapped for queries
+    """
+
+    name = "local"
+
+    def __init__(self, path: str = LOCAL_INDEX_PATH, mmap_bytes: int = LOCAL_MMAP_BYTES):
+        self.path = path
+        self.mmap_bytes = mmap_bytes
+        # Read-only connections are cheap; one per thread lets queries run in parallel
+        self._local = threading.local()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                return None
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        """
+        Build the FTS5 query requiring every topic word of a search query.
+
+        Args:
+            query: The search query
+
+        Returns:
+            str: FTS5 match expression, or "" if the query has no topic words
+        """
+        words = [w for w in re.findall(r"[a-z0-9]+", query.lower()) if w not in QUERY_STOPWORDS]
+        return " AND ".join(f'"{w}"' for w in dict.fromkeys(words))
+
+    def search(self, query, search_depth="advanced", include_domains=None, max_results=5):
+        response = {"query": query, "results": [], "backend": self.name}
+        expression = self.match_expression(query)
+        conn = self._connect()
+        if not expression or conn is None:
+            return response
+
+        # bm25() is lower for better matches; titles weigh twice as much as content
+        rows = conn.execute(
+            "SELECT title, url, content, -bm25(passages, 2.0, 1.0) AS score "
+            "FROM passages WHERE passages MATCH ? ORDER BY score DESC LIMIT ?",
+            (expression, max_results * 4),
+        ).fetchall()
+        results = []
+        for title, url, content, score in rows:
+            if include_domains and not in_domains(url, include_domains):
+                continue
+            results.append({"title": title, "url": url, "content": content, "score": score})
+            if len(results) == max_results:
+                break
+
+        # Scale scores to 0-1 like Tavily's
+        top = max((r["score"] for r in results), default=0) or 1
+        for result in results:
+            result["score"] = round(result["score"] / top, 4)
+        response["results"] = results
+        return response
+
+
+class FallbackBackend(SearchBackend):
+    """
+    Search backend trying a primary backend first and a fallback on a miss.
+
+    Args:
+        primary: Backend asked first, e.g. the local index
+        fallback: Backend asked when the primary returns too few results
+        min_results: Fewest results that count as a hit of the primary
+    """
+
+    def __init__(
+        self, primary: SearchBackend, fallback: SearchBackend, min_results: int = LOCAL_MIN_RESULTS
+    ):
+        self.primary = primary
+        self.fallback = fallback
+        self.min_results = min_results
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def search(self, query, search_depth="advanced", include_domains=None, max_results=5):
+        response = self.primary.search(query, search_depth, include_domains, max_results)
+        if len(response["results"]) >= min(self.min_results, max_results):
+            return response
+        return self.fallback.search(query, search_depth, include_domains, max_results)
+
+
+def create_backend(kind: Optional[str] = None) -> SearchBackend:
+    """
+    Create the search backend.
+
+    Args:
+        kind: "tavily", "local" or "local+tavily"; defaults to
+            HEALTHBOT_SEARCH_BACKEND
+
+    Returns:
+        SearchBackend: The search backend
+    """
+    kind = kind or SEARCH_BACKEND
+    if kind == "tavily":
+        return TavilyBackend()
+    if kind == "local":
+        return LocalIndexBackend()
+    if kind == "local+tavily":
+        return FallbackBackend(LocalIndexBackend(), TavilyBackend())
+    raise ValueError(
+        f"Unknown search backend: {kind!r} (expected 'tavily', 'local' or 'local+tavily')"
+    )
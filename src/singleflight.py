@@ -0,0 +1,167 @@
+"""
+HealthBot Single-Flight Module
+This module coalesces concurrent identical calls for the HealthBot application:
+while a call for a key is in flight, other callers with the same key wait for
+it and share its result instead of repeating it.
+
+Threads and asyncio tasks share the same in-flight calls, so a search started
+by a synchronous session also serves async sessions asking for the same topic.
+
+A call given up because of its caller's deadline or session cancellation is not
+shared: a waiting caller takes it over, within its own deadline.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from src.deadline import DeadlineExceeded, SessionCancelled, check_deadline, remaining
+from src.instrumentation import record_coalesced, record_deadline_exceeded
+
+# Failures of one caller rather than of the call, which aren't shared with waiting callers
+CALLER_ERRORS = (DeadlineExceeded, SessionCancelled)
+
+
+class SingleFlight:
+    """
+    Group of in-flight calls, keyed by what they compute.
+
+    The first caller for a key runs the call; callers arriving while it runs
+    wait for its result or exception, up to their own deadline. If the first
+    caller gives up because of its deadline or session, a waiting caller runs
+    the call instead. Nothing is kept once the call finishes,
+    so caching results is left to the caches.
+
+    Args:
+        name: Name of the group, used in metrics
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _finish(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _deadline_exceeded(self) -> DeadlineExceeded:
+        record_deadline_exceeded(self.name)
+        try:
+            check_deadline()
+        except DeadlineExceeded as e:
+            return e
+        return DeadlineExceeded(f"{self.name} did not finish in time")
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn`, or wait for the identical call already in flight.
+
+        Args:
+            key: Identifies what `fn` computes
+            fn: Function computing the result
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it came from another
+                caller's call rather than this caller running `fn`
+
+        Raises:
+            DeadlineExceeded: If the current node's deadline passes while waiting
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                record_coalesced(self.name)
+                try:
+                    return future.result(timeout=remaining()), True
+                except CancelledError:
+                    # The caller running it gave up; try again
+                    continue
+                except FutureTimeoutError:
+                    # Timeouts of the call itself are shared like other errors
+                    if future.done():
+                        raise
+                    raise self._deadline_exceeded() from None
+
+            try:
+                result = fn()
+            except CALLER_ERRORS:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                self._finish(key, future)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async version of `do`: await `fn()`, or the identical call already in flight.
+
+        Cancelling a waiting caller doesn't affect the call it waits for; if the
+        caller running the call is cancelled, a waiting caller takes it over.
+
+        Args:
+            key: Identifies what `fn` computes
+            fn: Coroutine function computing the result
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it came from another
+                caller's call rather than this caller awaiting `fn`
+
+        Raises:
+            DeadlineExceeded: If the current node's deadline passes while waiting
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                record_coalesced(self.name)
+                try:
+                    waiting = asyncio.shield(asyncio.wrap_future(future))
+                    return await asyncio.wait_for(waiting, timeout=remaining()), True
+                except asyncio.TimeoutError:
+                    if future.done():
+                        raise
+                    raise self._deadline_exceeded() from None
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue
+                    raise
+
+            try:
+                result = await fn()
+            except (asyncio.CancelledError, *CALLER_ERRORS):
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                self._finish(key, future)
+
+    def in_flight(self) -> int:
+        """
+        Count the calls currently in flight.
+
+        Returns:
+            int: Number of distinct keys being computed
+        """
+        with self._lock:
+            return len(self._calls)
@@ -3,19 +3,119 @@ HealthBot State Module
 This module defines the state class for the HealthBot application.
 """
 
-from typing import Dict, Optional
+import os
+from typing import Annotated, Dict, List, Optional
+from langchain_core.messages import AnyMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
 from langgraph.graph import MessagesState
+from langgraph.graph.message import add_messages
+
+# History policy applied to HealthBotState.messages
+HISTORY_MAX_MESSAGES = int(os.getenv("HEALTHBOT_HISTORY_MAX_MESSAGES", "12"))
+HISTORY_MAX_TOKENS = int(os.getenv("HEALTHBOT_HISTORY_MAX_TOKENS", "0"))
+HISTORY_MODE = os.getenv("HEALTHBOT_HISTORY_MODE", "window")
+
+# Message id and size of the digest that older turns are rolled into
+DIGEST_ID = "healthbot-history-digest"
+DIGEST_HEADER = "Earlier in this session:"
+DIGEST_MAX_LINES = 10
+DIGEST_LINE_LENGTH = 100
+
+
+def _digest_line(message: AnyMessage) -> str:
+    text = " ".join(str(message.content).split())
+    if len(text) > DIGEST_LINE_LENGTH:
+        text = text[: DIGEST_LINE_LENGTH - 3] + "..."
+    return f"- {message.type}: {text}"
+
+
+def apply_history_policy(
+    messages: List[AnyMessage],
+    max_messages: int = HISTORY_MAX_MESSAGES,
+    max_tokens: int = HISTORY_MAX_TOKENS,
+    mode: str = HISTORY_MODE,
+) -> List[AnyMessage]:
+    """
+    Bound the conversation history to the most recent messages.
+
+    System messages are always kept, each distinct one once, ahead of the rest
+    of the conversation; only the other messages are trimmed. In "window" mode older messages are dropped. In "digest" mode they are
+    rolled into a single system message holding a one-line note per message,
+    itself capped at DIGEST_MAX_LINES lines, so the history stays a constant
+    size however long the session runs.
+
+    Args:
+        messages: The full message history
+        max_messages: Maximum number of recent messages kept besides system
+            messages; 0 for no limit
+        max_tokens: Approximate token budget for recent messages besides system
+            messages; 0 for no limit
+        mode: "window" or "digest"
+
+    Returns:
+        List[AnyMessage]: The bounded message history
+    """
+    digest = next((m for m in messages if m.id == DIGEST_ID), None)
+    # Every topic adds the system prompt again; keep its latest copy
+    system: Dict[str, AnyMessage] = {}
+    for message in messages:
+        if isinstance(message, SystemMessage) and message.id != DIGEST_ID:
+            system.pop(str(message.content), None)
+            system[str(message.content)] = message
+    recent = [m for m in messages if not isinstance(m, SystemMessage)]
+
+    keep = len(recent)
+    if max_messages > 0:
+        keep = min(keep, max_messages)
+    if max_tokens > 0:
+        tokens = 0
+        for count, message in enumerate(reversed(recent[len(recent) - keep :])):
+            tokens += count_tokens_approximately([message])
+            if tokens > max_tokens:
+                # Always keep the latest message
+                keep = max(count, 1)
+                break
+
+    dropped, recent = recent[: len(recent) - keep], recent[len(recent) - keep :]
+    if mode != "digest" or not (dropped or digest):
+        return list(system.values()) + recent
+
+    lines = digest.content.splitlines()[1:] if digest else []
+    lines = (lines + [_digest_line(m) for m in dropped])[-DIGEST_MAX_LINES:]
+    digest = SystemMessage(id=DIGEST_ID, content="\n".join([DIGEST_HEADER] + lines))
+    return list(system.values()) + [digest] + recent
+
+
+def add_messages_with_history(left, right) -> List[AnyMessage]:
+    """
+    Reducer for HealthBotState.messages: merge like `add_messages`, then apply
+    the history policy so checkpoints stay the same size as a session grows.
+
+    Args:
+        left: The current message history
+        right: Messages written by a node
+
+    Returns:
+        List[AnyMessage]: The merged, bounded message history
+    """
+    return apply_history_policy(add_messages(left, right))
+
 
 class HealthBotState(MessagesState):
     """
     State class for the HealthBot application.
     Inherits from MessagesState to maintain conversation history.
     """
+    messages: Annotated[List[AnyMessage], add_messages_with_history]
     health_topic: str = ""
     search_results: Optional[Dict] = None
     summary: str = ""
+    sources: List[Dict[str, str]] = []
     quiz_question: str = ""
+    quiz_options: List[str] = []
+    quiz_correct_answers: List[int] = []
+    quiz_explanation: str = ""
     user_answer: str = ""
     grade: str = ""
     feedback: str = ""
-    continue_session: bool = True
\ No newline at end of file
+    continue_session: bool = True
@@ -3,15 +3,93 @@ HealthBot Tools Module
 This module defines the tools used by the HealthBot application.
 """
 
-import os
-from typing import Dict
+import time
+from typing import Dict, List, Optional
 from langchain_core.tools import tool
-from tavily import TavilyClient
-from dotenv import load_dotenv
-load_dotenv()
+from src.cache import search_cache, make_cache_key, normalize_text
+from src.instrumentation import record_search
+from src.clients import get_search_backend
+from src.deadline import call
+from src.singleflight import SingleFlight
 
-# Initialize Tavily client
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+# Identical searches running at the same time share one search
+_searches = SingleFlight("search")
+
+# Trusted medical sources the search is restricted to
+TRUSTED_DOMAINS = [
+    "mayoclinic.org",
+    "nih.gov",
+    "who.int",
+    "cdc.gov",
+    "webmd.com",
+    "healthline.com",
+]
+
+
+def health_search_query(health_topic: str) -> str:
+    """
+    Build the search query used to research a health topic.
+
+    Args:
+        health_topic: The health topic being studied
+
+    Returns:
+        str: The search query
+    """
+    return f"{health_topic} health information medical explanation"
+
+
+def cached_search(
+    question: str,
+    search_depth: str = "advanced",
+    include_domains: List[str] = TRUSTED_DOMAINS,
+    ttl: Optional[float] = None,
+) -> Dict:
+    """
+    Search with the configured backend, serving repeated queries from the
+    on-disk search cache.
+
+    Concurrent calls for the same query wait for one search and share its result.
+    Answers from the local search index are not cached, as the index is faster.
+    The search gives up at the node's deadline and may be hedged (see `src.deadline`).
+
+    Args:
+        question: The search query for health information
+        search_depth: Tavily search depth ("basic" or "advanced")
+        include_domains: Domains the search is restricted to
+        ttl: Seconds the result stays cached, if not the cache's default; a
+            result already cached is stored again with it
+
+    Returns:
+        Dict: Search results, shaped like Tavily's
+    """
+    key = make_cache_key(
+        "search", normalize_text(question), search_depth, sorted(include_domains)
+    )
+    start = time.perf_counter()
+    response = search_cache.get(key)
+    if response is not None:
+        if ttl is not None:
+            search_cache.set(key, response, ttl)
+        record_search(time.perf_counter() - start, response, cached=True)
+        return response
+
+    def search():
+        response = call(
+            lambda: get_search_backend().search(
+                question,
+                search_depth=search_depth,
+                include_domains=include_domains,
+            ),
+            "search",
+        )
+        record_search(time.perf_counter() - start, response)
+        if response.get("backend") != "local":
+            search_cache.set(key, response, ttl)
+        return response
+
+    response, _ = _searches.do(key, search)
+    return response
 
 
 @tool
@@ -25,16 +103,4 @@ def web_search(question: str) -> Dict:
     Returns:
         Dict: Search results from Tavily
     """
-    response = tavily_client.search(
-        question,
-        search_depth="advanced",
-        include_domains=[
-            "mayoclinic.org",
-            "nih.gov",
-            "who.int",
-            "cdc.gov",
-            "webmd.com",
-            "healthline.com",
-        ],
-    )
-    return response
+    return cached_search(question)
@@ -0,0 +1,280 @@
+"""
+HealthBot Transport Module
+This module provides the pooled HTTP clients that the OpenAI and Tavily clients
+share, so calls reuse keep-alive connections instead of opening a new connection
+(and TLS session) each time, and reports how the pools are used.
+
+Requests sent inside a node run have their timeouts capped at the time left
+until the node's deadline, so a slow upstream call fails at the deadline instead
+of tying up the caller's thread.
+"""
+
+import importlib.util
+import json
+import os
+import threading
+from typing import Dict
+import httpx
+from tavily import TavilyClient
+from tavily.errors import (
+    BadRequestError,
+    ForbiddenError,
+    InvalidAPIKeyError,
+    UsageLimitExceededError,
+)
+from src.deadline import check_deadline, remaining
+
+# Connection pool settings shared by all outgoing HTTP calls
+HTTP_MAX_CONNECTIONS = int(os.getenv("HEALTHBOT_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HEALTHBOT_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HEALTHBOT_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HEALTHBOT_HTTP_TIMEOUT", "60"))
+
+# HTTP/2 needs the optional h2 package (`pip install httpx[http2]`)
+HTTP2 = os.getenv(
+    "HEALTHBOT_HTTP2", str(importlib.util.find_spec("h2") is not None)
+).lower() in ["1", "true", "yes"]
+
+
+class PoolStats:
+    """Counts requests and new connections made through one HTTP client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def connection_event(self, name: str) -> None:
+        with self._lock:
+            if name == "connection.connect_tcp.complete":
+                self.connections_opened += 1
+            elif name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+
+_stats: Dict[str, PoolStats] = {"sync": PoolStats(), "async": PoolStats()}
+
+# httpx timeout phases
+TIMEOUT_PHASES = ["connect", "read", "write", "pool"]
+
+
+def cap_timeout(request: httpx.Request) -> None:
+    """
+    Cap a request's timeouts at the time left until the current node's deadline.
+
+    Args:
+        request: The request about to be sent
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+        SessionCancelled: If the call was cancelled
+    """
+    check_deadline()
+    left = remaining()
+    if left is None:
+        return
+    timeout = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        phase: left if timeout.get(phase) is None else min(timeout[phase], left)
+        for phase in TIMEOUT_PHASES
+    }
+
+
+class DeadlineTransport(httpx.BaseTransport):
+    """
+    Transport sending requests with their timeouts capped at the node's deadline,
+    and recording them in `stats`.
+
+    Args:
+        transport: The pooled transport requests are sent with
+        stats: Usage counters of the client
+    """
+
+    def __init__(self, transport: httpx.HTTPTransport, stats: PoolStats):
+        self.transport = transport
+        self.stats = stats
+
+    def _trace(self, name, info):
+        self.stats.connection_event(name)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cap_timeout(request)
+        request.extensions["trace"] = self._trace
+        self.stats.request_started()
+        try:
+            return self.transport.handle_request(request)
+        finally:
+            # Also when the request fails or times out before a response arrives
+            self.stats.request_finished()
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncDeadlineTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of `DeadlineTransport`.
+
+    Args:
+        transport: The pooled transport requests are sent with
+        stats: Usage counters of the client
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: PoolStats):
+        self.transport = transport
+        self.stats = stats
+
+    async def _trace(self, name, info):
+        self.stats.connection_event(name)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cap_timeout(request)
+        request.extensions["trace"] = self._trace
+        self.stats.request_started()
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            self.stats.request_finished()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _pool_settings() -> Dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "http2": HTTP2,
+    }
+
+
+def create_http_client() -> httpx.Client:
+    """
+    Create the pooled HTTP client for synchronous calls.
+
+    Returns:
+        httpx.Client: Client recording its usage in `pool_stats()["sync"]`
+    """
+    return httpx.Client(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=5.0),
+        transport=DeadlineTransport(httpx.HTTPTransport(**_pool_settings()), _stats["sync"]),
+    )
+
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """
+    Create the pooled HTTP client for asynchronous calls.
+
+    Returns:
+        httpx.AsyncClient: Client recording its usage in `pool_stats()["async"]`
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=5.0),
+        transport=AsyncDeadlineTransport(
+            httpx.AsyncHTTPTransport(**_pool_settings()), _stats["async"]
+        ),
+    )
+
+
+def _open_connections(client) -> Dict[str, int]:
+    # httpx does not expose its pool; read it defensively
+    transport = getattr(client, "_transport", None)
+    pool = getattr(getattr(transport, "transport", transport), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"open_connections": len(connections), "idle_connections": idle}
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """
+    Report how the shared HTTP clients have been used.
+
+    A request is in flight until its response headers arrive or it fails.
+
+    Returns:
+        Dict: For the "sync" and "async" clients: requests, in-flight and peak
+            in-flight requests, connections and TLS handshakes opened, the share
+            of requests that reused a connection, and open and idle connections
+    """
+    from src.clients import peek_client
+
+    report = {}
+    for kind, name in [("sync", "http"), ("async", "http_async")]:
+        stats = _stats[kind]
+        with stats._lock:
+            entry = {
+                "requests": stats.requests,
+                "in_flight": stats.in_flight,
+                "peak_in_flight": stats.peak_in_flight,
+                "connections_opened": stats.connections_opened,
+                "tls_handshakes": stats.tls_handshakes,
+                "reuse_ratio": (
+                    1 - stats.connections_opened / stats.requests if stats.requests else 0.0
+                ),
+            }
+        client = peek_client(name)
+        entry.update(_open_connections(client) if client is not None else {})
+        report[kind] = entry
+    return report
+
+
+class PooledTavilyClient(TavilyClient):
+    """
+    Tavily client sending searches through the shared HTTP client.
+
+    The stock client opens a new connection for every request.
+
+    Args:
+        api_key: Tavily API key
+        http_client: Pooled HTTP client to send requests with
+    """
+
+    def __init__(self, api_key: str, http_client: httpx.Client):
+        super().__init__(api_key=api_key)
+        self.http_client = http_client
+
+    def _search(self, query: str, timeout: int = 60, **kwargs) -> dict:
+        # Proxies configured for Tavily are only supported by the stock client
+        if self.proxies:
+            return super()._search(query, timeout=timeout, **kwargs)
+
+        data = {"query": query, **kwargs}
+        response = self.http_client.post(
+            self.base_url + "/search",
+            content=json.dumps(data),
+            headers=self.headers,
+            timeout=min(timeout, 120),
+        )
+        if response.status_code == 200:
+            return response.json()
+
+        detail = ""
+        try:
+            detail = response.json().get("detail", {}).get("error", None)
+        except Exception:
+            pass
+        if response.status_code == 429:
+            raise UsageLimitExceededError(detail)
+        elif response.status_code in [403, 432, 433]:
+            raise ForbiddenError(detail)
+        elif response.status_code == 401:
+            raise InvalidAPIKeyError(detail)
+        elif response.status_code == 400:
+            raise BadRequestError(detail)
+        response.raise_for_status()
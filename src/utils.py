@@ -3,27 +3,221 @@ HealthBot User Interface Module
 This module handles the user interaction functions for the HealthBot application.
 """
 
-import time
+import asyncio
+import sys
+from contextvars import ContextVar
+from typing import AsyncIterable, Iterable, List, Optional, TextIO
+from langgraph.types import interrupt
+
+
+class OutputSink:
+    """
+    Destination for the text HealthBot shows to the user.
+
+    Sinks may hold text back until `flush` is called; HealthBot flushes the
+    active sink before every input prompt.
+    """
+
+    def write(self, text: str) -> None:
+        """
+        Send text to the sink.
+
+        Args:
+            text: The text to output, including any trailing newline
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Deliver any text the sink is holding back."""
+
+
+class StdoutSink(OutputSink):
+    """Write text straight to a console stream."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def write(self, text: str) -> None:
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
+
+    def flush(self) -> None:
+        (self.stream or sys.stdout).flush()
+
+
+class BufferedSink(OutputSink):
+    """Collect text in memory and write it to a console stream in one go on flush."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+        self._parts: List[str] = []
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+
+    def flush(self) -> None:
+        if self._parts:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self._parts))
+            stream.flush()
+            self._parts = []
+
+
+class QueueSink(OutputSink):
+    """
+    Put text onto an asyncio queue for a consumer running on an event loop.
+
+    Writes are thread-safe, so nodes running in worker threads can feed a
+    queue owned by the event loop.
+    """
+
+    def __init__(self, queue: asyncio.Queue, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.queue = queue
+        self.loop = loop
+
+    def write(self, text: str) -> None:
+        if self.loop is None:
+            self.queue.put_nowait(text)
+        else:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+
+class CaptureSink(OutputSink):
+    """Record text in memory, e.g. for tests or headless runs."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+
+    @property
+    def text(self) -> str:
+        """All captured text."""
+        return "".join(self.parts)
+
+    def drain(self) -> str:
+        """
+        Return the captured text and clear the capture.
+
+        Returns:
+            str: Text captured since the last drain
+        """
+        text = self.text
+        self.parts = []
+        return text
+
+
+# Sinks selectable by name, e.g. from the command line
+OUTPUT_SINKS = {
+    "stdout": StdoutSink,
+    "buffered": BufferedSink,
+    "capture": CaptureSink,
+}
+
+_output_sink: ContextVar[OutputSink] = ContextVar("output_sink", default=StdoutSink())
+_interrupt_input: ContextVar[bool] = ContextVar("interrupt_input", default=False)
+
+
+def get_output_sink() -> OutputSink:
+    """
+    Get the sink that user-facing text is currently written to.
+
+    Returns:
+        OutputSink: The active output sink
+    """
+    return _output_sink.get()
+
+
+def set_output_sink(sink: OutputSink) -> None:
+    """
+    Route user-facing text to `sink` for the current context.
+
+    Args:
+        sink: The output sink to use
+    """
+    _output_sink.set(sink)
+
+
+def set_interrupt_input(enabled: bool) -> None:
+    """
+    Choose how input is collected for the current context.
+
+    When enabled, `ask_user_for_input` pauses the graph with a LangGraph
+    interrupt instead of reading from the console, so a headless driver can
+    resume the session later with `Command(resume=<answer>)`.
+
+    Args:
+        enabled: True to collect input through graph interrupts
+    """
+    _interrupt_input.set(enabled)
+
 
 def display_text_to_user(text):
     """
-    Display text to the user with a short delay to ensure rendering.
-    
+    Display text to the user.
+
     Args:
         text: The text to display
     """
-    print(text)
-    time.sleep(1)  # wait for it to render before asking for input
+    get_output_sink().write(f"{text}\n")
+
+def stream_text_to_user(chunks: Iterable[str]) -> str:
+    """
+    Display text to the user piece by piece as it arrives.
+
+    Args:
+        chunks: Iterable of text fragments, e.g. tokens streamed from a model
+
+    Returns:
+        str: The full text that was displayed
+    """
+    sink = get_output_sink()
+    parts = []
+    for chunk in chunks:
+        sink.write(chunk)
+        parts.append(chunk)
+    sink.write("\n")
+    return "".join(parts)
+
+async def astream_text_to_user(chunks: AsyncIterable[str]) -> str:
+    """
+    Async version of `stream_text_to_user` for asynchronously produced text.
+
+    Args:
+        chunks: Async iterable of text fragments
+
+    Returns:
+        str: The full text that was displayed
+    """
+    sink = get_output_sink()
+    parts = []
+    async for chunk in chunks:
+        sink.write(chunk)
+        parts.append(chunk)
+    sink.write("\n")
+    return "".join(parts)
 
 def ask_user_for_input(input_description):
     """
     Ask the user for input with a given description.
-    
+
     Args:
         input_description: The prompt to display to the user
-        
+
     Returns:
         str: User's input response
     """
+    # Make sure everything shown so far is rendered before prompting
+    sink = get_output_sink()
+    sink.flush()
+
+    if _interrupt_input.get():
+        # Hand the output shown so far to the driver along with the prompt. When
+        # the node is re-run on resume, this drains and drops the replayed output.
+        output = sink.drain() if isinstance(sink, CaptureSink) else ""
+        return interrupt({"prompt": input_description, "output": output})
+
     response = input(input_description)
-    return response
\ No newline at end of file
+    return response
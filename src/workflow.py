@@ -3,9 +3,13 @@ HealthBot Workflow Module
 This module defines the workflow graph for the HealthBot application.
 """
 
+from typing import Optional
 from langgraph.graph import START, END, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from src.state import HealthBotState
+from src.checkpoint import create_checkpointer
+from src.instrumentation import instrument_node
+from src.deadline import with_deadline
 from src.nodes import (
     ask_health_topic,
     search_information,
@@ -20,32 +24,54 @@ from src.nodes import (
     ask_continue,
     router,
     reset_state,
+    asearch_information,
+    asummarize_information,
+    agenerate_quiz,
+    agrade_answer,
 )
 
 
-def create_workflow():
+def create_workflow(
+    async_mode: bool = False, checkpointer: Optional[BaseCheckpointSaver] = None
+):
     """
     Create and configure the HealthBot workflow graph.
 
+    Args:
+        async_mode: Use the async versions of the nodes that call the model or
+            search, for running the graph with `ainvoke`/`astream`
+        checkpointer: Checkpointer persisting conversation state; defaults to
+            the one selected by HEALTHBOT_CHECKPOINTER
+
     Returns:
-        tuple: Compiled workflow graph and memory saver instance
+        tuple: Compiled workflow graph and checkpointer instance
     """
     # Create the workflow graph
     workflow = StateGraph(HealthBotState)
 
+    def add_node(name, node):
+        # Give each node's model and search calls a deadline, and time each
+        # node when instrumentation is enabled
+        workflow.add_node(name, instrument_node(name, with_deadline(name, node)))
+
     # Add nodes
-    workflow.add_node("ask_health_topic", ask_health_topic)
-    workflow.add_node("search_information", search_information)
-    workflow.add_node("summarize_information", summarize_information)
-    workflow.add_node("present_summary", present_summary)
-    workflow.add_node("ready_for_quiz", ready_for_quiz)
-    workflow.add_node("generate_quiz", generate_quiz)
-    workflow.add_node("present_quiz", present_quiz)
-    workflow.add_node("get_answer", get_answer)
-    workflow.add_node("grade_answer", grade_answer)
-    workflow.add_node("present_grade", present_grade)
-    workflow.add_node("ask_continue", ask_continue)
-    workflow.add_node("reset_state", reset_state)
+    add_node("ask_health_topic", ask_health_topic)
+    add_node(
+        "search_information", asearch_information if async_mode else search_information
+    )
+    add_node(
+        "summarize_information",
+        asummarize_information if async_mode else summarize_information,
+    )
+    add_node("present_summary", present_summary)
+    add_node("ready_for_quiz", ready_for_quiz)
+    add_node("generate_quiz", agenerate_quiz if async_mode else generate_quiz)
+    add_node("present_quiz", present_quiz)
+    add_node("get_answer", get_answer)
+    add_node("grade_answer", agrade_answer if async_mode else grade_answer)
+    add_node("present_grade", present_grade)
+    add_node("ask_continue", ask_continue)
+    add_node("reset_state", reset_state)
 
     # Add edges
     workflow.add_edge(START, "ask_health_topic")
@@ -67,8 +93,8 @@ def create_workflow():
         path_map={"reset_state": "ask_health_topic", END: END},
     )
 
-    # Create memory saver for checkpointing
-    memory = MemorySaver()
+    # Create the checkpointer for conversation state
+    memory = checkpointer or create_checkpointer()
 
     # Compile the graph
     app = workflow.compile(checkpointer=memory)